@@ -0,0 +1,265 @@
+"""analytics.py
+
+This file contains a streaming pipeline which computes player statistics such as VPIP, PFR and bb/100 from hand-history files.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from history import ACTION_CODES, NO_CARD, HistoryReader
+from runner import split_work
+
+_CALL = ACTION_CODES['call']
+_RAISE = ACTION_CODES['raise']
+_AGGRESSIVE = (ACTION_CODES['bet'], _RAISE)
+# the blinds are the opening bet, so money goes in voluntarily before the flop only by calling or raising
+_VOLUNTARY = (_CALL, _RAISE)
+_FOLD = ACTION_CODES['fold']
+
+
+class PlayerStats:
+    """
+    The running tallies behind one player's statistics.
+
+    Only counts are kept, so the statistics of any number of hands take the same memory,
+    and tallies from different files or processes are combined simply by adding them. The
+    statistics follow the actions the Game offers: the blinds are the opening bet, so a
+    player puts money in voluntarily before the flop only by calling or raising, and blinds
+    alone do not count. The aggression factor counts bets and raises against calls after
+    the flop. A showdown is only won by winning more than the part of the player's own bet
+    which nobody called, since that part is simply returned.
+
+    Attributes:
+        name (str): The player's name.
+        hands (int): The number of hands the player was dealt into.
+        vpip (int): The hands in which the player called or raised before the flop.
+        pfr (int): The hands in which the player raised before the flop.
+        aggressive (int): The player's bets and raises after the flop.
+        calls (int): The player's calls after the flop.
+        saw_flop (int): The hands in which the player had not folded when the flop was dealt.
+        showdowns (int): The hands in which the player showed down after seeing the flop.
+        showdowns_won (int): The showdowns in which the player won more than their uncalled bet.
+        won (int): The player's net winnings, in the file's units.
+        big_blinds_won (float): The player's net winnings, in big blinds of each hand.
+    """
+    def __init__(self, name):
+        self.name = name
+        self.hands = 0
+        self.vpip = 0
+        self.pfr = 0
+        self.aggressive = 0
+        self.calls = 0
+        self.saw_flop = 0
+        self.showdowns = 0
+        self.showdowns_won = 0
+        self.won = 0
+        self.big_blinds_won = 0.0
+
+    def merge(self, other):
+        """Adds the tallies of another PlayerStats for the same player into this one, and returns this one."""
+        self.hands += other.hands
+        self.vpip += other.vpip
+        self.pfr += other.pfr
+        self.aggressive += other.aggressive
+        self.calls += other.calls
+        self.saw_flop += other.saw_flop
+        self.showdowns += other.showdowns
+        self.showdowns_won += other.showdowns_won
+        self.won += other.won
+        self.big_blinds_won += other.big_blinds_won
+        return self
+
+    def summary(self):
+        """
+        Returns the player's statistics as a dict.
+
+        VPIP and PFR are percentages of hands dealt, WTSD is the percentage of flops seen
+        which went to showdown, W$SD is the percentage of showdowns won, and AF is post-flop
+        bets and raises per call; a statistic with nothing to measure is None.
+        """
+        def percent(count, total):
+            return 100.0 * count / total if total else None
+
+        return {
+            'hands': self.hands,
+            'vpip': percent(self.vpip, self.hands),
+            'pfr': percent(self.pfr, self.hands),
+            'af': self.aggressive / self.calls if self.calls else None,
+            'wtsd': percent(self.showdowns, self.saw_flop),
+            'wsd': percent(self.showdowns_won, self.showdowns),
+            'bb_per_100': 100.0 * self.big_blinds_won / self.hands if self.hands else None,
+        }
+
+
+class Stats:
+    """
+    The PlayerStats of every player in a set of hand histories, keyed by name.
+
+    Attributes:
+        players (dict): Maps each player's name to their PlayerStats, in the order first seen.
+    """
+    def __init__(self):
+        self.players = {}
+
+    def __getitem__(self, name):
+        return self.players[name]
+
+    def get(self, name):
+        """Returns the PlayerStats of a player, adding them if they have not been seen."""
+        if name not in self.players:
+            self.players[name] = PlayerStats(name)
+        return self.players[name]
+
+    def add_chunk(self, chunk, names):
+        """
+        Tallies every hand of a history Chunk.
+
+        The whole chunk is tallied at once with array operations over its hand, seat and
+        action rows, so the cost per hand is small however many hands are analysed.
+
+        Parameters:
+            chunk (Chunk): A chunk read by a HistoryReader.
+            names (list): The name of the player in each seat.
+        """
+        num_hands, num_seats = chunk.seats.shape
+        if not num_hands:
+            return
+        actions = chunk.actions
+        hand = np.repeat(np.arange(num_hands), chunk.hands['num_actions'].astype(np.intp))
+        seat = actions['seat'].astype(np.intp) - 1
+        street = actions['street']
+        kind = actions['action']
+        preflop = street == 0
+
+        def per_seat(mask):
+            """Returns, for each hand and seat, whether some action matched mask."""
+            found = np.zeros((num_hands, num_seats), dtype=bool)
+            found[hand[mask], seat[mask]] = True
+            return found
+
+        dealt = chunk.seats['hole'][:, :, 0] != NO_CARD
+        vpip = per_seat(preflop & np.isin(kind, _VOLUNTARY))
+        pfr = per_seat(preflop & (kind == _RAISE))
+        flop_dealt = chunk.hands['board'][:, 2] != NO_CARD
+        saw_flop = dealt & ~per_seat(preflop & (kind == _FOLD)) & flop_dealt[:, None]
+        showdown = chunk.seats['showdown'].astype(bool) & saw_flop
+        won = chunk.seats['won']
+        aggressive = np.bincount(seat[~preflop & np.isin(kind, _AGGRESSIVE)], minlength=num_seats)
+        calls = np.bincount(seat[~preflop & (kind == _CALL)], minlength=num_seats)
+
+        # a player's amount is their total bet for the street, so what they put into the pot
+        # on each street is their largest amount on it
+        invested = np.zeros((num_hands, num_seats, 4), dtype=np.int64)
+        np.maximum.at(invested, (hand, seat, street.astype(np.intp)), actions['amount'])
+        put_in = invested.sum(axis=2)
+        net = won - put_in
+        # the part of a bet nobody else matched comes back to the bettor, and is not won at showdown
+        most_matched = np.sort(put_in, axis=1)[:, -2] if num_seats > 1 else np.zeros(num_hands, dtype=np.int64)
+        uncalled = np.maximum(put_in - most_matched[:, None], 0)
+        big_blinds = net / chunk.hands['big_blind'][:, None]
+
+        for i in range(num_seats):
+            stats = self.get(names[i])
+            stats.hands += int(dealt[:, i].sum())
+            stats.vpip += int(vpip[:, i].sum())
+            stats.pfr += int(pfr[:, i].sum())
+            stats.aggressive += int(aggressive[i])
+            stats.calls += int(calls[i])
+            stats.saw_flop += int(saw_flop[:, i].sum())
+            stats.showdowns += int(showdown[:, i].sum())
+            stats.showdowns_won += int((showdown[:, i] & (won[:, i] > uncalled[:, i])).sum())
+            stats.won += int(net[:, i].sum())
+            stats.big_blinds_won += float(big_blinds[:, i].sum())
+
+    def merge(self, other):
+        """Adds the tallies of another Stats into this one, and returns this one."""
+        for name, stats in other.players.items():
+            self.get(name).merge(stats)
+        return self
+
+    def summary(self):
+        """Returns a dict mapping each player's name to their PlayerStats.summary()."""
+        return {name: stats.summary() for name, stats in self.players.items()}
+
+
+def stream_stats(reader, start=0, stop=None):
+    """
+    Tallies the chunks of a history file one at a time.
+
+    Only one chunk is held in memory at once. After each chunk, the running Stats is
+    yielded, so a caller can report progress over a long file.
+
+    Parameters:
+        reader (HistoryReader): The file to read.
+        start (int): The index of the first chunk to read.
+        stop (int): The index after the last chunk to read, defaulting to the end of the file.
+
+    Yields:
+        Stats: The same running Stats object, after each chunk has been added.
+    """
+    stats = Stats()
+    with open(reader.path, 'rb') as f:
+        for offset, _, _ in reader.index()[start:stop]:
+            stats.add_chunk(reader.read_chunk(f, offset), reader.names)
+            yield stats
+
+
+def file_stats(path, start=0, stop=None):
+    """Returns the Stats of the chunks from start to stop of one history file."""
+    stats = Stats()
+    for stats in stream_stats(HistoryReader(path), start, stop):
+        pass
+    return stats
+
+
+def analyse(paths, workers=None):
+    """
+    Computes the statistics of every player in one or more hand-history files.
+
+    The chunks of every file are split into ranges, one or more for each worker process;
+    each worker tallies its ranges into a partial Stats, and the partial results are merged
+    in order, so the counts are the same however many workers are used.
+
+    Parameters:
+        paths: A history file, or a list of them.
+        workers (int): The number of processes, defaulting to the number of cores. With one
+            worker, everything is read in this process.
+
+    Returns:
+        Stats: The merged statistics.
+    """
+    if isinstance(paths, str):
+        paths = [paths]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    tasks = []
+    for path in paths:
+        num_chunks = len(HistoryReader(path).index())
+        start = 0
+        for count in split_work(num_chunks, min(workers, num_chunks) or 1):
+            tasks.append((path, start, start + count))
+            start += count
+
+    result = Stats()
+    if workers == 1:
+        for task in tasks:
+            result.merge(file_stats(*task))
+        return result
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for partial in pool.map(file_stats, *zip(*tasks)):
+            result.merge(partial)
+    return result
+
+
+def format_stats(stats):
+    """Returns a table of each player's statistics, one line per player."""
+    def cell(value, digits=1):
+        return '-' if value is None else '{0:.{1}f}'.format(value, digits)
+
+    lines = ['{0:<20} {1:>9} {2:>6} {3:>6} {4:>5} {5:>6} {6:>6} {7:>9}'.format(
+        'Player', 'Hands', 'VPIP', 'PFR', 'AF', 'WTSD', 'W$SD', 'bb/100')]
+    for name, summary in stats.summary().items():
+        lines.append('{0:<20} {1:>9} {2:>6} {3:>6} {4:>5} {5:>6} {6:>6} {7:>9}'.format(
+            name, summary['hands'], cell(summary['vpip']), cell(summary['pfr']), cell(summary['af'], 2),
+            cell(summary['wtsd']), cell(summary['wsd']), cell(summary['bb_per_100'], 2)))
+    return '\n'.join(lines)
@@ -0,0 +1,244 @@
+"""benchmark.py
+
+This file contains a benchmark suite which times the evaluator, the deck, whole hands and equity calculations, and compares the results with a saved baseline.
+"""
+
+import sys
+import json
+import time
+import platform
+import argparse
+from statistics import median
+import numpy as np
+from numpy import random
+from hands import Card
+from determine_hand import identify_hand, best_hand
+from equity import monte_carlo_equity
+from game import Deck, Game
+from simulate import Simulator, check_call, random_action, tight_aggressive
+
+# the fraction by which a benchmark may be slower than the baseline before it is flagged
+DEFAULT_THRESHOLD = 0.10
+
+
+def _random_hands(rng, count, size):
+    """Returns count lists of size distinct random Cards."""
+    return [[Card.from_int(int(code)) for code in rng.permutation(52)[:size]] for _ in range(count)]
+
+
+def _identify_hand(rng, scale):
+    hands = _random_hands(rng, int(2000 * scale) or 1, 5)
+
+    def run():
+        for cards in hands:
+            identify_hand(cards)
+        return len(hands)
+    return run, 'evals'
+
+
+def _best_hand(rng, scale):
+    hands = _random_hands(rng, int(2000 * scale) or 1, 7)
+
+    def run():
+        for cards in hands:
+            best_hand(cards)
+        return len(hands)
+    return run, 'evals'
+
+
+def _deck(rng, scale):
+    deck = Deck(rng)
+    count = int(5000 * scale) or 1
+
+    def run():
+        # a six-handed deal: twelve hole cards, three burns and five board cards
+        for _ in range(count):
+            deck.reset()
+            deck.shuffle(20)
+            for _ in range(20):
+                deck.get_top_card()
+        return count
+    return run, 'deals'
+
+
+def _game_hand(rng, scale):
+    simulator = Simulator([tight_aggressive, check_call, random_action] * 2)
+    count = int(500 * scale) or 1
+
+    def run():
+        simulator.play_hands(count, rng)
+        return count
+    return run, 'hands'
+
+
+def _equity(rng, scale):
+    iterations = int(100000 * scale) or 1
+    seed = int(rng.integers(2 ** 32))
+
+    def run():
+        monte_carlo_equity(['AhKh', 'QsQd'], iterations=iterations, seed=seed)
+        return iterations
+    return run, 'trials'
+
+
+def _showdown(num_players):
+    def setup(rng, scale):
+        game = Game(num_players, 1, 2, names=['Player {0}'.format(i + 1) for i in range(num_players)],
+                    button=1, rng=rng)
+        for p in game.get_players():
+            p.set_stack(1000)
+        game.start_hand()
+        game.show_flop()
+        game.show_turn()
+        game.show_river()
+        # uneven contributions, so that the pot has a side pot for every player
+        for i, p in enumerate(game.players_in_hand):
+            game.pots.add(p, 10 * (i + 1))
+        count = int(1000 * scale) or 1
+
+        def run():
+            for _ in range(count):
+                game.showdown()
+            return count
+        return run, 'showdowns'
+    return setup
+
+
+# each benchmark is set up as setup(rng, scale), which returns a function doing a fixed amount
+# of work and the unit that work is counted in; the function returns how many units it did
+BENCHMARKS = {
+    'identify_hand': _identify_hand,
+    'best_hand': _best_hand,
+    'deck': _deck,
+    'game_hand': _game_hand,
+    'equity': _equity,
+    'showdown_2': _showdown(2),
+    'showdown_6': _showdown(6),
+    'showdown_10': _showdown(10),
+}
+
+
+def measure(run, warmup=1, repeats=5):
+    """
+    Times a benchmark function.
+
+    Parameters:
+        run (callable): Does a fixed amount of work and returns the number of units done.
+        warmup (int): The number of runs made first and not timed, to fill caches.
+        repeats (int): The number of timed runs.
+
+    Returns:
+        tuple: The number of units done per run and the seconds each timed run took.
+    """
+    for _ in range(warmup):
+        run()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        units = run()
+        times.append(time.perf_counter() - start)
+    return units, times
+
+
+def run_benchmarks(names=None, warmup=1, repeats=5, scale=1.0, seed=0):
+    """
+    Runs benchmarks and returns their results in a form which can be saved as JSON.
+
+    Parameters:
+        names (list): The benchmarks to run, from BENCHMARKS; all of them by default.
+        warmup (int): The number of untimed runs of each benchmark.
+        repeats (int): The number of timed runs of each benchmark.
+        scale (float): Multiplies the amount of work in each run, e.g. 0.1 for a quick check.
+        seed: The seed of the cards and decisions, so every run does the same work.
+
+    Returns:
+        dict: The platform under 'environment', and under 'benchmarks', for each benchmark,
+        its unit, the units per run, the time of every run, and the median and best rates
+        in units per second.
+    """
+    results = {}
+    for name in names or BENCHMARKS:
+        run, unit = BENCHMARKS[name](random.default_rng(seed), scale)
+        units, times = measure(run, warmup, repeats)
+        results[name] = {
+            'unit': unit,
+            'units': units,
+            'times': times,
+            'median': units / median(times),
+            'best': units / min(times),
+        }
+    return {
+        'environment': {
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+        },
+        'benchmarks': results,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compares benchmark results with a baseline, by their median rates.
+
+    Returns:
+        list: (name, baseline rate, rate, change, regressed) for each benchmark in both,
+        where change is the fractional change in rate, negative when slower, and regressed
+        is whether it is slower by more than threshold.
+    """
+    rows = []
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            continue
+        before = baseline['benchmarks'][name]['median']
+        change = result['median'] / before - 1
+        rows.append((name, before, result['median'], change, change < -threshold))
+    return rows
+
+
+def format_results(results, comparison=None):
+    """Returns a table of the results, with the change from the baseline if a comparison is given."""
+    changes = {row[0]: row for row in comparison or []}
+    lines = []
+    for name, result in results['benchmarks'].items():
+        line = '{0:<14} {1:>14,.0f} {2}/s (best {3:,.0f})'.format(
+            name, result['median'], result['unit'], result['best'])
+        if name in changes:
+            line += '  {0:+.1%} vs baseline{1}'.format(changes[name][3], '  REGRESSION' if changes[name][4] else '')
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the hand evaluator, deck, game and equity calculator.')
+    parser.add_argument('names', nargs='*',
+                        help='benchmarks to run, from {0}; all by default'.format(', '.join(BENCHMARKS)))
+    parser.add_argument('--repeats', type=int, default=5, help='timed runs of each benchmark')
+    parser.add_argument('--warmup', type=int, default=1, help='untimed runs before timing')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiplies the work in each run')
+    parser.add_argument('--save', metavar='FILE', help='save the results as JSON')
+    parser.add_argument('--baseline', metavar='FILE', help='compare with results saved earlier')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='flag benchmarks slower than the baseline by more than this fraction')
+    args = parser.parse_args(args)
+    for name in args.names:
+        if name not in BENCHMARKS:
+            parser.error('unknown benchmark {0!r}'.format(name))
+
+    results = run_benchmarks(args.names, args.warmup, args.repeats, args.scale)
+    comparison = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            comparison = compare(results, json.load(f), args.threshold)
+    print(format_results(results, comparison))
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2)
+    # a nonzero exit status lets a build fail on a regression
+    return 1 if comparison and any(row[4] for row in comparison) else 0
+
+
+if __name__ == '__main__':
+    # usage: python3 benchmark.py [names] [--save FILE] [--baseline FILE] [--threshold 0.1]
+    sys.exit(main())
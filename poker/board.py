@@ -0,0 +1,204 @@
+"""board.py
+
+This file contains a board analyser which describes the texture of a flop, turn or river and scores every hole-card combo against it.
+"""
+
+from functools import lru_cache
+from itertools import permutations
+import numpy as np
+from hands import Card, parse_cards
+from evaluator import WHEEL_MASK
+from ranges import COMBOS, COMBO_INDEX, NUM_COMBOS, combo_index
+from determine_hand import _batch_rank_table, _BATCH_CARD_KEYS, _BATCH_CARD_BITS, _BATCH_FLUSH_TABLE
+
+# the number of canonical boards whose scores are kept; each takes about 5 KB
+BOARD_CACHE_SIZE = 4096
+
+_SUIT_PERMS = list(permutations(range(4)))
+# _COMBO_PERMS[p][k] is the index of combo k after relabelling its suits with _SUIT_PERMS[p]
+_COMBO_PERMS = np.array([
+    COMBO_INDEX[(COMBOS[:, 0] & ~3) | np.array(perm)[COMBOS[:, 0] & 3],
+                (COMBOS[:, 1] & ~3) | np.array(perm)[COMBOS[:, 1] & 3]]
+    for perm in _SUIT_PERMS])
+
+
+def canonical_board(codes):
+    """
+    Returns the canonical form of a board and the suit relabelling which produces it.
+
+    Boards which differ only by a relabelling of suits, such as Ah7h2c and As7s2d, make
+    exactly the same hands, so they share one canonical form: the smallest sorted tuple of
+    card encodings over every relabelling.
+
+    Returns:
+        tuple: The canonical tuple of encodings, and the index of the relabelling in _SUIT_PERMS.
+    """
+    best = None
+    for i, perm in enumerate(_SUIT_PERMS):
+        mapped = tuple(sorted((c & ~3) | perm[c & 3] for c in codes))
+        if best is None or mapped < best[0]:
+            best = (mapped, i)
+    return best
+
+
+@lru_cache(maxsize=BOARD_CACHE_SIZE)
+def _canonical_scores(codes):
+    """Scores every combo against a canonical board; the result is cached and must not be modified."""
+    board = np.array(codes, dtype=np.intp)
+    first, second = COMBOS[:, 0], COMBOS[:, 1]
+    # the board's rank key is summed once, then each combo adds just its own two cards
+    key = _BATCH_CARD_KEYS[board].sum()
+    scores = _batch_rank_table(len(board) + 2)[key + _BATCH_CARD_KEYS[first] + _BATCH_CARD_KEYS[second]]
+    suit_counts = np.bincount(board & 3, minlength=4)
+    if suit_counts.max() >= 3:
+        # with at most seven cards, only the board's longest suit can make a flush
+        shift = 13 * int(suit_counts.argmax())
+        board_mask = (int(_BATCH_CARD_BITS[board].sum()) >> shift) & 0x1FFF
+        hole_masks = ((_BATCH_CARD_BITS[first] + _BATCH_CARD_BITS[second]) >> shift) & 0x1FFF
+        flush = _BATCH_FLUSH_TABLE[board_mask | hole_masks]
+        scores = np.where(flush > 0, flush, scores)
+    scores[np.isin(COMBOS, board).any(axis=1)] = 0
+    scores.setflags(write=False)
+    return scores
+
+
+def board_cache_info():
+    """Returns the hits, misses, maximum size and current size of the cache of board scores."""
+    return _canonical_scores.cache_info()
+
+
+class Board:
+    """
+    Represents a flop, turn or river, analysed once so that many hands can be judged against it.
+
+    The rank and suit histograms are built when the board is created, and describe its
+    texture. scores() gives the strength of all 1326 hole-card combos at once: the board's
+    rank key and suit masks are computed once, so each combo adds only its own two cards,
+    rather than best_hand examining every five-card combination of each hand. Scores are
+    cached for the most recently used canonical boards, so that boards which differ only
+    by suits share one entry.
+
+    Attributes:
+        cards (list): The cards on the board.
+        codes (list): The integer encodings of the cards.
+        rank_counts (list): The number of cards of each rank index, from 0 (deuce) to 12 (ace).
+        suit_counts (list): The number of cards of each suit index.
+        rank_mask (int): A bitmask of the rank indices on the board.
+    """
+    def __init__(self, cards):
+        if isinstance(cards, str):
+            cards = parse_cards(cards)
+        self.cards = [c if isinstance(c, Card) else Card.from_int(int(c)) for c in cards]
+        if not(3 <= len(self.cards) <= 5):
+            raise ValueError('a board has three to five cards')
+        self.codes = [c.to_int() for c in self.cards]
+        if len(set(self.codes)) != len(self.codes):
+            raise ValueError('a board cannot contain the same card twice')
+        self.rank_counts = [0] * 13
+        self.suit_counts = [0] * 4
+        self.rank_mask = 0
+        for code in self.codes:
+            self.rank_counts[code >> 2] += 1
+            self.suit_counts[code & 3] += 1
+            self.rank_mask |= 1 << (code >> 2)
+        self._scores = None
+
+    def __len__(self):
+        return len(self.cards)
+
+    def __str__(self):
+        return ''.join(repr(c) for c in self.cards)
+
+    def deal(self, card):
+        """Returns the board for the next street, with card added."""
+        if isinstance(card, str):
+            card = Card.from_str(card)
+        return Board(self.cards + [card])
+
+    def is_paired(self):
+        """Returns whether two or more cards on the board share a rank."""
+        return max(self.rank_counts) >= 2
+
+    def flush_possible(self):
+        """Returns whether some hole cards would make a flush with this board."""
+        return max(self.suit_counts) >= 3
+
+    def flush_draw_possible(self):
+        """Returns whether some hole cards would make a four-card flush with cards still to come."""
+        return len(self.cards) < 5 and max(self.suit_counts) == 2
+
+    def straight_possible(self):
+        """Returns whether some hole cards would make a straight with this board."""
+        windows = [0b11111 << low for low in range(9)] + [WHEEL_MASK]
+        return any(bin(self.rank_mask & window).count('1') >= 3 for window in windows)
+
+    def texture(self):
+        """
+        Returns a short description of the board's texture, such as 'paired two-tone connected'.
+
+        The description names how the ranks pair up, how many cards share the longest suit,
+        and whether a straight is possible.
+        """
+        counts = sorted(self.rank_counts, reverse=True)
+        if counts[0] == 4:
+            pairing = 'quads'
+        elif counts[0] == 3:
+            pairing = 'full' if counts[1] == 2 else 'trips'
+        elif counts[0] == 2:
+            pairing = 'double-paired' if counts[1] == 2 else 'paired'
+        else:
+            pairing = 'unpaired'
+        longest = max(self.suit_counts)
+        if longest == len(self.cards):
+            suits = 'monotone'
+        else:
+            suits = {1: 'rainbow', 2: 'two-tone', 3: 'three-flush', 4: 'four-flush'}[longest]
+        connected = 'connected' if self.straight_possible() else 'disconnected'
+        return ' '.join((pairing, suits, connected))
+
+    def scores(self):
+        """
+        Returns the strength of every hole-card combo with this board.
+
+        Returns:
+            np.ndarray: A read-only int32 array indexed like ranges.COMBOS, holding the
+            strength from hands.pack_strength of each combo, or 0 for combos which contain
+            a board card.
+        """
+        if self._scores is None:
+            canonical, perm = canonical_board(self.codes)
+            self._scores = _canonical_scores(canonical)[_COMBO_PERMS[perm]]
+            self._scores.setflags(write=False)
+        return self._scores
+
+    def strength(self, hole_cards):
+        """Returns the strength of the best hand made by hole cards, such as 'AhKh' or two Cards, with this board."""
+        if isinstance(hole_cards, str):
+            hole_cards = parse_cards(hole_cards)
+        index = combo_index(hole_cards[0].to_int(), hole_cards[1].to_int())
+        if self.scores()[index] == 0:
+            raise ValueError('the hole cards {0} are on the board'.format(hole_cards))
+        return int(self.scores()[index])
+
+    def percentile(self, hole_cards, weights=None):
+        """
+        Returns the share of opposing hole cards which the given hole cards beat, counting ties as half.
+
+        Parameters:
+            hole_cards: A string such as 'AhKh' or two Cards.
+            weights (np.ndarray): Optional weights of the opposing combos, such as Range.weights;
+                every combo is equally likely by default.
+        """
+        if isinstance(hole_cards, str):
+            hole_cards = parse_cards(hole_cards)
+        strength = self.strength(hole_cards)
+        scores = self.scores()
+        if weights is None:
+            weights = np.ones(NUM_COMBOS)
+        # opposing combos can hold neither a board card nor one of these hole cards
+        weights = np.where((scores > 0) & ~np.isin(COMBOS, [c.to_int() for c in hole_cards]).any(axis=1),
+                           weights, 0.0)
+        total = weights.sum()
+        if not total:
+            raise ValueError('no opposing hole cards are possible')
+        return float((weights[scores < strength].sum() + weights[scores == strength].sum() / 2) / total)
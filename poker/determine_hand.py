@@ -3,9 +3,10 @@
 This file contains utilities for determining the winning poker hand given lists of cards.
 """
 
+import numpy as np
 from hands import *
-from collections import Counter
-from itertools import combinations
+from evaluator import evaluate, RANK_TABLE, FLUSH_TABLE
+from collections import Counter, OrderedDict, namedtuple
 
 
 class DetermineHand:
@@ -26,7 +27,7 @@ class DetermineHand:
             if not isinstance(c, Card):
                 raise TypeError('{0} in cards is not a Card'.format(c))
         self.cards = cards
-        self.cards.sort(reverse=True)
+        self.cards.sort(key=card_rank, reverse=True)
 
         # count the number of matching cards, store them in most_common
         num_counts = Counter()
@@ -43,29 +44,29 @@ class DetermineHand:
         straight = self._is_straight()
         if flush and straight:
             if self.cards[0].get_num() == 1 and self.cards[1].get_num() == 5:
-                return StraightFlush(5)  # wheel (ace-to-five) straight flush
-            return StraightFlush(self.cards[0].get_num())
+                return StraightFlush.trusted(5)  # wheel (ace-to-five) straight flush
+            return StraightFlush.trusted(self.cards[0].get_num())
 
         elif self._is_quads():
-            return FourOfAKind(self.most_common[0][0], self.most_common[1][0])
+            return FourOfAKind.trusted(self.most_common[0][0], self.most_common[1][0])
 
         elif self._is_full_house():
-            return FullHouse(self.most_common[0][0], self.most_common[1][0])
+            return FullHouse.trusted(self.most_common[0][0], self.most_common[1][0])
 
         elif flush:
-            return Flush(self.cards)
+            return Flush.trusted(self.cards)
 
         elif straight:
             if self.cards[0].get_num() == 1 and self.cards[1].get_num() == 5:
-                return Straight(5)  # wheel (ace-to-five) straight
-            return Straight(self.cards[0].get_num())
+                return Straight.trusted(5)  # wheel (ace-to-five) straight
+            return Straight.trusted(self.cards[0].get_num())
 
         elif self._is_trips():
             kickers = []
             for c in self.cards:
                 if c.get_num() != self.most_common[0][0]:
                     kickers.append(c)
-            return ThreeOfAKind(self.most_common[0][0], kickers)
+            return ThreeOfAKind.trusted(self.most_common[0][0], kickers)
 
         elif self._is_two_pair():
             paired_cards = []
@@ -76,20 +77,20 @@ class DetermineHand:
                 if e[1] == 1:
                     kicker = e[0]
             assert kicker > 0
-            return TwoPair(paired_cards[0], paired_cards[1], kicker)
+            return TwoPair.trusted(paired_cards[0], paired_cards[1], kicker)
 
         elif self._is_pair():
             paired_cards = [e[0] for e in self.most_common if e[1] == 2]
             paired_card = paired_cards[0]
             kickers = [card for card in self.cards if card.get_num() != paired_card]
-            return OnePair(paired_card, kickers)
+            return OnePair.trusted(paired_card, kickers)
 
         else:
             for e in self.most_common:
                 if e[1] != 1:
                     # usually handles five-of-a-kind
                     raise ValueError("Hand does not seem to be a valid poker hand.")
-            return HighCard(self.cards)
+            return HighCard.trusted(self.cards)
 
     def _is_straight_flush(self):
         # never called due to optimization
@@ -128,32 +129,316 @@ class DetermineHand:
         return len(self.most_common) == 4 and self.most_common[0][1] == 2  # second condition here is a sanity check
 
     def _no_duplicates(self):
-        for i in range(len(self.cards)):
-            for j in range(i + 1, len(self.cards)):
-                if self.cards[i].is_same(self.cards[j]):
-                    return False
-        return True
+        return len({c.code for c in self.cards}) == len(self.cards)
+
+
+# there are 7,462 distinct five-card hands once suits are ignored, apart from whether the
+# hand is a flush, so a cache of this size holds every one of them
+HAND_CACHE_SIZE = 7462
+
+# the hands which hold some of their Cards, and so are rebuilt from the caller's cards
+_CARD_HANDS = (Flush, HighCard, ThreeOfAKind, OnePair)
+
+CacheInfo = namedtuple('CacheInfo', ['hits', 'misses', 'maxsize', 'currsize'])
+
+
+class HandCache:
+    """
+    A bounded cache of identified five-card hands, keyed by their ranks and whether they are a flush.
+
+    Two five-card hands with the same ranks are the same poker hand unless one is a flush,
+    so only what depends on the ranks is cached: the kind of hand, its strength, and its
+    significant numbers. Every lookup builds a new Hand from those and the caller's own
+    cards, so its kickers and flush cards are always the caller's. When the cache is
+    full, the least recently used hand is dropped.
+
+    Attributes:
+        maxsize (int): The most hands kept, which caps the cache's memory; 0 disables it.
+        hits (int): The number of lookups answered from the cache.
+        misses (int): The number of lookups which had to identify the hand.
+    """
+    def __init__(self, maxsize=HAND_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, cards):
+        """Returns the Hand made by five valid, distinct cards, identifying it only if it is not cached."""
+        suit = cards[0].suit
+        key = (tuple(sorted([c.rank for c in cards])),
+               cards[1].suit == suit and cards[2].suit == suit and cards[3].suit == suit and cards[4].suit == suit)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            cls, strength, nums = entry
+            if cls not in _CARD_HANDS:
+                return cls.trusted(*nums, strength)
+            ordered = sorted(cards, key=card_rank, reverse=True)
+            if cls is Flush or cls is HighCard:
+                return cls.trusted(ordered, strength)
+            return cls.trusted(nums[0], [c for c in ordered if c.num != nums[0]], strength)
+        self.misses += 1
+        hand = DetermineHand(list(cards)).identify()
+        if self.maxsize > 0:
+            # the numbers which, with the class, make up the hand, from most to least significant
+            nums = [Card.num_of(r) for r in unpack_strength(hand.strength)[1]]
+            self._entries[key] = (type(hand), hand.strength, nums)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return hand
+
+    def resize(self, maxsize):
+        """Changes the most hands kept, dropping the least recently used hands if there are too many."""
+        self.maxsize = maxsize
+        while len(self._entries) > max(maxsize, 0):
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        """Empties the cache and resets its statistics."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def info(self):
+        """Returns the hits, misses, maximum size and current size of the cache."""
+        return CacheInfo(self.hits, self.misses, self.maxsize, len(self._entries))
+
+
+# the cache in front of identify_hand
+hand_cache = HandCache()
 
 
 def identify_hand(cards):
-    """A convenient function for returning the hand representation given five cards."""
-    return DetermineHand(cards).identify()
+    """
+    A convenient function for returning the hand representation given five cards.
+
+    Hands are looked up in hand_cache by their ranks and whether they are a flush, so
+    each distinct hand is identified once, and every later hand like it is built straight
+    from what was cached and its own cards. The cards are still checked on every call.
+    """
+    if not isinstance(cards, list):
+        raise TypeError('The list of cards must be passed in.')
+    if len(cards) != 5:
+        raise ValueError('The list of cards must have five cards.')
+    for c in cards:
+        if not isinstance(c, Card):
+            raise TypeError('{0} in cards is not a Card'.format(c))
+    if len({c.code for c in cards}) != 5:
+        raise ValueError("Hand appears to contain multiple of the same card.")
+    return hand_cache.get(cards)
+
+
+def hand_cache_info():
+    """Returns the hits, misses, maximum size and current size of the cache in front of identify_hand."""
+    return hand_cache.info()
 
 
 def best_hand(cards):
     """
-    Returns the best five-card hand given more than five cards.
+    Returns the best five-card hand given five to seven cards.
 
     Usually, seven cards will be passed into this function: two for the hole cards, three
-    for the flop, one for the turn, and one for the river. The function uses the combinations
-    function from Python's itertools module to generate all possible ways to choose
-    five cards from the list, then uses get_hand to identify what the hand is, and finally
-    uses the built-in max function to determine the best hand of all combinations.
+    for the flop, one for the turn, and one for the river. The strength of the best hand is
+    looked up directly by the table-driven evaluator in evaluator.py, without examining each
+    five-card combination. Only the strength is kept; the Hand object is built from it if
+    its name, kickers or cards are asked for.
 
     Parameters:
         cards (list): The list of cards from which the best hand should be identified.
 
     Returns:
-        Hand: A subclass of Hand that corresponds to the best five-card poker hand.
+        HandValue: The best five-card poker hand, which builds the corresponding Hand on demand.
+    """
+    if not isinstance(cards, list):
+        raise TypeError('The list of cards must be passed in.')
+    if not(5 <= len(cards) <= 7):
+        raise ValueError('The list of cards must have five to seven cards.')
+    for c in cards:
+        if not isinstance(c, Card):
+            raise TypeError('{0} in cards is not a Card'.format(c))
+    if len({c.code for c in cards}) != len(cards):
+        raise ValueError("Hand appears to contain multiple of the same card.")
+    return HandValue(evaluate(cards), cards)
+
+
+def hand_from_strength(strength, cards):
+    """
+    Builds the Hand object corresponding to a strength returned by the evaluator.
+
+    Parameters:
+        strength (int): The strength of the best hand among cards, as packed by pack_strength.
+        cards (list): The cards the strength was evaluated from, used to supply kicker and flush cards.
+
+    Returns:
+        Hand: A subclass of Hand that corresponds to the strength.
+    """
+    category, ranks = unpack_strength(strength)
+    nums = [Card.num_of(r) for r in ranks]
+    if category == StraightFlush.value:
+        return StraightFlush.trusted(nums[0], strength)
+    elif category == FourOfAKind.value:
+        return FourOfAKind.trusted(nums[0], nums[1], strength)
+    elif category == FullHouse.value:
+        return FullHouse.trusted(nums[0], nums[1], strength)
+    elif category == Straight.value:
+        return Straight.trusted(nums[0], strength)
+    elif category == TwoPair.value:
+        return TwoPair.trusted(nums[0], nums[1], nums[2], strength)
+
+    if category == Flush.value:
+        suit_counts = Counter(c.get_suit() for c in cards)
+        flush_suit = suit_counts.most_common(1)[0][0]
+        cards = [c for c in cards if c.get_suit() == flush_suit]
+    by_num = {c.get_num(): c for c in cards}
+    if category == Flush.value:
+        return Flush.trusted([by_num[n] for n in nums], strength)
+    elif category == ThreeOfAKind.value:
+        return ThreeOfAKind.trusted(nums[0], [by_num[n] for n in nums[1:]], strength)
+    elif category == OnePair.value:
+        return OnePair.trusted(nums[0], [by_num[n] for n in nums[1:]], strength)
+    return HighCard.trusted([by_num[n] for n in nums], strength)
+
+
+class HandValue:
+    """
+    A poker hand held as just its integer strength, which builds the full Hand only when needed.
+
+    Comparing, sorting and hashing use the strength alone, exactly as a Hand does, and a
+    HandValue compares equal to a Hand of the same strength. The Hand subclass, with its
+    kickers and cards, is built from the strength the first time it is asked for: through
+    the hand attribute, str(), or any attribute of the Hand, such as high_num or kickers.
+
+    Attributes:
+        strength (int): The category and tie-breaking ranks, as packed by pack_strength.
+        value (int): The category of the hand, as in Hand.value.
+    """
+    __slots__ = ('strength', '_cards', '_hand')
+
+    def __init__(self, strength, cards):
+        self.strength = strength
+        # a copy, so that the hand is built from these cards even if the caller's list changes
+        self._cards = tuple(cards)
+        self._hand = None
+
+    @property
+    def value(self):
+        return self.strength >> 20
+
+    @property
+    def hand(self):
+        """The Hand this value represents, built on first use."""
+        if self._hand is None:
+            self._hand = hand_from_strength(self.strength, self._cards)
+        return self._hand
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.hand, name)
+
+    def __lt__(self, other):
+        return self.strength < other.strength
+
+    def __le__(self, other):
+        return self.strength <= other.strength
+
+    def __gt__(self, other):
+        return self.strength > other.strength
+
+    def __ge__(self, other):
+        return self.strength >= other.strength
+
+    def __eq__(self, other):
+        if not isinstance(other, (Hand, HandValue)):
+            return NotImplemented
+        return self.strength == other.strength
+
+    def __ne__(self, other):
+        if not isinstance(other, (Hand, HandValue)):
+            return NotImplemented
+        return self.strength != other.strength
+
+    def __hash__(self):
+        return hash(self.strength)
+
+    def __str__(self):
+        return str(self.hand)
+
+    def __repr__(self):
+        return '<HandValue {0}: {1}>'.format(self.strength, self)
+
+    def __getstate__(self):
+        return self.strength, self._cards
+
+    def __setstate__(self, state):
+        self.strength, self._cards = state
+        self._hand = None
+
+
+# Rank weights for the batch evaluator. Among hands with the same number of cards, the
+# weighted sum of rank counts is distinct for every multiset of ranks, and at most 7825759,
+# so it can index a dense NumPy table directly. Each weight is indexed by rank index.
+_BATCH_WEIGHTS = np.array(
+    [0, 1, 5, 22, 98, 453, 2031, 8698, 22854, 83661, 262349, 636345, 1479181], dtype=np.int64)
+_BATCH_CARD_KEYS = _BATCH_WEIGHTS[np.arange(52) >> 2]
+# one bit per card, at bit 13 * suit + rank index, so that a row sum holds all four suit masks
+_BATCH_CARD_BITS = np.left_shift(1, 13 * (np.arange(52) & 3) + (np.arange(52) >> 2)).astype(np.int64)
+_BATCH_FLUSH_TABLE = np.array(FLUSH_TABLE, dtype=np.int32)
+_batch_rank_tables = {}
+
+
+def _batch_rank_table(num_cards):
+    """Builds (once) the dense table mapping weighted rank keys of num_cards cards to strengths."""
+    table = _batch_rank_tables.get(num_cards)
+    if table is None:
+        keys = np.fromiter(RANK_TABLE.keys(), dtype=np.int64, count=len(RANK_TABLE))
+        strengths = np.fromiter(RANK_TABLE.values(), dtype=np.int32, count=len(RANK_TABLE))
+        counts = keys[:, None] // (5 ** np.arange(13, dtype=np.int64)) % 5
+        selected = counts.sum(axis=1) == num_cards
+        weighted = counts[selected] @ _BATCH_WEIGHTS
+        assert len(np.unique(weighted)) == len(weighted)
+        table = np.zeros(weighted.max() + 1, dtype=np.int32)
+        table[weighted] = strengths[selected]
+        _batch_rank_tables[num_cards] = table
+    return table
+
+
+def evaluate_batch(cards):
+    """
+    Returns the strengths of many hands at once, using NumPy operations rather than a loop over hands.
+
+    Each row holds the integer encodings (see Card.to_int) of five to seven distinct cards,
+    such as two hole cards followed by the board. The weighted rank counts of each row index
+    a dense rank table, the row's four suit masks index the evaluator's flush table, and the
+    flush strength is used wherever one exists. The strengths are the same integers as
+    evaluate and Hand.strength, so row i of the result equals best_hand(...).strength for
+    the cards in row i.
+
+    Parameters:
+        cards (np.ndarray): An integer array of shape (N, 5), (N, 6) or (N, 7).
+
+    Returns:
+        np.ndarray: An int32 array of shape (N,) holding the strength of each row.
     """
-    return max([identify_hand(list(c)) for c in combinations(cards, 5)])
+    cards = np.asarray(cards)
+    if cards.ndim != 2 or not(5 <= cards.shape[1] <= 7):
+        raise ValueError('cards must be an array of shape (N, 5), (N, 6) or (N, 7).')
+    if cards.size and (cards.min() < 0 or cards.max() > 51):
+        raise ValueError('card encodings must be between 0 and 51, inclusive.')
+    cards = cards.astype(np.intp, copy=False)
+
+    bits = _BATCH_CARD_BITS[cards]
+    suit_masks = bits.sum(axis=1)
+    if np.any(np.bitwise_or.reduce(bits, axis=1) != suit_masks):
+        raise ValueError('A hand appears to contain multiple of the same card.')
+
+    strengths = _batch_rank_table(cards.shape[1])[_BATCH_CARD_KEYS[cards].sum(axis=1)]
+    flush = np.zeros(len(cards), dtype=np.int32)
+    for s in range(4):
+        np.maximum(flush, _BATCH_FLUSH_TABLE[(suit_masks >> (13 * s)) & 0x1FFF], out=flush)
+    return np.where(flush > 0, flush, strengths)
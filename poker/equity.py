@@ -0,0 +1,454 @@
+"""equity.py
+
+This file contains Monte Carlo and exact calculators for the equity of hole-card ranges against each other.
+"""
+
+import time
+import numpy as np
+from functools import partial
+from itertools import chain, combinations, permutations, product
+from math import comb
+from hands import Card, parse_cards
+from determine_hand import evaluate_batch
+from runner import run_parallel
+from ranges import Range, AliasTable
+
+# a pot is worth SHARE_UNITS units, which divides evenly among any number of players from
+# 1 to 10, so that equity shares are whole numbers and results can be merged exactly
+SHARE_UNITS = 2520
+
+
+class EquityResult:
+    """
+    Represents the outcome of an equity calculation for two or more players.
+
+    All tallies are integers, so results computed separately (for example, by different
+    worker processes) can be merged exactly with merge(). When the result comes from
+    exact enumeration, each runout is counted with its multiplicity.
+
+    Attributes:
+        players (list): A label for each player's range.
+        trials (int): The number of runouts (or total weight of runouts) counted.
+        wins (list): For each player, the number of runouts won outright.
+        ties (list): For each player, the number of runouts where the pot was split.
+        share_units (list): For each player, the sum of their share of each pot, in SHARE_UNITS per pot.
+        share_squares (list): For each player, the sum of the squares of those shares.
+        exact (bool): Whether the result comes from enumerating every runout.
+    """
+    def __init__(self, players, exact=False):
+        self.players = list(players)
+        self.trials = 0
+        self.wins = [0] * len(self.players)
+        self.ties = [0] * len(self.players)
+        self.share_units = [0] * len(self.players)
+        self.share_squares = [0] * len(self.players)
+        self.exact = exact
+
+    def add(self, strengths, weights=None):
+        """
+        Tallies a batch of showdowns.
+
+        Parameters:
+            strengths (np.ndarray): An array of shape (N, num_players) of hand strengths.
+            weights (np.ndarray): Optional integer multiplicity of each showdown.
+        """
+        winners = strengths == strengths.max(axis=1, keepdims=True)
+        num_winners = winners.sum(axis=1)
+        units = winners * (SHARE_UNITS // num_winners)[:, None]
+        if weights is None:
+            weights = np.ones(len(strengths), dtype=np.int64)
+        weights = weights.astype(np.int64)
+        outright = winners & (num_winners == 1)[:, None]
+        for i in range(len(self.players)):
+            self.wins[i] += int(weights @ outright[:, i])
+            self.ties[i] += int(weights @ (winners[:, i] & ~outright[:, i]))
+            self.share_units[i] += int(weights @ units[:, i])
+            self.share_squares[i] += int(weights @ (units[:, i] * units[:, i]))
+        self.trials += int(weights.sum())
+
+    def merge(self, other):
+        """Adds the tallies of another result for the same players into this one, and returns this one."""
+        if other.players != self.players:
+            raise ValueError('cannot merge results for different players')
+        self.trials += other.trials
+        for i in range(len(self.players)):
+            self.wins[i] += other.wins[i]
+            self.ties[i] += other.ties[i]
+            self.share_units[i] += other.share_units[i]
+            self.share_squares[i] += other.share_squares[i]
+        return self
+
+    def equity(self):
+        """Returns each player's share of the pot, from 0 to 1."""
+        if not self.trials:
+            return [0.0] * len(self.players)
+        return [u / (SHARE_UNITS * self.trials) for u in self.share_units]
+
+    def win_rate(self):
+        """Returns the fraction of runouts each player wins outright."""
+        return [w / self.trials if self.trials else 0.0 for w in self.wins]
+
+    def tie_rate(self):
+        """Returns the fraction of runouts where each player splits the pot."""
+        return [t / self.trials if self.trials else 0.0 for t in self.ties]
+
+    def stderr(self):
+        """Returns the standard error of each player's equity, which is zero for exact results."""
+        if self.exact or self.trials < 2:
+            return [0.0] * len(self.players)
+        errors = []
+        for units, squares in zip(self.share_units, self.share_squares):
+            mean = units / (SHARE_UNITS * self.trials)
+            variance = max(squares / (SHARE_UNITS ** 2 * self.trials) - mean * mean, 0.0)
+            errors.append((variance / (self.trials - 1)) ** 0.5)
+        return errors
+
+    def __str__(self):
+        lines = []
+        for player, equity, win, tie, error in zip(
+                self.players, self.equity(), self.win_rate(), self.tie_rate(), self.stderr()):
+            line = '{0}: equity {1:.2%}, win {2:.2%}, tie {3:.2%}'.format(player, equity, win, tie)
+            if not self.exact:
+                line += ' (+/- {0:.2%})'.format(error)
+            lines.append(line)
+        return '\n'.join(lines)
+
+
+class HandRange:
+    """
+    Represents the hole cards a player may hold, as weighted two-card combinations.
+
+    Attributes:
+        label (str): A short description of the range, used in results.
+        combos (np.ndarray): An integer array of shape (N, 2) of card encodings.
+        weights (np.ndarray): The relative weight of each combination.
+    """
+    def __init__(self, combos, weights=None, label=''):
+        self.combos = np.asarray(combos, dtype=np.intp).reshape(-1, 2)
+        if weights is None:
+            weights = np.ones(len(self.combos))
+        self.weights = np.asarray(weights, dtype=float)
+        self.label = label
+        self._alias = None
+
+    def without(self, dead):
+        """Returns the range with every combination containing a card in dead removed."""
+        if not len(dead):
+            return self
+        keep = ~np.isin(self.combos, list(dead)).any(axis=1) & (self.weights > 0)
+        return HandRange(self.combos[keep], self.weights[keep], self.label)
+
+    def sample(self, rng, size):
+        """Returns an array of shape (size, 2) of combinations drawn by weight, in constant time per draw."""
+        if self._alias is None:
+            self._alias = AliasTable(self.weights)
+        return self.combos[self._alias.sample(rng, size)]
+
+    @staticmethod
+    def from_spec(spec):
+        """
+        Builds a range from range notation, a Range, a specific hand or a list of specific hands.
+
+        A string is parsed by Range.from_str, so it may be a specific hand such as 'AhKh'
+        or a range such as 'QQ+, AKs'. A specific hand may also be a list of two Cards, and
+        a list of specific hands is a range where each hand is equally likely.
+        """
+        if isinstance(spec, HandRange):
+            return spec
+        if isinstance(spec, str):
+            spec = Range.from_str(spec)
+        if isinstance(spec, Range):
+            combos, weights = spec.combos()
+            return HandRange(combos, weights, spec.label)
+        if len(spec) == 2 and all(isinstance(c, Card) for c in spec):
+            hands = [spec]
+        else:
+            hands = list(spec)
+        combos = []
+        for hand in hands:
+            cards = parse_cards(hand) if isinstance(hand, str) else list(hand)
+            if len(cards) != 2 or cards[0].is_same(cards[1]):
+                raise ValueError('{0} is not a pair of hole cards'.format(hand))
+            combos.append([c.to_int() for c in cards])
+        label = spec if isinstance(spec, str) else ','.join(
+            ''.join(repr(Card.from_int(code)) for code in combo) for combo in combos)
+        return HandRange(combos, label=label)
+
+
+def _as_codes(cards):
+    """Converts None, a string of card names, or a list of Cards to a list of card encodings."""
+    if not cards:
+        return []
+    if isinstance(cards, str):
+        cards = parse_cards(cards)
+    return [c.to_int() for c in cards]
+
+
+def _prepare(ranges, board, dead):
+    """Validates the inputs shared by the equity calculators and returns them in encoded form."""
+    if not(2 <= len(ranges) <= 10):
+        raise ValueError('equity requires between 2 and 10 players')
+    board = _as_codes(board)
+    dead = _as_codes(dead)
+    if len(board) > 5:
+        raise ValueError('the board cannot have more than five cards')
+    if len(set(board + dead)) != len(board) + len(dead):
+        raise ValueError('the board and dead cards contain the same card twice')
+    ranges = [HandRange.from_spec(r).without(board + dead) for r in ranges]
+    for r in ranges:
+        if not len(r.combos):
+            raise ValueError('no hole cards in {0} are possible with this board'.format(r.label))
+    return ranges, board, dead
+
+
+def _check_deal(ranges):
+    """Raises ValueError unless every player can be given a hand from their range without two sharing a card."""
+    # the players with the fewest hands are placed first, so conflicts are found early
+    options = sorted(([frozenset(combo) for combo, weight in zip(r.combos.tolist(), r.weights) if weight > 0]
+                      for r in ranges), key=len)
+
+    def deal(i, used):
+        if i == len(options):
+            return True
+        return any(not(combo & used) and deal(i + 1, used | combo) for combo in options[i])
+
+    if not deal(0, frozenset()):
+        raise ValueError('the ranges cannot all be dealt without two players sharing a card')
+
+
+def _deal_runouts(rng, holes, known, num_cards):
+    """
+    Deals num_cards random board cards for each row of holes, avoiding the known cards.
+
+    Returns the dealt cards and a mask of the rows where no card is held by two players.
+    """
+    size = len(holes)
+    held = holes.reshape(size, -1)
+    ordered = np.sort(held, axis=1)
+    valid = ~np.any(ordered[:, 1:] == ordered[:, :-1], axis=1)
+    if not num_cards:
+        return np.empty((size, 0), dtype=np.intp), valid
+    keys = rng.random((size, 52))
+    keys[:, known] = 2.0
+    np.put_along_axis(keys, held, 2.0, axis=1)
+    return np.argpartition(keys, num_cards, axis=1)[:, :num_cards], valid
+
+
+def run_trials(ranges, board, dead, rng, trials, result):
+    """
+    Simulates a number of random runouts and tallies them into result.
+
+    The ranges, board and dead cards must already be prepared by _prepare. Runouts where
+    two players' sampled hole cards collide are discarded, so slightly fewer than trials
+    runouts may be counted.
+    """
+    holes = np.stack([r.sample(rng, trials) for r in ranges], axis=1)
+    runouts, valid = _deal_runouts(rng, holes, board + dead, 5 - len(board))
+    holes, runouts = holes[valid], runouts[valid]
+    full_board = np.concatenate([np.broadcast_to(np.array(board, dtype=np.intp), (len(holes), len(board))),
+                                 runouts], axis=1)
+    cards = np.concatenate([holes, np.broadcast_to(full_board[:, None, :], (len(holes), len(ranges), 5))], axis=2)
+    strengths = evaluate_batch(cards.reshape(-1, 7)).reshape(len(holes), len(ranges))
+    result.add(strengths)
+    return result
+
+
+def _run_chunk(ranges, board, dead, batch_size, count, rng):
+    """Deals count runouts in batches; the unit of work given to each process by run_parallel."""
+    result = EquityResult([r.label for r in ranges])
+    for start in range(0, count, batch_size):
+        run_trials(ranges, board, dead, rng, min(batch_size, count - start), result)
+    return result
+
+
+def monte_carlo_equity(ranges, board=None, dead=None, iterations=None, time_limit=None,
+                       target_stderr=None, batch_size=10000, seed=None, workers=1):
+    """
+    Estimates the equity of each player by dealing random runouts.
+
+    For example, monte_carlo_equity(['AhKh', ['QsQd', 'QcQh']], board='Qh7h2c') estimates
+    AhKh's equity against a pair of queens on this flop. Each batch of runouts samples hole
+    cards for every player from their range, deals the rest of the board from the cards
+    left in the deck, and scores every hand with evaluate_batch.
+
+    Parameters:
+        ranges (list): For each of 2 to 10 players, a specific hand such as 'AhKh', a list
+            of specific hands, or a HandRange.
+        board (str or list): The community cards dealt so far, if any.
+        dead (str or list): Cards known to be out of the deck, such as folded hands.
+        iterations (int): The number of runouts to deal. Defaults to 100000 if time_limit is not given.
+        time_limit (float): The maximum number of seconds to spend dealing runouts.
+        target_stderr (float): Stops early once every player's standard error is at most this.
+        batch_size (int): The number of runouts dealt and scored at a time.
+        seed: A seed or numpy.random.Generator for reproducible results.
+        workers (int): The number of processes to split the runouts across, or None for
+            every core. Parallel runs deal a fixed number of iterations, and give identical
+            results for the same seed and number of workers.
+
+    Returns:
+        EquityResult: The tallies of every runout dealt.
+
+    Raises:
+        ValueError: If the hands in the ranges all share cards with each other, the board or
+            the dead cards, so that no runout can be dealt.
+    """
+    ranges, board, dead = _prepare(ranges, board, dead)
+    _check_deal(ranges)
+    if iterations is None and time_limit is None:
+        iterations = 100000
+    if workers != 1:
+        if iterations is None:
+            raise ValueError('parallel equity requires a fixed number of iterations')
+        return run_parallel(partial(_run_chunk, ranges, board, dead, batch_size), iterations,
+                            seed=seed, workers=workers)
+    rng = seed if isinstance(seed, np.random.Generator) else np.random.default_rng(seed)
+    result = EquityResult([r.label for r in ranges])
+    start = time.perf_counter()
+    dealt = 0
+    while iterations is None or dealt < iterations:
+        size = batch_size if iterations is None else min(batch_size, iterations - dealt)
+        run_trials(ranges, board, dead, rng, size, result)
+        dealt += size
+        if time_limit is not None and time.perf_counter() - start >= time_limit:
+            break
+        if target_stderr is not None and result.trials > 1 and max(result.stderr()) <= target_stderr:
+            break
+    return result
+
+
+def _suit_symmetries(groups):
+    """Returns the permutations of the four suits which map each group of known cards onto itself."""
+    symmetries = []
+    for perm in permutations(range(4)):
+        if all({(c & ~3) | perm[c & 3] for c in group} == set(group) for group in groups):
+            symmetries.append(perm)
+    return symmetries
+
+
+def _canonical_runouts(remaining, num_cards, symmetries):
+    """
+    Enumerates every runout of num_cards from remaining, collapsed by suit isomorphism.
+
+    Two runouts related by one of the suit symmetries give every player the same hand
+    strength, so only the smallest runout of each class is kept, weighted by the size of
+    the class. Returns the runouts as an array of shape (N, num_cards) and their weights.
+    """
+    if not num_cards:
+        return np.empty((1, 0), dtype=np.intp), np.ones(1, dtype=np.int64)
+    runouts = np.fromiter(chain.from_iterable(combinations(remaining, num_cards)), dtype=np.int64)
+    runouts = runouts.reshape(-1, num_cards)
+    if len(symmetries) == 1:
+        return runouts.astype(np.intp), np.ones(len(runouts), dtype=np.int64)
+    powers = 52 ** np.arange(num_cards, dtype=np.int64)
+    canonical = None
+    for perm in symmetries:
+        relabel = np.array([(c & ~3) | perm[c & 3] for c in range(52)], dtype=np.int64)
+        keys = np.sort(relabel[runouts], axis=1) @ powers
+        canonical = keys if canonical is None else np.minimum(canonical, keys)
+    keys, weights = np.unique(canonical, return_counts=True)
+    return (keys[:, None] // powers % 52).astype(np.intp), weights.astype(np.int64)
+
+
+def _whole_weights(r):
+    """Returns the weights of a range as ints, or raises ValueError if they are not whole numbers."""
+    weights = np.rint(r.weights).astype(np.int64)
+    if not np.allclose(weights, r.weights):
+        raise ValueError('exact equity requires whole-number weights in {0}'.format(r.label))
+    return weights
+
+
+def count_runouts(ranges, board=None, dead=None):
+    """Returns an upper bound on the number of runouts exact_equity would enumerate, before suit reduction."""
+    ranges, board, dead = _prepare(ranges, board, dead)
+    remaining = 52 - len(board) - len(dead) - 2 * len(ranges)
+    assignments = 1
+    for r in ranges:
+        assignments *= len(r.combos)
+    return assignments * comb(remaining, 5 - len(board))
+
+
+def exact_equity(ranges, board=None, dead=None):
+    """
+    Computes the exact equity of each player by enumerating every remaining runout.
+
+    For each way of giving every player a hand from their range without sharing a card,
+    every board completion from the rest of the deck is enumerated. Runouts that are
+    identical up to a relabelling of suits which leaves the known cards fixed are scored
+    once and counted with their multiplicity, and all runouts are scored with
+    evaluate_batch. The result has the same format as monte_carlo_equity, with exact set
+    and a standard error of zero.
+
+    Parameters:
+        ranges (list): For each of 2 to 10 players, a specific hand such as 'AhKh', a list
+            of specific hands, or a HandRange with whole-number weights.
+        board (str or list): The community cards dealt so far, if any.
+        dead (str or list): Cards known to be out of the deck, such as folded hands.
+
+    Returns:
+        EquityResult: The tallies of every runout, weighted by the weights of the hands.
+
+    Raises:
+        ValueError: If the hands in the ranges all share cards with each other, the board or
+            the dead cards, so that no runout can be dealt.
+    """
+    ranges, board, dead = _prepare(ranges, board, dead)
+    _check_deal(ranges)
+    weights = [_whole_weights(r) for r in ranges]
+    result = EquityResult([r.label for r in ranges], exact=True)
+    num_cards = 5 - len(board)
+    for assignment in product(*[range(len(r.combos)) for r in ranges]):
+        holes = [ranges[p].combos[i].tolist() for p, i in enumerate(assignment)]
+        held = list(chain.from_iterable(holes))
+        if len(set(held)) != len(held):
+            continue
+        weight = 1
+        for p, i in enumerate(assignment):
+            weight *= int(weights[p][i])
+        if not weight:
+            continue
+        known = set(held + board + dead)
+        remaining = [c for c in range(52) if c not in known]
+        symmetries = _suit_symmetries([board, dead] + holes)
+        runouts, multiplicity = _canonical_runouts(remaining, num_cards, symmetries)
+        full_board = np.concatenate(
+            [np.broadcast_to(np.array(board, dtype=np.intp), (len(runouts), len(board))), runouts], axis=1)
+        cards = np.concatenate([
+            np.broadcast_to(np.array(holes, dtype=np.intp)[None, :, :], (len(runouts), len(holes), 2)),
+            np.broadcast_to(full_board[:, None, :], (len(runouts), len(holes), 5))
+        ], axis=2)
+        strengths = evaluate_batch(cards.reshape(-1, 7)).reshape(len(runouts), len(holes))
+        result.add(strengths, multiplicity * weight)
+    return result
+
+
+def equity(ranges, board=None, dead=None, max_exact_runouts=2000000, use_table=True, **options):
+    """
+    Computes equity exactly when there are few enough runouts, and by Monte Carlo otherwise.
+
+    Heads-up preflop matchups between two whole hand classes, such as 'AKs' against 'QQ',
+    are looked up in the precomputed table from preflop.py instead, when it has been built.
+
+    Parameters:
+        ranges (list): For each of 2 to 10 players, a specific hand, a list of hands, or a HandRange.
+        board (str or list): The community cards dealt so far, if any.
+        dead (str or list): Cards known to be out of the deck.
+        max_exact_runouts (int): The largest count_runouts for which exact_equity is used.
+        use_table (bool): Whether to check the preflop table first.
+        options: Keyword arguments passed on to monte_carlo_equity.
+
+    Returns:
+        EquityResult: The result of whichever calculator was used.
+    """
+    if use_table and not board and not dead and len(ranges) == 2:
+        # imported here because preflop.py builds its table with this module
+        from preflop import table_result
+        result = table_result(ranges)
+        if result is not None:
+            return result
+    if count_runouts(ranges, board, dead) <= max_exact_runouts:
+        try:
+            return exact_equity(ranges, board, dead)
+        except ValueError:
+            # fractional weights can only be sampled
+            pass
+    return monte_carlo_equity(ranges, board, dead, **options)
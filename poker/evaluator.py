@@ -0,0 +1,226 @@
+"""evaluator.py
+
+This file contains a table-driven evaluator which maps five, six, or seven cards straight to an integer hand strength.
+"""
+
+from hands import pack_strength, unpack_strength
+
+# category values, matching the value attribute of the Hand subclasses in hands.py
+HIGH_CARD = 1
+ONE_PAIR = 2
+TWO_PAIR = 3
+THREE_OF_A_KIND = 4
+STRAIGHT = 5
+FLUSH = 6
+FULL_HOUSE = 7
+FOUR_OF_A_KIND = 8
+STRAIGHT_FLUSH = 9
+
+# rank indices run from 0 (deuce) to 12 (ace); a card contributes RANK_KEYS[index] to the
+# rank key of a hand, so the key is the base-5 number whose digits are the rank counts
+RANK_KEYS = [5 ** i for i in range(13)]
+WHEEL_MASK = 0b1000000001111
+
+# per-card lookups indexed by the integer encoding of a card (see Card.to_int)
+CARD_KEYS = [RANK_KEYS[code >> 2] for code in range(52)]
+CARD_BITS = [1 << (code >> 2) for code in range(52)]
+
+
+def straight_high(mask):
+    """
+    Returns the rank index of the highest straight in a bitmask of rank indices, or -1 if there is none.
+
+    The wheel (ace-to-five) straight returns 3, the rank index of the five.
+    """
+    for high in range(12, 3, -1):
+        run = 0b11111 << (high - 4)
+        if mask & run == run:
+            return high
+    if mask & WHEEL_MASK == WHEEL_MASK:
+        return 3
+    return -1
+
+
+def _top_ranks(mask, n):
+    """Returns the n highest ranks (from 2 to 14) present in a bitmask of rank indices."""
+    ranks = []
+    for i in range(12, -1, -1):
+        if mask >> i & 1:
+            ranks.append(i + 2)
+            if len(ranks) == n:
+                break
+    return ranks
+
+
+def _rank_strength(counts):
+    """Returns the strength of the best non-flush hand given the count of each rank index."""
+    mask = 0
+    for i, c in enumerate(counts):
+        if c:
+            mask |= 1 << i
+    # groups sorted by count, then by rank, both descending
+    groups = sorted(((c, i + 2) for i, c in enumerate(counts) if c), reverse=True)
+    top_count, top_rank = groups[0]
+    others = mask & ~(1 << (top_rank - 2))
+
+    if top_count == 4:
+        return pack_strength(FOUR_OF_A_KIND, [top_rank] + _top_ranks(others, 1))
+    if top_count == 3 and len(groups) > 1 and groups[1][0] >= 2:
+        # with at most seven cards, two sets leave no room for a higher pair
+        return pack_strength(FULL_HOUSE, [top_rank, groups[1][1]])
+    high = straight_high(mask)
+    if high >= 0:
+        return pack_strength(STRAIGHT, [high + 2])
+    if top_count == 3:
+        return pack_strength(THREE_OF_A_KIND, [top_rank] + _top_ranks(others, 2))
+    if top_count == 2 and len(groups) > 1 and groups[1][0] == 2:
+        small = groups[1][1]
+        kickers = others & ~(1 << (small - 2))
+        return pack_strength(TWO_PAIR, [top_rank, small] + _top_ranks(kickers, 1))
+    if top_count == 2:
+        return pack_strength(ONE_PAIR, [top_rank] + _top_ranks(others, 3))
+    return pack_strength(HIGH_CARD, _top_ranks(mask, 5))
+
+
+def _build_rank_table(min_cards, max_cards):
+    """Enumerates every multiset of ranks of the given sizes and maps its rank key to its strength."""
+    table = {}
+    counts = [0] * 13
+
+    def fill(i, remaining, key):
+        if i < 0:
+            if max_cards - remaining >= min_cards:
+                table[key] = _rank_strength(counts)
+            return
+        for c in range(min(4, remaining) + 1):
+            counts[i] = c
+            fill(i - 1, remaining - c, key + c * RANK_KEYS[i])
+        counts[i] = 0
+
+    fill(12, max_cards, 0)
+    return table
+
+
+def _build_flush_table():
+    """Maps every 13-bit mask of suited rank indices to its flush strength, or 0 for fewer than five cards."""
+    table = [0] * (1 << 13)
+    for mask in range(1 << 13):
+        if bin(mask).count('1') < 5:
+            continue
+        high = straight_high(mask)
+        if high >= 0:
+            table[mask] = pack_strength(STRAIGHT_FLUSH, [high + 2])
+        else:
+            table[mask] = pack_strength(FLUSH, _top_ranks(mask, 5))
+    return table
+
+
+# two to four cards are included so that hands can be evaluated incrementally as cards are dealt
+RANK_TABLE = _build_rank_table(2, 7)
+FLUSH_TABLE = _build_flush_table()
+
+
+def evaluate(cards):
+    """
+    Returns the integer strength of the best five-card hand among five to seven cards.
+
+    Rather than examining every five-card combination, this function sums a rank key and
+    builds one bitmask of ranks per suit in a single pass over the card encodings. A suit with five
+    or more cards is looked up in FLUSH_TABLE; otherwise, the rank key is looked up in
+    RANK_TABLE. With at most seven cards, a flush is always the best available hand when
+    it exists, since the two remaining cards cannot make a full house or four of a kind.
+
+    Parameters:
+        cards (list): Five to seven distinct Card instances.
+
+    Returns:
+        int: The strength of the best hand, as packed by hands.pack_strength.
+    """
+    return evaluate_codes([c.code for c in cards])
+
+
+def evaluate_codes(codes):
+    """Returns the same strength as evaluate, given the integer encodings of the cards instead."""
+    key = 0
+    suit_masks = [0, 0, 0, 0]
+    for code in codes:
+        key += CARD_KEYS[code]
+        suit_masks[code & 3] |= CARD_BITS[code]
+    for mask in suit_masks:
+        strength = FLUSH_TABLE[mask]
+        if strength:
+            return strength
+    return RANK_TABLE[key]
+
+
+class HandState:
+    """
+    Tracks the best hand a player can make as their hole cards and the board are dealt.
+
+    Each card dealt updates the rank key and suit masks used by evaluate_codes in constant
+    time, so the current strength is a few table lookups at any street rather than a fresh
+    evaluation of every card.
+
+    Attributes:
+        cards (list): The cards added so far, hole cards first.
+        key (int): The sum of RANK_KEYS for the cards, as in evaluate_codes.
+        suit_masks (list): A bitmask of rank indices for each suit index.
+        rank_mask (int): A bitmask of every rank index among the cards.
+    """
+    def __init__(self, cards=()):
+        self.cards = []
+        self.key = 0
+        self.suit_masks = [0, 0, 0, 0]
+        self.rank_mask = 0
+        for card in cards:
+            self.add(card)
+
+    def add(self, card):
+        """Adds one card."""
+        code = card.code
+        self.cards.append(card)
+        self.key += CARD_KEYS[code]
+        self.suit_masks[code & 3] |= CARD_BITS[code]
+        self.rank_mask |= CARD_BITS[code]
+
+    def strength(self):
+        """
+        Returns the strength of the best hand among the cards so far.
+
+        With fewer than five cards, such as the hole cards alone, the strength only counts
+        pairs, trips and quads and the high cards, like a hand from which cards are missing.
+        """
+        if len(self.cards) >= 5:
+            for mask in self.suit_masks:
+                strength = FLUSH_TABLE[mask]
+                if strength:
+                    return strength
+        return RANK_TABLE[self.key]
+
+    def category(self):
+        """Returns the category of the best hand so far, from HIGH_CARD to STRAIGHT_FLUSH."""
+        return unpack_strength(self.strength())[0]
+
+    def draws(self):
+        """
+        Returns the draws to a better category which another card could complete.
+
+        Returns:
+            list: Any of 'flush draw' (four cards of one suit) and either 'open-ended
+            straight draw' (two ranks would complete a straight) or 'gutshot' (one rank
+            would), for hands which have not already made that hand and have cards to come.
+        """
+        if len(self.cards) >= 7:
+            return []
+        draws = []
+        flush = any(FLUSH_TABLE[mask] for mask in self.suit_masks)
+        if not flush and any(bin(mask).count('1') == 4 for mask in self.suit_masks):
+            draws.append('flush draw')
+        if not flush and straight_high(self.rank_mask) < 0:
+            outs = sum(1 for i in range(13)
+                       if not self.rank_mask >> i & 1 and straight_high(self.rank_mask | 1 << i) >= 0)
+            if outs >= 2:
+                draws.append('open-ended straight draw')
+            elif outs == 1:
+                draws.append('gutshot')
+        return draws
@@ -0,0 +1,201 @@
+"""frontends.py
+
+This file contains the frontends which connect a Game to players: the console, scripted bots, and the web.
+"""
+
+from collections import deque
+from decimal import Decimal
+
+
+class Frontend:
+    """
+    Base class for the frontends of a Game.
+
+    A frontend names the players when the game is created, chooses each player's action
+    when Game.play_hand() asks for one, and is notified of every event in the game.
+    """
+    def get_name(self, seat_num):
+        """Returns the name of the player at the given seat."""
+        return 'Seat {0}'.format(seat_num)
+
+    def get_action(self, game, player):
+        """Returns the (action, amount) chosen for the player whose turn it is."""
+        raise NotImplementedError
+
+    def notify(self, game, event, data):
+        """Called with every event in the game, such as 'action' or 'board'."""
+        pass
+
+
+class ConsoleFrontend(Frontend):
+    """
+    Plays the game at the console, asking for names and actions with input().
+
+    Attributes:
+        show_cards (bool): Whether hole cards should be revealed in the game state printout.
+    """
+    def __init__(self, show_cards=True):
+        self.show_cards = show_cards
+
+    def get_name(self, seat_num):
+        return input("Seat {0} name: ".format(seat_num))
+
+    def show_game_state(self, game):
+        print('-----\nCurrent game state:')
+        print('Current pot: ${0}'.format(game.to_money(game.pot)))
+        if game.board:
+            print('Board: {0}'.format(game.board))
+        for p in game.players_in_hand:
+            if p is game.button:
+                button = "[BTN] "
+            else:
+                button = ""
+            if self.show_cards:
+                hole_cards = p.get_hole_cards()
+            else:
+                hole_cards = ""
+            print("  Seat {0} [{1}] ({2}) {3}{4} {5}".format(
+                p.get_seat_num(), game.to_money(p.get_stack()), p.get_name(), button, hole_cards, p.get_comments()))
+
+    def notify(self, game, event, data):
+        if event == 'dealing_for_position':
+            print("-----\nDealing for position:")
+        elif event == 'position_card':
+            p = data['player']
+            print("Seat {0} ({1}) dealt {2}".format(p.get_seat_num(), p.get_name(), data['card']))
+        elif event == 'position_tie':
+            print("A tie was detected. Re-dealing the players who tied:")
+        elif event == 'button':
+            print("Button set to seat {0}".format(data['player'].get_seat_num()))
+        elif event == 'hand_start':
+            print('-----\nNow dealing hole cards:')
+        elif event == 'hole_card':
+            p = data['player']
+            card = str(data['card']) if self.show_cards else ''
+            print("Seat {0} ({1}) dealt {2}".format(p.get_seat_num(), p.get_name(), card))
+        elif event == 'board':
+            print('-----\n{0}: {1}'.format(data['street'].upper(), ', '.join(str(c) for c in data['cards'])))
+        elif event == 'all_in':
+            print('-----\nAll in:')
+            for p, share in zip(data['players'], game.equities()):
+                hole_cards = p.get_hole_cards() if self.show_cards else ''
+                print("  Seat {0} ({1}) {2} {3:.1%}".format(p.get_seat_num(), p.get_name(), hole_cards, share))
+        elif event == 'invalid_action':
+            print(data['reason'])
+        elif event == 'win':
+            if data['hand'] is None:
+                print('-----\n{0} wins ${1}.'.format(data['player'], game.to_money(data['amount'])))
+            else:
+                verb = 'splits' if data['split'] else 'wins'
+                pot = 'side pot {0} of '.format(data['pot']) if data['pot'] else ''
+                print('-----\n{0} {1} {2}${3} with {4}'.format(
+                    data['player'], verb, pot, game.to_money(data['amount']), data['hand']))
+
+    def get_action(self, game, player):
+        self.show_game_state(game)
+        print('Seat {0} ({1}) to act. '.format(player.get_seat_num(), player.get_name()), end='')
+        legal = {action: (low, high) for action, low, high in game.legal_actions()}
+        if 'call' in legal:
+            if 'raise' in legal:
+                prompt = "Fold/Call ${0}/Raise?: ".format(game.to_money(legal['call'][0]))
+            else:
+                prompt = "Fold/Call ${0} (all in)?: ".format(game.to_money(legal['call'][0]))
+        elif 'bet' in legal:
+            prompt = "Fold/Check/Bet?: "
+        else:
+            prompt = "Fold/Check/Raise?: "
+        while True:
+            action = input(prompt).lower()
+            if action in legal:
+                break
+            print("Invalid input. Valid inputs: {0}".format(', '.join(legal)))
+        amount = None
+        if action in ('bet', 'raise'):
+            while True:
+                try:
+                    amount = game.to_chips(Decimal(input("What is {0}'s {1}?: ".format(player.get_name(), action))))
+                    break
+                except (ArithmeticError, ValueError):
+                    print("Invalid {0} size.".format(action))
+        return action, amount
+
+
+class ScriptedFrontend(Frontend):
+    """
+    Plays the game with bots, without any input or output.
+
+    Attributes:
+        strategies (dict): Maps each seat number to a strategy, a callable called as
+            strategy(game, player, legal_actions) which returns an (action, amount) pair.
+        names (dict): Optional names for the players, by seat number.
+    """
+    def __init__(self, strategies, names=None):
+        if not isinstance(strategies, dict):
+            strategies = {i + 1: s for i, s in enumerate(strategies)}
+        self.strategies = strategies
+        self.names = names or {}
+
+    def get_name(self, seat_num):
+        return self.names.get(seat_num, 'Seat {0}'.format(seat_num))
+
+    def get_action(self, game, player):
+        return self.strategies[player.get_seat_num()](game, player, game.legal_actions())
+
+
+class WebFrontend(Frontend):
+    """
+    Connects the game to remote players, such as a web server.
+
+    Remote players act whenever their requests arrive, so a web game is driven by calling
+    submit() rather than play_hand(). Every event is queued in a JSON-friendly form for
+    the server to send to its clients, with amounts in money rather than chips, and with the
+    hole cards shown down in each 'showdown' event.
+
+    Attributes:
+        events (deque): Queued events, as dicts with an 'event' key.
+    """
+    def __init__(self, names=None):
+        self.names = names or {}
+        self.events = deque()
+
+    def get_name(self, seat_num):
+        return self.names.get(seat_num, 'Seat {0}'.format(seat_num))
+
+    def get_action(self, game, player):
+        raise RuntimeError('web games are driven by submit(), not play_hand()')
+
+    def notify(self, game, event, data):
+        message = {'event': event}
+        for key, value in data.items():
+            if key == 'amount':
+                value = game.to_money(value)
+            message[key] = _to_json(value)
+        if event == 'showdown':
+            # the hands shown down, in the same order as the players
+            message['cards'] = [_to_json(p.get_hole_cards()) for p in data['players']]
+        self.events.append(message)
+
+    def submit(self, game, seat_num, action, amount=None):
+        """Applies an action received from the player at seat_num; raises ValueError if it is not legal."""
+        if amount is not None:
+            amount = game.to_chips(Decimal(str(amount)))
+        game.apply_action(game.get_player_at_seat(seat_num), action, amount)
+
+    def poll(self):
+        """Removes and returns every queued event."""
+        events = list(self.events)
+        self.events.clear()
+        return events
+
+
+def _to_json(value):
+    """Converts players, cards, hands and amounts in event data to JSON-friendly values."""
+    if isinstance(value, (list, tuple)):
+        return [_to_json(v) for v in value]
+    if hasattr(value, 'get_seat_num'):
+        return value.get_seat_num()
+    if isinstance(value, Decimal):
+        return str(value)
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    return repr(value) if hasattr(value, 'to_int') else str(value)
@@ -5,55 +5,144 @@ This file contains core structures relevant to the game of Texas hold'em.
 
 from numpy import random
 from hands import *
-from determine_hand import best_hand
+from determine_hand import HandValue
+from evaluator import HandState
+from pot import Pot
+from equity import equity
 from copy import copy
 from decimal import *
 
 
+def smallest_unit(*amounts):
+    """Returns the smallest decimal place among Decimal amounts, e.g. Decimal('0.01') for 0.25 and 0.50."""
+    exponents = [a.as_tuple().exponent for a in amounts if isinstance(a, Decimal)]
+    return Decimal(1).scaleb(min(exponents + [0]))
+
+
 class Deck:
-    """Represents an ordinary, 52-card playing deck."""
-    def __init__(self):
+    """
+    Represents an ordinary, 52-card playing deck.
+
+    The deck never allocates cards while it is used. It holds a fixed permutation of the
+    52 card encodings and a cursor at the top card, so dealing a card just advances the
+    cursor and returns the interned Card. Cards removed with remove() are swapped behind
+    the end of the deck and are never dealt. Shuffling is a Fisher-Yates shuffle of only
+    as many cards from the top as requested; if more cards are dealt than were shuffled,
+    the rest of the deck is shuffled at that point.
+
+    Attributes:
+        order (list): A permutation of the 52 card encodings. The cards still to be dealt
+            are order[top:size], from the top down.
+        position (list): The index in order of each card encoding.
+        top (int): The index in order of the top card of the deck.
+        size (int): The number of cards in order which have not been removed.
+        rng (numpy.random.Generator): The source of randomness for shuffling.
+    """
+    def __init__(self, rng=None):
         """Constructor for the Deck class, just calls reset."""
-        self.cards = []
+        self.order = list(range(52))
+        self.position = list(range(52))
+        self.rng = rng if rng is not None else random.default_rng()
         self.reset()
 
     def reset(self):
-        """Returns the deck to its original 52 card state."""
-        self.cards.clear()
-        for s in Suit:
-            for i in range(1, 14):
-                self.cards.append(Card(i, s))
-
-    def shuffle(self):
-        """Shuffle the deck."""
-        random.shuffle(self.cards)
+        """Returns the deck to its original 52 card state, in its current order."""
+        self.top = 0
+        self.size = 52
+        self.shuffled_to = None
+
+    @property
+    def cards(self):
+        """The cards remaining in the deck, from the top down."""
+        return [Card.from_int(code) for code in self.order[self.top:self.size]]
+
+    def __len__(self):
+        return self.size - self.top
+
+    def _swap(self, i, j):
+        order = self.order
+        order[i], order[j] = order[j], order[i]
+        self.position[order[i]] = i
+        self.position[order[j]] = j
+
+    def remove(self, cards):
+        """
+        Takes specific cards, such as known hole cards or board cards, out of the deck.
+
+        Parameters:
+            cards (list): Card instances or card encodings which have not been dealt yet.
+        """
+        for card in cards:
+            code = card.to_int() if isinstance(card, Card) else int(card)
+            i = self.position[code]
+            if i >= self.size:
+                continue
+            if i < self.top:
+                raise ValueError('{0} has already been dealt'.format(Card.from_int(code)))
+            self.size -= 1
+            self._swap(i, self.size)
+
+    def shuffle(self, num_cards=None):
+        """
+        Shuffle the deck.
+
+        Parameters:
+            num_cards (int): How many cards from the top to shuffle, or None for the whole deck.
+        """
+        start = self.top
+        stop = self.size if num_cards is None else min(self.size, start + num_cards)
+        if stop - start < 1:
+            return
+        choices = self.rng.integers(range(start, stop), self.size).tolist()
+        for i, j in zip(range(start, stop), choices):
+            self._swap(i, j)
+        self.shuffled_to = stop
+
+    def _next_code(self):
+        """Advances the cursor past the top card and returns its encoding."""
+        if self.top >= self.size:
+            raise IndexError('no cards left in the deck')
+        if self.top == self.shuffled_to:
+            # more cards are needed than were shuffled, so shuffle the rest of the deck
+            self.shuffle()
+        self.top += 1
+        return self.order[self.top - 1]
 
     def deal(self, player):
         """Deal a player the top card from this deck."""
-        player.add_card(self.cards.pop(0))
+        player.add_card(Card.from_int(self._next_code()))
 
     def burn_card(self):
         """Discard the top card of the deck."""
-        self.cards.pop(0)
+        self._next_code()
 
     def get_top_card(self):
         """Removes and returns the top card of the deck."""
-        return self.cards.pop(0)
+        return Card.from_int(self._next_code())
 
 
 class Player:
+    """
+    Represents a player sitting at the table.
+
+    Besides the hole cards, each player keeps a HandState which the game updates as every
+    hole card and board card is dealt, so the player's current hand and draws are known at
+    every street without evaluating the cards again.
+    """
     def __init__(self, name, seat_num):
         self.name = name
         self.seat = seat_num
         self.cards = []
-        self.stack = Decimal(0)
-        self.bet = Decimal(0)
+        self.stack = 0
+        self.bet = 0
         self.sitting_out = False
         self.comments = ""
         self.hand = None
+        self.hand_state = HandState()
 
     def add_card(self, card):
         self.cards.append(card)
+        self.hand_state.add(card)
         assert len(self.cards) <= 2
 
     def get_hole_cards(self):
@@ -90,6 +179,24 @@ class Player:
     def set_hand(self, hand):
         self.hand = hand
 
+    def see_board_card(self, card):
+        """Updates the player's hand state with a card dealt to the board."""
+        self.hand_state.add(card)
+
+    def get_strength(self):
+        """Returns the strength of the best hand the player can make with the board so far."""
+        return self.hand_state.strength()
+
+    def get_made_hand(self):
+        """Returns the HandValue of the best hand the player can make with the board, or None before the flop."""
+        if len(self.hand_state.cards) < 5:
+            return None
+        return HandValue(self.hand_state.strength(), self.hand_state.cards)
+
+    def get_draws(self):
+        """Returns the draws the player has with the board so far, as listed by HandState.draws."""
+        return self.hand_state.draws()
+
     def get_bet(self):
         return self.bet
 
@@ -102,6 +209,14 @@ class Player:
     def come_back(self):
         self.sitting_out = False
 
+    def clear_hand(self):
+        """Forgets the cards, hand, bet and comments from the previous hand."""
+        self.cards = []
+        self.hand = None
+        self.hand_state = HandState()
+        self.bet = 0
+        self.comments = ""
+
     def __str__(self):
         return self.name
 
@@ -110,30 +225,105 @@ class Game:
     """
     Represents a game of Texas hold'em.
 
-    In this class, when start_game() is called, all players are dealt their hole cards.
-    The gameplay will pause to ask players for their desired actions when it becomes their
-    turn to act and they still have chips in their stack.
+    The game is a state machine with no input or output of its own. When start_hand() is
+    called, all players are dealt their hole cards and the blinds are posted; from then on,
+    to_act is the player whose turn it is, legal_actions() lists what they may do, and
+    apply_action() applies their decision and advances the hand, dealing the flop, turn and
+    river and settling the pot as betting rounds finish. Every change is reported to the
+    listeners as an event, and the frontend supplies player names and, in play_hand(),
+    each player's action. See frontends.py for the console, scripted bot, and web frontends.
+
+    Amounts are integer chips when the blinds are ints, which is how simulations and the
+    console play: integer arithmetic is several times faster than Decimal on every bet.
+    Each chip is then worth denomination, and frontends convert amounts to and from money
+    with to_money() and to_chips(). Decimal blinds and stacks are still accepted and used
+    as they are, in which case denomination is None.
 
     Attributes:
         num_players (int): The number of players sitting at this table.
-        small_blind (Decimal): The size of the small blind.
-        big_blind (Decimal): The size of the big blind.
-        show_cards (bool): Whether hole cards should be revealed in the game state printout.
+        small_blind (int or Decimal): The size of the small blind.
+        big_blind (int or Decimal): The size of the big blind.
+        denomination (Decimal): The money value of one integer chip, or None when amounts are Decimals.
+        chip (int or Decimal): The smallest chip, which split pots are divided into.
+        pot (int or Decimal): The total of every bet made this hand.
+        pots (Pot): Every player's contribution to the pot this hand, from which side pots are built.
+        frontend (Frontend): Supplies names and actions and is notified of events, or None.
+        rng (numpy.random.Generator): The deck's source of randomness, which bots may share.
+        listeners (list): Callables called as listener(game, event, data) for every event.
+        street (str): The current street: 'preflop', 'flop', 'turn' or 'river'.
+        to_act (Player): The player whose turn it is, or None when no hand is in progress.
+        previous_bet (int or Decimal): The largest bet of the current betting round.
+        min_raise (int or Decimal): The smallest amount by which the current bet may be raised.
+        pending (list): The players who must still act before the betting round ends.
+        cannot_raise (set): The players who already acted and have since faced only an all-in raise
+            smaller than a full raise, so they may call or fold but not raise again.
+        small_blind_player (Player): The player who posted the small blind this hand.
+        big_blind_player (Player): The player who posted the big blind this hand.
+        hand_over (bool): Whether the current hand has finished.
+        all_in (bool): Whether betting has finished for the hand with players all in and cards still to come.
     """
-    def __init__(self, num_players, small_blind, big_blind, show_cards=True):
+    STREETS = ('preflop', 'flop', 'turn', 'river')
+
+    def __init__(self, num_players, small_blind, big_blind, frontend=None, rng=None, names=None, button=None,
+                 denomination=None):
         self.num_players = num_players
-        self.show_cards = show_cards
-        self.players = [Player(input("Seat {0} name: ".format(i)), i) for i in range(1, num_players + 1)]
+        self.frontend = frontend
+        self.listeners = []
+        if frontend is not None:
+            self.listeners.append(frontend.notify)
+        if names is None:
+            names = [frontend.get_name(i) if frontend is not None else 'Seat {0}'.format(i)
+                     for i in range(1, num_players + 1)]
+        self.players = [Player(names[i - 1], i) for i in range(1, num_players + 1)]
         self.board = []
-        self.deck = Deck()
+        self.deck = Deck(rng)
+        self.rng = self.deck.rng
         self.deck.shuffle()
-        # TODO: self.actions = []
-        self.button = self.determine_button(self.players)
+        if button is None:
+            self.button = self.determine_button(self.players)
+        else:
+            self.button = self.get_player_at_seat(button)
         self.players_in_hand = copy(self.players)
-        self.pot = Decimal(0)
+        self.pot = 0
+        self.pots = Pot()
         self.small_blind = small_blind
         self.big_blind = big_blind
-        self.previous_bet = Decimal(0)
+        if isinstance(big_blind, int):
+            self.denomination = Decimal(1) if denomination is None else denomination
+            self.chip = 1
+        else:
+            self.denomination = None
+            self.chip = smallest_unit(small_blind, big_blind)
+        self.previous_bet = 0
+        self.min_raise = big_blind
+        self.street = None
+        self.to_act = None
+        self.pending = []
+        self.cannot_raise = set()
+        self.small_blind_player = None
+        self.big_blind_player = None
+        self.hand_over = True
+        self.all_in = False
+
+    def to_money(self, amount):
+        """Converts an amount in chips to its value in money, for display."""
+        if self.denomination is None or amount is None:
+            return amount
+        return self.denomination * amount
+
+    def to_chips(self, money):
+        """Converts an amount of money to chips, raising ValueError if it is not a whole number of chips."""
+        if self.denomination is None or money is None:
+            return money
+        chips = Decimal(money) / self.denomination
+        if chips != chips.to_integral_value():
+            raise ValueError('{0} is not a whole number of chips'.format(money))
+        return int(chips)
+
+    def notify(self, event, **data):
+        """Reports an event, such as 'action' or 'board', to every listener."""
+        for listener in self.listeners:
+            listener(self, event, data)
 
     def get_player_at_seat(self, seat_num):
         """Returns Player at the specified seat number."""
@@ -144,8 +334,7 @@ class Game:
         i = 0
         cached_size = len(self.players_in_hand)
         while i < cached_size:
-            if self.players_in_hand[i] is self.button:
-                i += 1
+            if self.players_in_hand[i].get_seat_num() > self.button.get_seat_num():
                 break
             i += 1
         while True:
@@ -159,257 +348,333 @@ class Game:
             except IndexError:
                 i = 0
 
-    def show_game_state(self):
-        print('-----\nCurrent game state:')
-        print('Current pot: ${0}'.format(self.pot))
-        if self.board:
-            print('Board: {0}'.format(self.board))
-        for p in self.players_in_hand:
-            if p is self.button:
-                button = "[BTN] "
-            else:
-                button = ""
-            if self.show_cards:
-                hole_cards = p.get_hole_cards()
-            else:
-                hole_cards = ""
-            print("  Seat {0} [{1}] ({2}) {3}{4} {5}".format(
-                p.get_seat_num(), p.get_stack(), p.get_name(), button, hole_cards, p.get_comments()))
+    def players_after(self, player):
+        """Returns the players in the hand in turn order, starting with the one after player."""
+        seat = player.get_seat_num()
+        later = [p for p in self.players_in_hand if p.get_seat_num() > seat]
+        earlier = [p for p in self.players_in_hand if p.get_seat_num() <= seat]
+        return later + earlier
 
     def start_game(self):
         for p in self.players:
-            p.set_stack(Decimal(100) * self.big_blind)
+            p.set_stack(100 * self.big_blind)
         self.play_hand()
 
-    def play_hand(self):
-        # PRE-FLOP
+    def start_hand(self):
+        """Shuffles up, deals the hole cards and posts the blinds for a new hand."""
+        self.board = []
+        self.pot = 0
+        self.pots.reset()
+        self.players_in_hand = [p for p in self.players if p.get_stack() > 0 and not p.sitting_out]
+        if len(self.players_in_hand) < 2:
+            raise ValueError('at least two players with chips are needed to play a hand')
+        for p in self.players:
+            p.clear_hand()
+        self.deck.reset()
+        # only the hole cards, three burns and five board cards are ever dealt
+        self.deck.shuffle(2 * len(self.players_in_hand) + 8)
+        self.hand_over = False
+        self.all_in = False
+        self.street = 'preflop'
+        self.notify('hand_start', button=self.button)
         self.deal_hole_cards()
         self.post_blinds()
-        self.round_of_betting(blinds=True)
 
-        # FLOP
-        if len(self.players_in_hand) == 1:
-            self.no_showdown()
-            return
-        self.show_flop()
-        self.round_of_betting()
-
-        # TURN
-        if len(self.players_in_hand) == 1:
-            self.no_showdown()
-            return
-        self.show_turn()
-        self.round_of_betting()
-
-        # RIVER
-        if len(self.players_in_hand) == 1:
-            self.no_showdown()
-            return
-        self.show_river()
-        self.round_of_betting()
-
-        # SHOWDOWN
-        if len(self.players_in_hand) == 1:
-            self.no_showdown()
-            return
-        self.showdown()
+    def play_hand(self):
+        """Plays a whole hand, asking the frontend for every player's action."""
+        if self.hand_over:
+            self.start_hand()
+        while not self.hand_over:
+            player = self.to_act
+            action, amount = self.frontend.get_action(self, player)
+            try:
+                self.apply_action(player, action, amount)
+            except ValueError as e:
+                self.notify('invalid_action', player=player, action=action, amount=amount, reason=str(e))
 
     def determine_button(self, players):
         """Deals every player one card face-up. Highest value card determines button."""
-        print("-----\nDealing for position:")
+        self.notify('dealing_for_position', players=players)
         exposed_cards = []
         for p in players:
             exposed_cards.append(self.deck.get_top_card())
-            print("Seat {0} ({1}) dealt {2}".format(p.get_seat_num(), p.get_name(), exposed_cards[-1]))
+            self.notify('position_card', player=p, card=exposed_cards[-1])
 
-        max_so_far = exposed_cards[0].get_num()
+        max_so_far = exposed_cards[0].rank
         players_with_max = []
         for i in range(len(exposed_cards)):
-            cur_num = exposed_cards[i].get_num()
-            if Card.lt(max_so_far, cur_num):
-                max_so_far = cur_num
+            cur_rank = exposed_cards[i].rank
+            if max_so_far < cur_rank:
+                max_so_far = cur_rank
                 players_with_max.clear()
                 players_with_max.append(players[i])
-            elif cur_num == max_so_far:
+            elif cur_rank == max_so_far:
                 players_with_max.append(players[i])
 
         if len(players_with_max) > 1:
-            print("A tie was detected. Re-dealing the players who tied:")
+            self.notify('position_tie', players=players_with_max)
             return self.determine_button(players_with_max)
         else:
             self.deck.reset()
             self.deck.shuffle()
-            print("Button set to seat {0}".format(players_with_max[0].get_seat_num()))
+            self.notify('button', player=players_with_max[0])
             return players_with_max[0]
 
     def move_button(self):
-        """Moves button one seat to the left."""
-        self.button = self.get_player_at_seat((self.button.get_seat_num() + 1) % self.num_players)
+        """Moves button one seat to the left, skipping players who have no chips or are sitting out."""
+        seat = self.button.get_seat_num()
+        for _ in range(self.num_players):
+            seat = seat % self.num_players + 1
+            player = self.get_player_at_seat(seat)
+            if player.get_stack() > 0 and not player.sitting_out:
+                break
+        self.button = player
 
     def deal_hole_cards(self):
-        print('-----\nNow dealing hole cards:')
         turn_gen = self.take_turns()
         cur_player = next(turn_gen)
         while len(cur_player.get_hole_cards()) < 2:
             self.deck.deal(cur_player)
-            if self.show_cards:
-                card = str(cur_player.get_hole_cards()[-1])
-            else:
-                card = ''
-            print("Seat {0} ({1}) dealt {2}".format(cur_player.get_seat_num(), cur_player.get_name(), card))
+            self.notify('hole_card', player=cur_player, card=cur_player.get_hole_cards()[-1])
             cur_player = next(turn_gen)
-        self.show_game_state()
 
     def show_next_card(self):
         """Procedure called by show_flop, show_turn, and show_river that exposes one card from deck."""
         card = self.deck.get_top_card()
         self.board.append(card)
-        print(card)
+        for p in self.players_in_hand:
+            p.see_board_card(card)
 
     def show_flop(self):
         self.deck.burn_card()
-        print('-----\nFLOP:')
         for _ in range(3):
             self.show_next_card()
-        self.show_game_state()
+        self.street = 'flop'
+        self.notify('board', street=self.street, cards=self.board[-3:])
 
     def show_turn(self):
         self.deck.burn_card()
-        print('-----\nTURN:', end='')
         self.show_next_card()
-        self.show_game_state()
+        self.street = 'turn'
+        self.notify('board', street=self.street, cards=self.board[-1:])
 
     def show_river(self):
         self.deck.burn_card()
-        print('-----\nRIVER:', end='')
         self.show_next_card()
-        self.show_game_state()
+        self.street = 'river'
+        self.notify('board', street=self.street, cards=self.board[-1:])
 
     def showdown(self):
-        # TODO: split pot
-        """Sets self.winner to the winner of the previous hand."""
-        for p in self.players_in_hand:
-            p.set_hand(best_hand(p.get_hole_cards() + self.board))
-        max_so_far = self.players_in_hand[0].get_hand()
-        winner = self.players_in_hand[0]
+        """
+        Awards the main pot and every side pot to the best hands entitled to them.
+
+        The players are ranked once by strength, and Pot.award settles every layer of the
+        pot in one pass, giving odd chips to the winners closest to the left of the button.
+        Hands are HandValues, so a Hand object is only built for a hand whose name is shown.
+        """
+        # every player's hand state has seen the whole board, so their strengths are already known
         for p in self.players_in_hand:
-            if p.get_hand() > max_so_far:
-                max_so_far = p.get_hand()
-                winner = p
-        if self.pot == 0:
-            pot_str = ''
-        else:
-            pot_str = ' ($' + str(self.pot) + ')'
-        print('-----\n{0} wins{1} with {2}'.format(winner, pot_str, max_so_far))
+            p.set_hand(p.get_made_hand())
+        ranked = sorted(self.players_in_hand, key=lambda p: p.get_hand().strength, reverse=True)
+        self.notify('showdown', players=ranked)
+        awards = self.pots.award(ranked, lambda p: p.get_hand().strength, self.players_after(self.button), self.chip)
+        for p, amount, index, split in awards:
+            p.change_stack(amount)
+            self.notify('win', player=p, amount=amount, hand=p.get_hand(), split=split, pot=index)
+        self.end_hand()
 
     def no_showdown(self):
         assert len(self.players_in_hand) == 1
         winner = self.players_in_hand[0]
-        print('-----\n{0} wins ${1}.'.format(winner, self.pot))
+        winner.change_stack(self.pot)
+        self.notify('win', player=winner, amount=self.pot, hand=None, split=False, pot=0)
+        self.end_hand()
+
+    def end_hand(self):
+        self.hand_over = True
+        self.to_act = None
+        self.pending = []
+        self.clear_actions()
+        self.notify('hand_end')
 
     def get_players(self):
         return self.players
 
+    def set_blinds(self, small_blind, big_blind):
+        """Changes the blinds from the next hand on, such as when a tournament level goes up."""
+        if not self.hand_over:
+            raise ValueError('the blinds cannot change during a hand')
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.min_raise = big_blind
+
     def post_blinds(self):
         turns = self.take_turns()
         small = next(turns)
         big = next(turns)
-        if self.num_players == 2:
+        if len(self.players_in_hand) == 2:
             small, big = big, small
-        self.bet(small, self.small_blind)
-        small.set_comments("posts SB: ${0}".format(self.small_blind))
-        self.bet(big, self.big_blind)
-        big.set_comments("posts BB: ${0}".format(self.big_blind))
-        self.show_game_state()
-
-    def round_of_betting(self, blinds=False):
-        turns = self.take_turns()
-        if blinds:
-            next(turns)  # small blind
-            next(turns)  # big blind
-
-        first_to_act = next(turns)
-        self.get_action(first_to_act)
-
-        for p in turns:
-            if (p is first_to_act and self.previous_bet == 0) or \
-                    len(self.players_in_hand) == 1 or (0 < self.previous_bet == p.get_bet()):
-                break
-            self.show_game_state()
-            self.get_action(p)
-
-        self.clear_actions()
-
-    def get_action(self, player):
-        while True:
-            print('Seat {0} ({1}) to act. '.format(player.get_seat_num(), player.get_name()), end='')
-
-            if self.previous_bet != 0.0:
-                if player.get_stack() > self.previous_bet:
-                    while True:
-                        action = input("Fold/Call ${0}/Raise?: ".format(self.previous_bet))
-                        action = action.lower()
-                        if action == 'fold' or action == 'call' or action == 'raise':
-                            break
-                        else:
-                            print("Invalid input. Valid inputs: fold, call, raise")
-                else:
-                    while True:
-                        action = input("Fold/Call ${0} (all in)?: ".format(player.get_stack()))
-                        action = action.lower()
-                        if action == 'fold' or action == 'call':
-                            break
-                        else:
-                            print("Invalid input. Valid inputs: fold, call")
+        self.bet(small, min(self.small_blind, small.get_stack()))
+        small.set_comments("posts SB: ${0}".format(self.to_money(small.get_bet())))
+        self.notify('blind', player=small, amount=small.get_bet(), kind='small')
+        self.bet(big, min(self.big_blind, big.get_stack()))
+        big.set_comments("posts BB: ${0}".format(self.to_money(big.get_bet())))
+        self.notify('blind', player=big, amount=big.get_bet(), kind='big')
+        self.small_blind_player = small
+        self.big_blind_player = big
+        self.previous_bet = self.big_blind
+        # the first raise of a hand must be at least a big blind, even if the blinds have just gone up
+        self.min_raise = self.big_blind
+        self.start_round(self.players_after(big))
+
+    def start_round(self, order):
+        """Begins a betting round in which the players in order act first to last."""
+        self.pending = [p for p in order if p.get_stack() > 0]
+        self.cannot_raise = set()
+        if len(self.pending) == 1 and self.pending[0].get_bet() >= self.previous_bet:
+            # everyone else is all in, so there is nobody left to bet against
+            self.pending = []
+        self.advance()
+
+    def advance(self):
+        """Moves on to the next player to act, the next street, or the end of the hand."""
+        while self.pending and self.pending[0] not in self.players_in_hand:
+            self.pending.pop(0)
+        if len(self.players_in_hand) == 1:
+            self.no_showdown()
+        elif self.pending:
+            self.to_act = self.pending[0]
+        else:
+            self.to_act = None
+            self.clear_actions()
+            if self.street == 'river':
+                self.showdown()
+                return
+            if not self.all_in and sum(p.get_stack() > 0 for p in self.players_in_hand) <= 1:
+                # nobody can bet again, so the rest of the board is dealt without any action
+                self.all_in = True
+                self.notify('all_in', players=list(self.players_in_hand))
+            if self.street == 'preflop':
+                self.show_flop()
+            elif self.street == 'flop':
+                self.show_turn()
             else:
-                while True:
-                    action = input("Fold/Check/Bet?: ")
-                    action = action.lower()
-                    if action == 'fold' or action == 'check' or action == 'bet':
-                        break
-                    else:
-                        print("Invalid input. Valid inputs: fold, call, bet")
-
-            if action == "bet" or action == "raise":
-                bet_size = Decimal(input("What is {0}'s {1}?: ".format(player.get_name(), action)))
-                try:
-                    self.bet(player, bet_size)
-                    player.set_comments("{0}s: ${1}".format(action, bet_size))
-                except ValueError:
-                    print("Invalid {0} size.".format(action))
-                    continue
-            elif action == "call":
-                if player.get_stack() < self.previous_bet:
-                    self.bet(player, player.get_stack())
-                    player.set_comments("calls: ${0}".format(player.get_stack()))
-                else:
-                    self.bet(player, self.previous_bet)
-                    player.set_comments("calls: ${0}".format(self.previous_bet))
-            elif action == "check":
-                player.set_comments("checks")
-            elif action == "fold":
-                self.players_in_hand.remove(player)
-                player.set_comments("folds")
+                self.show_river()
+            self.start_round(list(self.take_turns_once()))
+
+    def equities(self):
+        """
+        Returns the equity of each player in the hand, in the order of players_in_hand.
+
+        The equity is calculated from everyone's actual hole cards and the board. The preflop
+        table only holds the average equities of whole hand classes, which ignore the suits
+        and card removal of specific hands, so it is not used here.
+        """
+        hands = [p.get_hole_cards() for p in self.players_in_hand]
+        return equity(hands, board=self.board).equity()
+
+    def take_turns_once(self):
+        """Yields each player in the hand once, starting from the small blind."""
+        turns = self.take_turns()
+        for _ in range(len(self.players_in_hand)):
+            yield next(turns)
+
+    def legal_actions(self):
+        """
+        Returns the actions available to the player whose turn it is.
+
+        Returns:
+            list: Tuples of (action, min_amount, max_amount). The action is one of 'fold',
+            'check', 'call', 'bet' or 'raise'. Amounts are the player's total bet for this
+            betting round after the action, and are None for fold and check.
+        """
+        player = self.to_act
+        if player is None:
+            return []
+        most = player.get_bet() + player.get_stack()
+        actions = [('fold', None, None)]
+        if player.get_bet() >= self.previous_bet:
+            actions.append(('check', None, None))
+        else:
+            call = min(self.previous_bet, most)
+            actions.append(('call', call, call))
+        if most > self.previous_bet and player not in self.cannot_raise:
+            kind = 'raise' if self.previous_bet > 0 else 'bet'
+            actions.append((kind, min(self.previous_bet + self.min_raise, most), most))
+        return actions
+
+    def apply_action(self, player, action, amount=None):
+        """
+        Applies a player's decision and advances the hand.
+
+        Parameters:
+            player (Player): The player acting, who must be to_act.
+            action (str): One of the actions from legal_actions().
+            amount (int or Decimal): For bet and raise, the player's total bet for this betting
+                round; ignored otherwise.
+
+        Raises:
+            ValueError: If it is not the player's turn or the action is not legal.
+        """
+        if self.hand_over or player is not self.to_act:
+            raise ValueError('it is not {0}\'s turn to act'.format(player))
+        legal = {a: (low, high) for a, low, high in self.legal_actions()}
+        action = action.lower()
+        if action not in legal:
+            raise ValueError('{0} cannot {1} now'.format(player, action))
+
+        if action == 'fold':
+            self.players_in_hand.remove(player)
+            player.set_comments("folds")
+        elif action == 'check':
+            player.set_comments("checks")
+        elif action == 'call':
+            amount = legal['call'][0]
+            self.bet(player, amount)
+            player.set_comments("calls: ${0}".format(self.to_money(amount)))
+        else:
+            low, high = legal[action]
+            if amount is None or not(low <= amount <= high):
+                raise ValueError('Invalid {0} size.'.format(action))
+            full = amount - self.previous_bet >= self.min_raise
+            if full:
+                self.min_raise = amount - self.previous_bet
+            facing_bet = self.previous_bet > 0
+            self.bet(player, amount)
+            player.set_comments("{0}s: ${1}".format(action, self.to_money(amount)))
+            # everyone else must respond to the new bet
+            responders = [p for p in self.players_after(player) if p is not player and p.get_stack() > 0]
+            if full or not facing_bet:
+                self.cannot_raise = set()
             else:
-                print('Invalid input detected.')
-                continue
-            break
+                # an all-in raise smaller than a full raise does not reopen the betting to those who already acted
+                self.cannot_raise.update(p for p in responders if p not in self.pending)
+            self.pending = responders
+        if action in ('fold', 'check', 'call'):
+            amount = player.get_bet() if action == 'call' else None
+            self.pending.remove(player)
+        self.notify('action', player=player, action=action, amount=amount)
+        self.advance()
 
     def clear_actions(self):
-        self.previous_bet = Decimal(0)
+        self.previous_bet = 0
+        self.min_raise = self.big_blind
         for p in self.players:
-            p.set_bet(Decimal(0))
+            p.set_bet(0)
             p.set_comments("")
 
     def bet(self, player, amount):
-        if amount > player.get_stack():
+        """Raises the player's total bet for this betting round to amount."""
+        chips = amount - player.get_bet()
+        if chips > player.get_stack():
             raise ValueError("Bet amount is greater than stack size of the player.")
-        player.change_stack(-amount)
+        player.change_stack(-chips)
         player.set_bet(amount)
-        self.pot += amount
-        self.previous_bet = amount
+        self.pot += chips
+        self.pots.add(player, chips)
+        if amount > self.previous_bet:
+            self.previous_bet = amount
 
     def is_big_blind(self, player):
-        if self.button() + 2 < self.num_players:
-            return player.get_seat_num() == self.button() + 2
-        return player.get_seat_num() == ((self.button() + 2) % self.num_players) + 1
+        """Returns whether the player posted the big blind in the current or last hand."""
+        return player is self.big_blind_player
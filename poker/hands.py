@@ -3,8 +3,28 @@
 This file contains a number of structures representing objects relevant to playing cards and poker hands.
 """
 
+import os
 from enum import Enum
 from abc import ABC, abstractmethod
+from operator import attrgetter
+
+# sort key which orders cards by rank using integer comparisons rather than Card.__lt__
+card_rank = attrgetter('rank')
+
+# whether the trusted factory methods of the hands check their arguments anyway; turned on
+# by setting POKER_VALIDATE=1 in the environment, or by set_validation(True)
+_validate = os.environ.get('POKER_VALIDATE', '') not in ('', '0')
+
+
+def set_validation(enabled):
+    """Turns checking on or off in every trusted factory method, e.g. while running tests."""
+    global _validate
+    _validate = bool(enabled)
+
+
+def validation_enabled():
+    """Returns whether the trusted factory methods check their arguments."""
+    return _validate
 
 
 class Card:
@@ -15,12 +35,20 @@ class Card:
     printing various long and short names for each card, and provides several
     static utility methods for dealing with playing cards in general.
 
+    Cards are interned: there are exactly 52 Card instances, created when this
+    module is imported, and the constructor returns the shared instance. Each card
+    is also encoded as an int from 0 to 51, equal to 4 * (rank - 2) + the index of
+    its suit in Suit, so that the rank is code >> 2 and the suit index is code & 3.
+
     Attributes:
-        number (int): The number on the card, e.g. the King of hearts is 13.
+        num (int): The number on the card, e.g. the King of hearts is 13.
         suit (Suit): The suit of the card.
+        rank (int): The number on the card where aces are the highest, from 2 to 14.
+        code (int): The integer encoding of the card, from 0 to 51.
         card_names (dict): Provides short names for some card numbers.
         full_names (dict): Provides long names for all card numbers.
     """
+    __slots__ = ('num', 'suit', 'rank', 'code')
     card_names = {1: 'A', 13: 'K', 12: 'Q', 11: 'J', 10: 'T'}
     full_names = {
         1: 'ace',
@@ -37,17 +65,59 @@ class Card:
         12: 'queen',
         13: 'king'
     }
+    _all = []
 
-    def __init__(self, number, suit):
-        """Constructor for the Card class."""
+    def __new__(cls, number, suit):
+        """Constructor for the Card class, which returns the interned instance."""
         if not isinstance(number, int):
             raise TypeError('number must be an integer')
         if not(1 <= number <= 13):
             raise ValueError('number must be between 1 and 13, inclusive')
         if not isinstance(suit, Suit):
             raise TypeError('suit must be a string')
-        self.num = number
-        self.suit = suit
+        return cls._all[4 * (cls.rank_of(number) - 2) + _SUIT_ORDER[suit]]
+
+    @classmethod
+    def _intern_all(cls):
+        """Creates the 52 shared Card instances, ordered by their integer encoding."""
+        for code in range(52):
+            card = object.__new__(cls)
+            card.rank = (code >> 2) + 2
+            card.num = cls.num_of(card.rank)
+            card.suit = _SUITS[code & 3]
+            card.code = code
+            cls._all.append(card)
+
+    @staticmethod
+    def from_int(code):
+        """Returns the card with the given integer encoding, from 0 to 51."""
+        return Card._all[code]
+
+    def to_int(self):
+        """Returns the integer encoding of this card, from 0 to 51."""
+        return self.code
+
+    @staticmethod
+    def from_str(name):
+        """Returns the card with the given short name, e.g. Kh, Th or 10h, the inverse of repr."""
+        if not isinstance(name, str) or len(name) < 2:
+            raise ValueError('invalid card name: {0!r}'.format(name))
+        number, suit = name[:-1].upper(), name[-1].lower()
+        numbers = {v: k for k, v in Card.card_names.items()}
+        if number in numbers:
+            number = numbers[number]
+        elif number.isdigit() and 2 <= int(number) <= 10:
+            number = int(number)
+        else:
+            raise ValueError('invalid card name: {0!r}'.format(name))
+        try:
+            return Card(number, Suit(suit))
+        except ValueError:
+            raise ValueError('invalid card name: {0!r}'.format(name))
+
+    def __reduce__(self):
+        """Pickles cards by their encoding so that unpickling returns the interned instance."""
+        return Card.from_int, (self.code,)
 
     def __lt__(self, other):
         """
@@ -58,11 +128,7 @@ class Card:
         >>> queen_of_diamonds < ace_of_hearts
         True
         """
-        if self.get_num() == 1:
-            return False
-        elif other.get_num() == 1:
-            return True
-        return self.get_num() < other.get_num()
+        return self.rank < other.rank
 
     def __gt__(self, other):
         """Enables the greater-than operation for comparing the value of cards."""
@@ -70,11 +136,11 @@ class Card:
 
     def __eq__(self, other):
         """Enables the equality operation for comparing the value of cards."""
-        return self.get_num() == other.get_num()
+        return self.num == other.num
 
     def __ne__(self, other):
         """Enables the non-equality operation for comparing the value of cards."""
-        return not self.__eq__(other)
+        return self.num != other.num
 
     def __str__(self):
         """Returns the long name of a card, e.g. king of hearts."""
@@ -89,7 +155,7 @@ class Card:
 
     def is_same(self, other):
         """Returns whether the current card is the exact same card (num and suit) as another."""
-        return self.num == other.num and self.suit == other.suit
+        return self.code == other.code
 
     def get_num(self):
         """Getter method for the number of the current card instance."""
@@ -119,6 +185,16 @@ class Card:
         else:
             return num1 < num2
 
+    @staticmethod
+    def rank_of(num):
+        """Converts a card number to a rank from 2 to 14, where aces are the highest."""
+        return 14 if num == 1 else num
+
+    @staticmethod
+    def num_of(rank):
+        """Converts a rank from 2 to 14 back to a card number, the inverse of rank_of."""
+        return 1 if rank == 14 else rank
+
 
 class Suit(Enum):
     """Enumeration representing the four suits that cards may take."""
@@ -128,39 +204,118 @@ class Suit(Enum):
     SPADES = 's'
 
 
+def parse_cards(text):
+    """Returns the list of cards named in a string such as 'AhKh', 'Ah Kh' or 'Ah,Kh,10d'."""
+    cards = []
+    for token in text.replace(',', ' ').split():
+        i = 0
+        while i < len(token):
+            # a ten may be written as T or 10, so a card name is three characters after a 1
+            length = 3 if token[i] == '1' else 2
+            cards.append(Card.from_str(token[i:i + length]))
+            i += length
+    return cards
+
+
+_SUITS = list(Suit)
+_SUIT_ORDER = {s: i for i, s in enumerate(_SUITS)}
+Card._intern_all()
+
+
+def pack_strength(category, ranks):
+    """
+    Packs a hand category and its ranks into a single integer hand strength.
+
+    The category (the value attribute of a Hand subclass) occupies the top bits, followed
+    by up to five ranks (from Card.rank_of) in descending order of importance, four bits
+    each. For example, a pair of kings with A-9-4 kickers packs as 0x2DE940. Larger
+    strengths always mean stronger hands.
+
+    Parameters:
+        category (int): The value of the hand, e.g. 2 for one pair.
+        ranks (list): The ranks which break ties within the category, most important first.
+
+    Returns:
+        int: The packed hand strength.
+    """
+    strength = category
+    for i in range(5):
+        strength <<= 4
+        if i < len(ranks):
+            strength |= ranks[i]
+    return strength
+
+
+def unpack_strength(strength):
+    """Returns the category and the list of ranks packed into a hand strength."""
+    ranks = [(strength >> shift) & 0xF for shift in range(16, -4, -4)]
+    return strength >> 20, [r for r in ranks if r]
+
+
 class Hand(ABC):
     """
     Abstract class representing five-card poker hands.
 
+    Every hand computes its strength once, when it is constructed, and all comparisons
+    go through that single integer. Hands are therefore totally ordered, hashable, and
+    can be sorted or grouped by strength directly.
+
+    The constructors check their arguments. Code which already knows its arguments are
+    valid, such as the evaluator, builds hands with the trusted() class methods instead,
+    which skip the checks and sorting and can take a strength which is already known.
+    While validation is turned on with set_validation(True), trusted() calls the checking
+    constructor and also makes sure any strength given is the hand's real strength.
+
     Attributes:
-        value (int): The strength of the hand. Larger values mean stronger hands.
+        value (int): The category of the hand. Larger values mean stronger categories.
+        strength (int): The category and tie-breaking ranks, as packed by pack_strength.
     """
     value = 0
+    strength = 0
 
-    @abstractmethod
     def __lt__(self, other):
         """Enables the less-than operation for comparing the value of hands."""
-        return self.value < other.value
+        return self.strength < other.strength
+
+    def __le__(self, other):
+        """Enables the less-than-or-equal operation for comparing the value of hands."""
+        return self.strength <= other.strength
 
-    @abstractmethod
     def __gt__(self, other):
         """Enables the greater-than operation for comparing the value of hands."""
-        return self.value > other.value
+        return self.strength > other.strength
+
+    def __ge__(self, other):
+        """Enables the greater-than-or-equal operation for comparing the value of hands."""
+        return self.strength >= other.strength
 
-    @abstractmethod
     def __eq__(self, other):
         """Enables the equality operation for comparing the value of hands."""
-        return self.value == other.value
+        if not isinstance(other, Hand):
+            return NotImplemented
+        return self.strength == other.strength
 
-    @abstractmethod
     def __ne__(self, other):
         """Enables the non-equality operation for comparing the value of hands."""
-        return not self.__eq__(other)
+        if not isinstance(other, Hand):
+            return NotImplemented
+        return self.strength != other.strength
+
+    def __hash__(self):
+        return hash(self.strength)
 
     @abstractmethod
     def __str__(self):
         pass
 
+    @classmethod
+    def _checked(cls, strength, *args):
+        """Builds a hand with the checking constructor, making sure a given strength matches it."""
+        hand = cls(*args)
+        if strength is not None and strength != hand.strength:
+            raise ValueError('strength {0:#x} is not the strength of {1}'.format(strength, hand))
+        return hand
+
 
 class Straight(Hand):
     """
@@ -183,23 +338,17 @@ class Straight(Hand):
         if not(5 <= high_num <= 13) and high_num != 1:
             raise ValueError('high card for a straight cannot be {0}'.format(high_num))
         self.high_num = high_num
-
-    def __lt__(self, other):
-        if type(self) == type(other):
-            # type(self) and type(other) are used because StraightFlush inherits this method
-            return Card.lt(self.high_num, other.high_num)
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if type(self) == type(other):
-            return self.high_num == other.high_num
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+        self.strength = pack_strength(self.value, [Card.rank_of(high_num)])
+
+    @classmethod
+    def trusted(cls, high_num, strength=None):
+        """Builds a straight, or a straight flush, from a valid high card number without checking it."""
+        if _validate:
+            return cls._checked(strength, high_num)
+        hand = object.__new__(cls)
+        hand.high_num = high_num
+        hand.strength = pack_strength(cls.value, [Card.rank_of(high_num)]) if strength is None else strength
+        return hand
 
     def __str__(self):
         return 'Straight, {0} to {1}'.format(
@@ -256,24 +405,19 @@ class TwoKindsHand(Hand):
             raise ValueError('invalid card nums for {0}'.format(type(self)))
         self.big = big
         self.small = small
+        self.strength = pack_strength(self.value, [Card.rank_of(big), Card.rank_of(small)])
 
-    def __lt__(self, other):
-        if type(self) == type(other):
-            if self.big == other.big:
-                return Card.lt(self.small, other.small)
-            return Card.lt(self.big, other.big)
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if type(self) == type(other):
-            return (self.big == other.big) and (self.small == other.small)
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+    @classmethod
+    def trusted(cls, big, small, strength=None):
+        """Builds a four of a kind or full house from two valid, different numbers without checking them."""
+        if _validate:
+            return cls._checked(strength, big, small)
+        hand = object.__new__(cls)
+        hand.big = big
+        hand.small = small
+        hand.strength = pack_strength(cls.value, [Card.rank_of(big), Card.rank_of(small)]) \
+            if strength is None else strength
+        return hand
 
 
 class FourOfAKind(TwoKindsHand):
@@ -325,9 +469,9 @@ class NoRepeats(Hand):
 
     This is an abstract superclass for flushes and high cards, since both hands
     do not contain any repeating cards and therefore require a list of all five
-    cards in the hand to be passed into the constructor. Comparisons between
-    two flushes and two high cards require traversing the whole list in the
-    worst case, comparing each respective card in each hand.
+    cards in the hand to be passed into the constructor. The strength of two
+    flushes or two high cards is broken by every card in the hand, from the
+    highest to the lowest.
 
     Attributes:
         cards (list): A reverse-sorted list of all five cards in the hand.
@@ -335,27 +479,20 @@ class NoRepeats(Hand):
     """
     def __init__(self, cards):
         self.cards = cards
-        self.cards.sort(reverse=True)
+        self.cards.sort(key=card_rank, reverse=True)
         self.high_card = self.cards[0]
+        self.strength = pack_strength(self.value, [c.rank for c in self.cards])
 
-    def __lt__(self, other):
-        if type(self) == type(other):
-            for i in range(len(self.cards)):
-                if self.cards[i] != other.cards[i]:
-                    return self.cards[i] < other.cards[i]
-            return False
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if type(self) == type(other):
-            return self.cards == other.cards
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+    @classmethod
+    def trusted(cls, cards, strength=None):
+        """Builds a flush or high card hand from five valid cards, already sorted from highest to lowest."""
+        if _validate:
+            return cls._checked(strength, cards)
+        hand = object.__new__(cls)
+        hand.cards = cards
+        hand.high_card = cards[0]
+        hand.strength = pack_strength(cls.value, [c.rank for c in cards]) if strength is None else strength
+        return hand
 
 
 class Flush(NoRepeats):
@@ -420,28 +557,20 @@ class ThreeOfAKind(Hand):
                 raise ValueError('kicker cannot be same num as the set')
         self.num = num
         self.kickers = kickers
-        self.kickers.sort(reverse=True)
-
-    def __lt__(self, other):
-        if isinstance(other, ThreeOfAKind):
-            if self.num != other.num:
-                return Card.lt(self.num, other.num)
-            for i in range(len(self.kickers)):
-                if self.kickers[i] != other.kickers[i]:
-                    return self.kickers[i] < other.kickers[i]
-            return False
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if isinstance(other, ThreeOfAKind):
-            return self.num == other.num and self.kickers == other.kickers
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+        self.kickers.sort(key=card_rank, reverse=True)
+        self.strength = pack_strength(self.value, [Card.rank_of(num)] + [c.rank for c in self.kickers])
+
+    @classmethod
+    def trusted(cls, num, kickers, strength=None):
+        """Builds a three of a kind from a number and two valid kickers, already sorted from highest to lowest."""
+        if _validate:
+            return cls._checked(strength, num, kickers)
+        hand = object.__new__(cls)
+        hand.num = num
+        hand.kickers = kickers
+        hand.strength = pack_strength(cls.value, [Card.rank_of(num)] + [c.rank for c in kickers]) \
+            if strength is None else strength
+        return hand
 
     def __str__(self):
         return 'Three of a kind, {0}s'.format(Card.full_name(self.num))
@@ -475,27 +604,21 @@ class TwoPair(Hand):
         if Card.lt(self.big, self.small):
             self.big, self.small = self.small, self.big
         self.kicker = kicker
-
-    def __lt__(self, other):
-        if isinstance(other, TwoPair):
-            if self.big != other.big:
-                return Card.lt(self.big, other.big)
-            elif self.small != other.small:
-                return Card.lt(self.small, other.small)
-            else:
-                return Card.lt(self.kicker, other.kicker)
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if isinstance(other, TwoPair):
-            return self.big == other.big and self.small == other.small and self.kicker == other.kicker
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+        self.strength = pack_strength(
+            self.value, [Card.rank_of(self.big), Card.rank_of(self.small), Card.rank_of(kicker)])
+
+    @classmethod
+    def trusted(cls, big, small, kicker, strength=None):
+        """Builds a two pair from three valid, different numbers, with big the higher pair, without checking them."""
+        if _validate:
+            return cls._checked(strength, big, small, kicker)
+        hand = object.__new__(cls)
+        hand.big = big
+        hand.small = small
+        hand.kicker = kicker
+        hand.strength = pack_strength(cls.value, [Card.rank_of(big), Card.rank_of(small), Card.rank_of(kicker)]) \
+            if strength is None else strength
+        return hand
 
     def __str__(self):
         return 'Two pair, {0}s and {1}s'.format(
@@ -533,26 +656,20 @@ class OnePair(Hand):
                 raise ValueError('kickers cannot be the same as the pair_num')
         self.pair_num = pair_num
         self.kickers = kickers
-        self.kickers.sort(reverse=True)
-
-    def __lt__(self, other):
-        if isinstance(other, OnePair):
-            if other.pair_num != self.pair_num:
-                return Card.lt(self.pair_num, other.pair_num)
-            else:
-                return self.kickers < other.kickers
-        return self.value < other.value
-
-    def __gt__(self, other):
-        return other.__lt__(self)
-
-    def __eq__(self, other):
-        if isinstance(other, OnePair):
-            return self.pair_num == other.pair_num and self.kickers == other.kickers
-        return self.value == other.value
-
-    def __ne__(self, other):
-        return not self.__eq__(other)
+        self.kickers.sort(key=card_rank, reverse=True)
+        self.strength = pack_strength(self.value, [Card.rank_of(pair_num)] + [c.rank for c in self.kickers])
+
+    @classmethod
+    def trusted(cls, pair_num, kickers, strength=None):
+        """Builds a one pair hand from a number and three valid kickers, already sorted from highest to lowest."""
+        if _validate:
+            return cls._checked(strength, pair_num, kickers)
+        hand = object.__new__(cls)
+        hand.pair_num = pair_num
+        hand.kickers = kickers
+        hand.strength = pack_strength(cls.value, [Card.rank_of(pair_num)] + [c.rank for c in kickers]) \
+            if strength is None else strength
+        return hand
 
     def __str__(self):
         return 'One pair, {0}s'.format(Card.full_name(self.pair_num))
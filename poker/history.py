@@ -0,0 +1,403 @@
+"""history.py
+
+This file contains a recorder which saves every hand a Game plays to a compact binary file, and a reader which streams them back.
+"""
+
+import os
+import json
+import struct
+from bisect import bisect_right
+from decimal import Decimal
+import numpy as np
+from hands import Card
+
+# the kinds of action recorded, by code; blinds are recorded as actions so that a hand can be replayed
+ACTIONS = ('small_blind', 'big_blind', 'fold', 'check', 'call', 'bet', 'raise')
+ACTION_CODES = {action: code for code, action in enumerate(ACTIONS)}
+STREETS = ('preflop', 'flop', 'turn', 'river')
+STREET_CODES = {street: code for code, street in enumerate(STREETS)}
+# the card code recorded for a card which was not dealt
+NO_CARD = 255
+
+# one row per hand, one row per seat of each hand, and one row per action; all amounts are
+# integer multiples of the file's unit
+HAND_DTYPE = np.dtype([('number', '<i8'), ('button', 'u1'), ('small_blind', '<i8'), ('big_blind', '<i8'),
+                       ('board', 'u1', 5), ('first_action', '<u4'), ('num_actions', '<u2')])
+SEAT_DTYPE = np.dtype([('stack', '<i8'), ('hole', 'u1', 2), ('won', '<i8'), ('showdown', 'u1')])
+ACTION_DTYPE = np.dtype([('seat', 'u1'), ('street', 'u1'), ('action', 'u1'), ('amount', '<i8')])
+
+# the file starts with a header: magic, version, number of seats and the length of a JSON
+# description of the table; each chunk starts with its magic, number of hands and number of
+# actions, followed by its hand, seat and action rows
+_FILE_HEADER = struct.Struct('<4sHHI')
+_CHUNK_HEADER = struct.Struct('<4sII')
+_FILE_MAGIC = b'PKHH'
+_CHUNK_MAGIC = b'CHNK'
+_VERSION = 1
+
+
+class HandRecord:
+    """
+    Represents one recorded hand.
+
+    Attributes:
+        number (int): The number of the hand in its file, from 0.
+        button (int): The seat number of the button.
+        small_blind (int): The small blind, in units.
+        big_blind (int): The big blind, in units.
+        stacks (list): The stack of each seat when the hand started, in units.
+        hole_cards (list): The hole cards of each seat, or an empty list for seats not dealt in.
+        board (list): The community cards dealt.
+        actions (list): (seat, street, action, amount) tuples in the order they happened. The
+            amount is the player's total bet for the street after the action, or 0 for folds and checks.
+        won (list): The chips each seat won from the pot, in units.
+        showdown (list): Whether each seat showed down its hand.
+    """
+    def __init__(self, number, button, small_blind, big_blind, stacks, hole_cards, board, actions, won, showdown):
+        self.number = number
+        self.button = button
+        self.small_blind = small_blind
+        self.big_blind = big_blind
+        self.stacks = stacks
+        self.hole_cards = hole_cards
+        self.board = board
+        self.actions = actions
+        self.won = won
+        self.showdown = showdown
+
+    def to_text(self, names, unit=1, table='Simulation'):
+        """
+        Returns the hand in the usual text hand-history format.
+
+        Parameters:
+            names (list): The name of the player in each seat.
+            unit: The money value of one unit, such as Decimal('0.01').
+            table (str): The name of the table.
+        """
+        def money(amount):
+            return '${0}'.format(amount * unit)
+
+        lines = ["Hand #{0}: Hold'em No Limit ({1}/{2})".format(
+            self.number, money(self.small_blind), money(self.big_blind))]
+        lines.append("Table '{0}' {1}-max Seat #{2} is the button".format(table, len(names), self.button))
+        for i, name in enumerate(names):
+            if self.hole_cards[i]:
+                lines.append('Seat {0}: {1} ({2} in chips)'.format(i + 1, name, money(self.stacks[i])))
+        street = 0
+        bets = {}
+        previous_bet = 0
+        for seat, street_code, action, amount in self.actions:
+            name = names[seat - 1]
+            if street_code != street:
+                street = street_code
+                bets = {}
+                previous_bet = 0
+                lines.append(self._street_line(street))
+            kind = ACTIONS[action]
+            if kind in ('small_blind', 'big_blind'):
+                lines.append('{0}: posts {1} blind {2}'.format(name, kind.split('_')[0], money(amount)))
+            elif kind in ('fold', 'check'):
+                lines.append('{0}: {1}s'.format(name, kind))
+            elif kind == 'call':
+                lines.append('{0}: calls {1}'.format(name, money(amount - bets.get(seat, 0))))
+            elif kind == 'bet':
+                lines.append('{0}: bets {1}'.format(name, money(amount - bets.get(seat, 0))))
+            else:
+                lines.append('{0}: raises {1} to {2}'.format(name, money(amount - previous_bet), money(amount)))
+            if kind == 'big_blind':
+                lines.append('*** HOLE CARDS ***')
+            if amount:
+                bets[seat] = amount
+                previous_bet = max(previous_bet, amount)
+        if len(self.board) > street + 2:
+            # everyone was all in, so the rest of the board was dealt without any action
+            for street in range(street + 1, len(self.board) - 1):
+                lines.append(self._street_line(street))
+        if any(self.showdown):
+            lines.append('*** SHOW DOWN ***')
+            for i, name in enumerate(names):
+                if self.showdown[i]:
+                    lines.append('{0}: shows [{1}]'.format(name, ' '.join(repr(c) for c in self.hole_cards[i])))
+        for i, name in enumerate(names):
+            if self.won[i]:
+                lines.append('{0} collected {1} from pot'.format(name, money(self.won[i])))
+        lines.append('*** SUMMARY ***')
+        summary = 'Total pot {0}'.format(money(sum(self.won)))
+        if self.board:
+            summary += ' | Board [{0}]'.format(' '.join(repr(c) for c in self.board))
+        lines.append(summary)
+        return '\n'.join(lines) + '\n'
+
+    def _street_line(self, street):
+        """Returns the line which starts a street, such as '*** TURN *** [Ah Kd 2c] [7s]'."""
+        shown = [repr(c) for c in self.board[:street + 2]]
+        if street == 1:
+            return '*** FLOP *** [{0}]'.format(' '.join(shown))
+        return '*** {0} *** [{1}] [{2}]'.format(STREETS[street].upper(), ' '.join(shown[:-1]), shown[-1])
+
+
+class HandRecorder:
+    """
+    Records every hand a Game plays to a hand-history file.
+
+    The recorder is one of the game's listeners, and builds each hand from its events. At
+    the end of each hand, the hand is added to the current chunk, and every chunk_size
+    hands the chunk is appended to the file, so memory use is bounded however many hands
+    are played. Recording an existing file continues its hand numbers.
+
+    Attributes:
+        path (str): The file hands are written to.
+        game (Game): The game being recorded.
+        unit: The money value of one recorded unit, which is the game's smallest chip.
+        chunk_size (int): The number of hands in each chunk written.
+        hands_recorded (int): The number of hands in the file, including any not yet written.
+    """
+    def __init__(self, path, game, chunk_size=4096):
+        self.path = path
+        self.game = game
+        self.chunk_size = chunk_size
+        self.num_seats = game.num_players
+        self.unit = game.to_money(game.chip)
+        self.names = [p.get_name() for p in game.get_players()]
+        if os.path.exists(path) and os.path.getsize(path):
+            reader = HistoryReader(path)
+            if reader.num_seats != self.num_seats:
+                raise ValueError('{0} records a table with a different number of seats'.format(path))
+            self.hands_recorded = len(reader)
+        else:
+            description = json.dumps({'names': self.names, 'unit': str(self.unit)}).encode()
+            with open(path, 'wb') as f:
+                f.write(_FILE_HEADER.pack(_FILE_MAGIC, _VERSION, self.num_seats, len(description)))
+                f.write(description)
+            self.hands_recorded = 0
+        self._hands = []
+        self._seats = []
+        self._actions = []
+        self._current = None
+        game.listeners.append(self)
+
+    def _units(self, amount):
+        return amount if type(amount) is int else int(amount / self.game.chip)
+
+    def __call__(self, game, event, data):
+        """Handles an event from the game."""
+        if event == 'hand_start':
+            self._current = (self.hands_recorded, data['button'].get_seat_num(),
+                             self._units(game.small_blind), self._units(game.big_blind))
+            self._stacks = [self._units(p.get_stack()) for p in game.get_players()]
+            self._holes = [[] for _ in range(self.num_seats)]
+            self._won = [0] * self.num_seats
+            self._showdown = [0] * self.num_seats
+            self._hand_actions = []
+        elif self._current is None:
+            return
+        elif event == 'hole_card':
+            self._holes[data['player'].get_seat_num() - 1].append(data['card'].code)
+        elif event == 'blind':
+            self._hand_actions.append((data['player'].get_seat_num(), 0, ACTION_CODES[data['kind'] + '_blind'],
+                                       self._units(data['amount'])))
+        elif event == 'action':
+            amount = data['amount']
+            self._hand_actions.append((data['player'].get_seat_num(), STREET_CODES[game.street],
+                                       ACTION_CODES[data['action']], 0 if amount is None else self._units(amount)))
+        elif event == 'showdown':
+            for p in data['players']:
+                self._showdown[p.get_seat_num() - 1] = 1
+        elif event == 'win':
+            self._won[data['player'].get_seat_num() - 1] += self._units(data['amount'])
+        elif event == 'hand_end':
+            # rows are kept as tuples until the chunk is written, which is much cheaper than
+            # filling NumPy records one field at a time
+            board = [c.code for c in game.board] + [NO_CARD] * (5 - len(game.board))
+            self._hands.append(self._current + (board, len(self._actions), len(self._hand_actions)))
+            for i in range(self.num_seats):
+                hole = self._holes[i] or [NO_CARD, NO_CARD]
+                self._seats.append((self._stacks[i], hole, self._won[i], self._showdown[i]))
+            self._actions.extend(self._hand_actions)
+            self._current = None
+            self.hands_recorded += 1
+            if len(self._hands) >= self.chunk_size:
+                self.flush()
+
+    def flush(self):
+        """Appends the hands recorded since the last flush to the file as one chunk."""
+        if not self._hands:
+            return
+        hands = np.array(self._hands, dtype=HAND_DTYPE)
+        seats = np.array(self._seats, dtype=SEAT_DTYPE)
+        actions = np.array(self._actions, dtype=ACTION_DTYPE)
+        with open(self.path, 'ab') as f:
+            f.write(_CHUNK_HEADER.pack(_CHUNK_MAGIC, len(hands), len(actions)))
+            f.write(hands.tobytes())
+            f.write(seats.tobytes())
+            f.write(actions.tobytes())
+        self._hands, self._seats, self._actions = [], [], []
+
+    def close(self):
+        """Writes any remaining hands and stops recording the game."""
+        self.flush()
+        if self in self.game.listeners:
+            self.game.listeners.remove(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class Chunk:
+    """
+    The hands of one chunk of a history file, as NumPy arrays read straight from disk.
+
+    Attributes:
+        offset (int): The position of the chunk in the file.
+        hands (np.ndarray): One HAND_DTYPE row per hand. A hand's actions are
+            actions[first_action:first_action + num_actions].
+        seats (np.ndarray): SEAT_DTYPE rows of shape (hands, seats).
+        actions (np.ndarray): One ACTION_DTYPE row per action.
+    """
+    def __init__(self, offset, hands, seats, actions):
+        self.offset = offset
+        self.hands = hands
+        self.seats = seats
+        self.actions = actions
+
+    def __len__(self):
+        return len(self.hands)
+
+    def record(self, i):
+        """Returns the i-th hand of the chunk as a HandRecord."""
+        hand = self.hands[i]
+        start = int(hand['first_action'])
+        return _to_record(hand, self.seats[i], self.actions[start:start + int(hand['num_actions'])])
+
+
+def _to_record(hand, seats, actions):
+    """Builds a HandRecord from a hand's row, its seat rows and its action rows."""
+    return HandRecord(
+        int(hand['number']), int(hand['button']), int(hand['small_blind']), int(hand['big_blind']),
+        [int(s) for s in seats['stack']],
+        [[Card.from_int(int(c)) for c in hole] if hole[0] != NO_CARD else [] for hole in seats['hole']],
+        [Card.from_int(int(c)) for c in hand['board'] if c != NO_CARD],
+        [(int(a['seat']), int(a['street']), int(a['action']), int(a['amount'])) for a in actions],
+        [int(w) for w in seats['won']],
+        [bool(s) for s in seats['showdown']])
+
+
+class HistoryReader:
+    """
+    Reads a hand-history file one chunk at a time.
+
+    Attributes:
+        path (str): The file being read.
+        num_seats (int): The number of seats at the recorded table.
+        names (list): The name of the player in each seat.
+        unit (str): The money value of one recorded unit.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            magic, version, self.num_seats, length = _FILE_HEADER.unpack(f.read(_FILE_HEADER.size))
+            if magic != _FILE_MAGIC or version != _VERSION:
+                raise ValueError('{0} is not a hand-history file'.format(path))
+            description = json.loads(f.read(length).decode())
+        self.names = description['names']
+        self.unit = description['unit']
+        self._data_start = _FILE_HEADER.size + length
+        self._index = None
+        self._firsts = None
+
+    def _chunk_size(self, num_hands, num_actions):
+        return (num_hands * HAND_DTYPE.itemsize + num_hands * self.num_seats * SEAT_DTYPE.itemsize
+                + num_actions * ACTION_DTYPE.itemsize)
+
+    def index(self):
+        """
+        Returns the offset, first hand number and number of hands of every chunk.
+
+        Only the chunk headers are read, skipping over the hands themselves.
+        """
+        if self._index is None:
+            index = []
+            hands = 0
+            with open(self.path, 'rb') as f:
+                offset = self._data_start
+                f.seek(offset)
+                header = f.read(_CHUNK_HEADER.size)
+                while len(header) == _CHUNK_HEADER.size:
+                    magic, num_hands, num_actions = _CHUNK_HEADER.unpack(header)
+                    if magic != _CHUNK_MAGIC:
+                        raise ValueError('corrupt chunk at offset {0} of {1}'.format(offset, self.path))
+                    index.append((offset, hands, num_hands))
+                    hands += num_hands
+                    offset += _CHUNK_HEADER.size + self._chunk_size(num_hands, num_actions)
+                    f.seek(offset)
+                    header = f.read(_CHUNK_HEADER.size)
+            self._index = index
+        return self._index
+
+    def __len__(self):
+        return sum(count for _, _, count in self.index())
+
+    def read_chunk(self, f, offset):
+        """Reads the chunk at offset from the open file f."""
+        f.seek(offset)
+        magic, num_hands, num_actions = _CHUNK_HEADER.unpack(f.read(_CHUNK_HEADER.size))
+        if magic != _CHUNK_MAGIC:
+            raise ValueError('corrupt chunk at offset {0} of {1}'.format(offset, self.path))
+        hands = np.fromfile(f, dtype=HAND_DTYPE, count=num_hands)
+        seats = np.fromfile(f, dtype=SEAT_DTYPE, count=num_hands * self.num_seats).reshape(num_hands, self.num_seats)
+        actions = np.fromfile(f, dtype=ACTION_DTYPE, count=num_actions)
+        return Chunk(offset, hands, seats, actions)
+
+    def read_hand(self, number):
+        """
+        Reads one hand, without reading the rest of its chunk.
+
+        The chunk holding the hand is found from the first hand number of each chunk. Hand
+        and seat rows have a fixed size, so the hand's rows are read straight from their
+        offsets within the chunk, and its actions from the offset its hand row gives.
+
+        Raises:
+            IndexError: If the file has no hand with that number.
+        """
+        index = self.index()
+        if self._firsts is None:
+            self._firsts = [first for _, first, _ in index]
+        i = bisect_right(self._firsts, number) - 1
+        if i < 0 or number - index[i][1] >= index[i][2]:
+            raise IndexError('{0} has no hand {1}'.format(self.path, number))
+        offset, first, count = index[i]
+        row = number - first
+        hands_start = offset + _CHUNK_HEADER.size
+        seats_start = hands_start + count * HAND_DTYPE.itemsize
+        actions_start = seats_start + count * self.num_seats * SEAT_DTYPE.itemsize
+        with open(self.path, 'rb') as f:
+            f.seek(hands_start + row * HAND_DTYPE.itemsize)
+            hand = np.fromfile(f, dtype=HAND_DTYPE, count=1)[0]
+            f.seek(seats_start + row * self.num_seats * SEAT_DTYPE.itemsize)
+            seats = np.fromfile(f, dtype=SEAT_DTYPE, count=self.num_seats)
+            f.seek(actions_start + int(hand['first_action']) * ACTION_DTYPE.itemsize)
+            actions = np.fromfile(f, dtype=ACTION_DTYPE, count=int(hand['num_actions']))
+        return _to_record(hand, seats, actions)
+
+    def chunks(self):
+        """Yields every Chunk in the file in order, reading one at a time."""
+        with open(self.path, 'rb') as f:
+            for offset, _, _ in self.index():
+                yield self.read_chunk(f, offset)
+
+    def hands(self):
+        """Yields every hand in the file in order as a HandRecord."""
+        for chunk in self.chunks():
+            for i in range(len(chunk)):
+                yield chunk.record(i)
+
+    def export_text(self, out):
+        """Writes every hand to the open text file out in the usual text hand-history format."""
+        unit = Decimal(self.unit)
+        for record in self.hands():
+            out.write(record.to_text(self.names, unit))
+            out.write('\n')
+
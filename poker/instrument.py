@@ -0,0 +1,260 @@
+"""instrument.py
+
+This file contains opt-in instrumentation which times each phase of a Game and counts calls to the hand evaluator.
+"""
+
+import sys
+import json
+import time
+from functools import wraps
+import evaluator
+import determine_hand
+from evaluator import HandState
+from game import Game
+
+# the Game methods timed as phases; each one's time includes the phases it calls, so
+# apply_action includes the dealing and showdown that finish a betting round
+PHASES = ('start_hand', 'deal_hole_cards', 'post_blinds', 'apply_action', 'bet', 'show_flop', 'show_turn',
+          'show_river', 'showdown', 'no_showdown', 'equities')
+# the evaluator functions and HandState methods whose calls are counted
+EVALUATOR_FUNCTIONS = ((evaluator, 'evaluate'), (evaluator, 'evaluate_codes'), (determine_hand, 'identify_hand'),
+                       (determine_hand, 'best_hand'), (determine_hand, 'hand_from_strength'),
+                       (determine_hand, 'evaluate_batch'))
+HANDSTATE_METHODS = ('add', 'strength', 'draws')
+# the modules which import evaluator functions by name, and so hold their own references to them
+IMPORTING_MODULES = ('determine_hand', 'equity', 'benchmark')
+
+# latencies are counted in buckets which split every power of two of nanoseconds into four,
+# so a percentile read from the buckets is within 12.5% of the true value
+_SUB_BUCKETS = 4
+
+
+def _bucket(nanoseconds):
+    bits = nanoseconds.bit_length()
+    if bits < 3:
+        return _SUB_BUCKETS * bits
+    return _SUB_BUCKETS * bits + ((nanoseconds >> (bits - 3)) & 3)
+
+
+def _bucket_middle(index):
+    """Returns the middle of a bucket, in nanoseconds."""
+    bits, sub = divmod(index, _SUB_BUCKETS)
+    if bits < 3:
+        return (1 << bits) * 0.75
+    low = (4 + sub) << (bits - 3)
+    return low + (1 << (bits - 3)) / 2
+
+
+class Histogram:
+    """
+    A histogram of durations with a fixed resolution, for percentiles in bounded memory.
+
+    Attributes:
+        count (int): The number of durations added.
+        total (int): Their sum, in nanoseconds.
+        max (int): The longest, in nanoseconds.
+        buckets (dict): Maps each bucket index to the number of durations in it.
+    """
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = {}
+
+    def add(self, nanoseconds):
+        """Adds one duration, in integer nanoseconds."""
+        self.count += 1
+        self.total += nanoseconds
+        if nanoseconds > self.max:
+            self.max = nanoseconds
+        index = _bucket(nanoseconds)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+
+    def merge(self, other):
+        """Adds the durations of another Histogram into this one, and returns this one."""
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+        for index, count in other.buckets.items():
+            self.buckets[index] = self.buckets.get(index, 0) + count
+        return self
+
+    def percentile(self, p):
+        """Returns the duration, in seconds, below which a fraction p of the durations lie."""
+        if not self.count:
+            return 0.0
+        rank = p * self.count
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                return min(_bucket_middle(index), self.max) / 1e9
+        return self.max / 1e9
+
+    def summary(self):
+        """Returns the count and the total, mean, median, 99th percentile and longest durations in seconds."""
+        return {
+            'count': self.count,
+            'total': self.total / 1e9,
+            'mean': self.total / self.count / 1e9 if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p99': self.percentile(0.99),
+            'max': self.max / 1e9,
+        }
+
+
+class Instrumentation:
+    """
+    Times each Game phase and counts evaluator calls while it is enabled.
+
+    Nothing is measured until enable() is called, and nothing costs anything either: the
+    phases and evaluator functions are only wrapped with timers and counters while the
+    instrumentation is enabled, and disable() puts the original functions back.
+
+    Functions imported by name into the modules in IMPORTING_MODULES, such as
+    evaluate_batch in equity.py, are wrapped there too, so every call made by the package
+    is counted. Calls through references held anywhere else, such as a script's own import
+    of best_hand, are only counted if they go through the module, as in
+    determine_hand.best_hand.
+
+    Only one Instrumentation can be enabled at a time, and it measures this process only,
+    so simulations should be run with one worker, or with an Instrumentation enabled in
+    each worker and their results merged.
+
+    For example:
+
+        profile = Instrumentation()
+        with profile:
+            simulator.play_hands(1000)
+        print(profile.to_prometheus())
+
+    Attributes:
+        phases (dict): Maps each phase name to the Histogram of its durations.
+        calls (dict): Maps each evaluator function name to the number of calls to it.
+    """
+    _active = None
+
+    def __init__(self):
+        self.phases = {name: Histogram() for name in PHASES}
+        self.calls = {}
+        self._counters = {}
+        self._patches = []
+
+    def _timed(self, name, function):
+        histogram = self.phases[name]
+        clock = time.perf_counter_ns
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            start = clock()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                histogram.add(clock() - start)
+        return timed
+
+    def _counted(self, name, function):
+        counter = self._counters.setdefault(name, [0])
+
+        @wraps(function)
+        def counted(*args, **kwargs):
+            counter[0] += 1
+            return function(*args, **kwargs)
+        return counted
+
+    def _patch(self, owner, attribute, replacement):
+        self._patches.append((owner, attribute, getattr(owner, attribute)))
+        setattr(owner, attribute, replacement)
+
+    def enable(self):
+        """Starts measuring, by wrapping the Game phases and the evaluator functions."""
+        if Instrumentation._active is not None:
+            raise RuntimeError('another Instrumentation is already enabled')
+        Instrumentation._active = self
+        for name in PHASES:
+            self._patch(Game, name, self._timed(name, Game.__dict__[name]))
+        for name in HANDSTATE_METHODS:
+            self._patch(HandState, name, self._counted('HandState.' + name, HandState.__dict__[name]))
+        importers = [sys.modules[name] for name in IMPORTING_MODULES if name in sys.modules]
+        for home, name in EVALUATOR_FUNCTIONS:
+            original = getattr(home, name)
+            wrapped = self._counted(name, original)
+            self._patch(home, name, wrapped)
+            for module in importers:
+                if module is not home and vars(module).get(name) is original:
+                    self._patch(module, name, wrapped)
+        return self
+
+    def disable(self):
+        """Stops measuring and restores the original functions; what was measured is kept."""
+        for owner, attribute, original in reversed(self._patches):
+            setattr(owner, attribute, original)
+        self._patches = []
+        if Instrumentation._active is self:
+            Instrumentation._active = None
+        self._collect()
+
+    def __enter__(self):
+        return self.enable()
+
+    def __exit__(self, *exc_info):
+        self.disable()
+
+    def _collect(self):
+        for name, counter in self._counters.items():
+            self.calls[name] = self.calls.get(name, 0) + counter[0]
+            counter[0] = 0
+
+    def merge(self, other):
+        """Adds the measurements of another Instrumentation, such as one from a worker process, and returns this one."""
+        self._collect()
+        other._collect()
+        for name, histogram in other.phases.items():
+            self.phases.setdefault(name, Histogram()).merge(histogram)
+        for name, count in other.calls.items():
+            self.calls[name] = self.calls.get(name, 0) + count
+        return self
+
+    def __getstate__(self):
+        # only the measurements travel between processes, not the wrappers
+        self._collect()
+        return {'phases': self.phases, 'calls': self.calls}
+
+    def __setstate__(self, state):
+        self.__init__()
+        self.phases = state['phases']
+        self.calls = state['calls']
+
+    def snapshot(self):
+        """
+        Returns everything measured so far as a dict.
+
+        The dict maps 'phases' to the summary of each phase that ran, with durations in
+        seconds, and 'calls' to the number of calls to each evaluator function.
+        """
+        self._collect()
+        return {
+            'phases': {name: h.summary() for name, h in self.phases.items() if h.count},
+            'calls': dict(self.calls),
+        }
+
+    def to_json(self, **options):
+        """Returns snapshot() as a JSON string; options are passed to json.dumps."""
+        return json.dumps(self.snapshot(), **options)
+
+    def to_prometheus(self, prefix='poker'):
+        """Returns everything measured so far in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = ['# HELP {0}_phase_seconds Time spent in each phase of a Game.'.format(prefix),
+                 '# TYPE {0}_phase_seconds summary'.format(prefix)]
+        for name, summary in snapshot['phases'].items():
+            for quantile, key in (('0.5', 'p50'), ('0.99', 'p99')):
+                lines.append('{0}_phase_seconds{{phase="{1}",quantile="{2}"}} {3!r}'.format(
+                    prefix, name, quantile, summary[key]))
+            lines.append('{0}_phase_seconds_sum{{phase="{1}"}} {2!r}'.format(prefix, name, summary['total']))
+            lines.append('{0}_phase_seconds_count{{phase="{1}"}} {2}'.format(prefix, name, summary['count']))
+        lines.append('# HELP {0}_evaluator_calls_total Calls to each hand evaluator function.'.format(prefix))
+        lines.append('# TYPE {0}_evaluator_calls_total counter'.format(prefix))
+        for name, count in snapshot['calls'].items():
+            lines.append('{0}_evaluator_calls_total{{function="{1}"}} {2}'.format(prefix, name, count))
+        return '\n'.join(lines) + '\n'
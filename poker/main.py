@@ -1,4 +1,5 @@
 import game
+from frontends import ConsoleFrontend
 from decimal import *
 
 
@@ -12,9 +13,12 @@ def main():
             small_blind = Decimal(input("Small blind?: "))
             big_blind = Decimal(input("Big blind?: "))
             break
-        except ValueError:
+        except ArithmeticError:
             print('Invalid input detected.')
-    g = game.Game(num_players, small_blind, big_blind)
+    # the game counts integer chips, each worth the smallest decimal place of the blinds
+    denomination = game.smallest_unit(small_blind, big_blind)
+    g = game.Game(num_players, int(small_blind / denomination), int(big_blind / denomination),
+                  frontend=ConsoleFrontend(), denomination=denomination)
     g.start_game()
 
 
@@ -0,0 +1,107 @@
+"""pot.py
+
+This file contains the pot engine, which tracks what each player has put into the pot and settles the main pot and side pots.
+"""
+
+
+class Pot:
+    """
+    Tracks every player's contribution to the pot over a hand, and settles it at showdown.
+
+    When players are all in for different amounts, the pot is split into layers: the main
+    pot holds what every remaining player could match, and each side pot holds what the
+    deeper stacks put in above that. Chips from players who folded stay in the layers they
+    reached, but folded players cannot win them.
+
+    Attributes:
+        contributions (dict): Maps each player to the chips they have put in this hand.
+        total (int or Decimal): The size of the whole pot.
+    """
+    def __init__(self):
+        self.contributions = {}
+        self.total = 0
+
+    def reset(self):
+        """Empties the pot for a new hand."""
+        self.contributions.clear()
+        self.total = 0
+
+    def add(self, player, chips):
+        """Records chips put into the pot by a player."""
+        self.contributions[player] = self.contributions.get(player, 0) + chips
+        self.total += chips
+
+    def side_pots(self, live):
+        """
+        Returns the layers of the pot, from the main pot to the last side pot.
+
+        Parameters:
+            live (list): The players who have not folded.
+
+        Returns:
+            list: (amount, eligible) pairs, where eligible is the list of live players who
+            put in at least enough to contest that layer, in the order of live.
+        """
+        levels = sorted({self.contributions.get(p, 0) for p in live})
+        pots = []
+        previous = 0
+        for level in levels:
+            amount = sum(min(c, level) - min(c, previous) for c in self.contributions.values())
+            eligible = [p for p in live if self.contributions.get(p, 0) >= level]
+            if amount:
+                pots.append((amount, eligible))
+            previous = level
+        # chips put in by folded players above every live player's contribution go to the last pot
+        excess = sum(c - previous for c in self.contributions.values() if c > previous)
+        if excess:
+            if pots:
+                pots[-1] = (pots[-1][0] + excess, pots[-1][1])
+            else:
+                pots.append((excess, list(live)))
+        return pots
+
+    def award(self, ranked, strength, order, unit=1):
+        """
+        Divides every layer of the pot among the best hands entitled to it.
+
+        The players are ranked once, and the layers are awarded in a single pass: the best
+        group of tied hands takes every layer they are all eligible for, split evenly; the
+        next group takes the layers after that which they can contest; and so on. Chips
+        which cannot be split evenly are dealt out one unit at a time in the given order.
+
+        Parameters:
+            ranked (list): The live players, from the strongest hand to the weakest.
+            strength (callable): Returns the integer strength of a player's hand.
+            order (list): The players in the order odd chips are given out, usually
+                starting to the left of the button.
+            unit (int or Decimal): The smallest chip which may be given to one player.
+
+        Returns:
+            list: (player, amount, pot_index, split) tuples, one for each share of each layer.
+        """
+        pots = self.side_pots(ranked)
+        seat = {p: i for i, p in enumerate(order)}
+        awards = []
+        index = 0
+        start = 0
+        while start < len(ranked) and index < len(pots):
+            end = start + 1
+            best = strength(ranked[start])
+            while end < len(ranked) and strength(ranked[end]) == best:
+                end += 1
+            group = ranked[start:end]
+            while index < len(pots):
+                amount, eligible = pots[index]
+                winners = [p for p in group if p in eligible]
+                if not winners:
+                    # nobody in this group put in enough for this layer, so a weaker hand may win it
+                    break
+                winners.sort(key=lambda p: seat.get(p, len(seat)))
+                units, odd = divmod(amount // unit, len(winners))
+                remainder = amount - units * unit * len(winners) - odd * unit
+                for i, p in enumerate(winners):
+                    share = units * unit + (unit if i < odd else 0) + (remainder if i == 0 else 0)
+                    awards.append((p, share, index, len(winners) > 1))
+                index += 1
+            start = end
+        return awards
@@ -0,0 +1,235 @@
+"""preflop.py
+
+This file contains a precomputed table of heads-up preflop all-in equities between the 169 starting-hand classes.
+"""
+
+import os
+import sys
+import mmap
+import struct
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from hands import Card, parse_cards
+from ranges import RANK_CHARS, NUM_COMBOS, Range, class_combos
+from equity import EquityResult, SHARE_UNITS, _prepare, _run_chunk
+from runner import spawn_generators, split_work
+
+NUM_CLASSES = 169
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'preflop_equity.bin')
+
+# file header: magic, format version, number of classes, iterations per matchup; the header
+# is followed by three little-endian uint32 arrays of shape (169, 169): trials, wins and ties
+_MAGIC = b'PFEQ'
+_VERSION = 1
+_HEADER = struct.Struct('<4sHHI')
+
+
+def _class_name(i, j):
+    high, low = RANK_CHARS[12 - min(i, j)], RANK_CHARS[12 - max(i, j)]
+    if i == j:
+        return high + low
+    return high + low + ('s' if i < j else 'o')
+
+
+# the classes in the usual 13x13 grid: row and column 0 are aces, pairs lie on the diagonal,
+# suited hands above it and offsuit hands below it
+HAND_CLASSES = [_class_name(i, j) for i in range(13) for j in range(13)]
+_CLASS_INDEX = {name: index for index, name in enumerate(HAND_CLASSES)}
+
+
+def class_index(hand):
+    """
+    Returns the index in HAND_CLASSES of a hand class or of specific hole cards.
+
+    Parameters:
+        hand: A class name such as 'AKs' or 'QQ', specific hole cards such as 'AhKh', or a
+            list of two Cards.
+    """
+    if isinstance(hand, str):
+        if hand in _CLASS_INDEX:
+            return _CLASS_INDEX[hand]
+        name = hand[0].upper() + hand[1].upper() + hand[2:].lower()
+        if name in _CLASS_INDEX:
+            return _CLASS_INDEX[name]
+        if name[1] + name[0] + name[2:] in _CLASS_INDEX:
+            return _CLASS_INDEX[name[1] + name[0] + name[2:]]
+        hand = parse_cards(hand)
+    first, second = sorted(hand, key=lambda c: c.rank, reverse=True)
+    i, j = 14 - first.rank, 14 - second.rank
+    if i == j or first.suit == second.suit:
+        return 13 * i + j
+    return 13 * j + i
+
+
+def class_range(index):
+    """Returns the Range holding every combo of a hand class."""
+    i, j = divmod(index, 13)
+    high, low = 14 - min(i, j), 14 - max(i, j)
+    weights = np.zeros(NUM_COMBOS)
+    weights[class_combos(high, low, None if i == j else i < j)] = 1.0
+    return Range(weights, HAND_CLASSES[index])
+
+
+class PreflopTable:
+    """
+    A read-only, memory-mapped table of heads-up preflop all-in results between hand classes.
+
+    Each matchup stores the integer tallies of a Monte Carlo run, so a lookup rebuilds the
+    same EquityResult a simulation would have returned. The arrays are views straight into
+    the mapped file, so loading is instant, and processes which load the same file share
+    its pages. A class against itself is stored with every runout counted from both sides,
+    so its trials and ties are doubled and its equity is exactly 0.5.
+
+    Attributes:
+        path (str): The file the table was loaded from.
+        iterations (int): The number of runouts dealt for each matchup when the table was built.
+        trials (np.ndarray): trials[i, j] is the number of runouts counted for class i against class j.
+        wins (np.ndarray): wins[i, j] is the number of those runouts won outright by class i.
+        ties (np.ndarray): ties[i, j] is the number of those runouts which were split.
+    """
+    def __init__(self, path=TABLE_PATH):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, classes, self.iterations = _HEADER.unpack_from(self._map)
+        if magic != _MAGIC or version != _VERSION or classes != NUM_CLASSES:
+            raise ValueError('{0} is not a preflop equity table'.format(path))
+        size = NUM_CLASSES * NUM_CLASSES
+        arrays = []
+        for k in range(3):
+            offset = _HEADER.size + 4 * size * k
+            arrays.append(np.frombuffer(self._map, dtype='<u4', count=size, offset=offset)
+                          .reshape(NUM_CLASSES, NUM_CLASSES))
+        self.trials, self.wins, self.ties = arrays
+
+    def lookup(self, first, second):
+        """Returns the EquityResult of one hand class against another, given as names, hole cards or indices."""
+        i = first if isinstance(first, int) else class_index(first)
+        j = second if isinstance(second, int) else class_index(second)
+        trials, wins, ties = int(self.trials[i, j]), int(self.wins[i, j]), int(self.ties[i, j])
+        result = EquityResult([HAND_CLASSES[i], HAND_CLASSES[j]])
+        result.trials = trials
+        result.wins = [wins, trials - wins - ties]
+        result.ties = [ties, ties]
+        half = SHARE_UNITS // 2
+        for p in range(2):
+            result.share_units[p] = result.wins[p] * SHARE_UNITS + ties * half
+            result.share_squares[p] = result.wins[p] * SHARE_UNITS ** 2 + ties * half ** 2
+        return result
+
+    def equity(self, first, second):
+        """Returns the equity of one hand class against another, from 0 to 1."""
+        return self.lookup(first, second).equity()[0]
+
+
+_table = None
+
+
+def get_table():
+    """Returns the shared PreflopTable, loading it on first use, or None if the table file has not been built."""
+    global _table
+    if _table is None and os.path.exists(TABLE_PATH):
+        _table = PreflopTable(TABLE_PATH)
+    return _table
+
+
+def as_class(spec):
+    """Returns the index of the hand class a range spec holds in full, or None if it is anything else."""
+    if isinstance(spec, str):
+        try:
+            spec = Range.from_str(spec)
+        except ValueError:
+            return None
+    if not isinstance(spec, Range) or not len(spec):
+        return None
+    combos, _ = spec.combos()
+    index = class_index([Card.from_int(int(code)) for code in combos[0]])
+    return index if spec == class_range(index) else None
+
+
+def table_result(ranges):
+    """Returns the table's EquityResult for two ranges which are whole hand classes, or None if it cannot be used."""
+    table = get_table()
+    if table is None:
+        return None
+    classes = [as_class(r) for r in ranges]
+    if None in classes:
+        return None
+    return table.lookup(*classes)
+
+
+def _build_chunk(matchups, iterations, rng):
+    """Simulates a list of (i, j) matchups and returns their tallies; the unit of work given to each process."""
+    tallies = []
+    for i, j in matchups:
+        ranges, board, dead = _prepare([class_range(i), class_range(j)], None, None)
+        result = _run_chunk(ranges, board, dead, 10000, iterations, rng)
+        tallies.append((i, j, result.trials, result.wins[0], result.ties[0]))
+    return tallies
+
+
+def build_table(iterations=20000, seed=None, workers=None):
+    """
+    Simulates every matchup between two hand classes with the equity calculator.
+
+    Only the matchups with i <= j are simulated; the rest are the same runouts seen from
+    the other side.
+
+    Parameters:
+        iterations (int): The number of runouts to deal for each matchup.
+        seed: The root seed, so that the same seed and number of workers build the same table.
+        workers (int): The number of processes, defaulting to the number of cores.
+
+    Returns:
+        tuple: The trials, wins and ties arrays, each of shape (169, 169).
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    matchups = [(i, j) for i in range(NUM_CLASSES) for j in range(i, NUM_CLASSES)]
+    chunks = []
+    start = 0
+    for count in split_work(len(matchups), workers):
+        chunks.append(matchups[start:start + count])
+        start += count
+    generators = spawn_generators(seed, workers)
+    if workers == 1:
+        results = [_build_chunk(chunks[0], iterations, generators[0])]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_build_chunk, chunks, [iterations] * workers, generators))
+
+    return _store_tallies(results)
+
+
+def _store_tallies(results):
+    """Returns the trials, wins and ties arrays filled from the tallies of _build_chunk, seen from both sides."""
+    trials, wins, ties = (np.zeros((NUM_CLASSES, NUM_CLASSES), dtype=np.uint32) for _ in range(3))
+    for tallies in results:
+        for i, j, t, w, tie in tallies:
+            if i == j:
+                # both sides hold the same class, so every runout is counted once from each side:
+                # the wins of one side and of the other make up the wins, and the equity is exactly 0.5
+                trials[i, i] = 2 * t
+                ties[i, i] = 2 * tie
+                wins[i, i] = t - tie
+                continue
+            trials[i, j] = trials[j, i] = t
+            ties[i, j] = ties[j, i] = tie
+            wins[j, i] = t - w - tie
+            wins[i, j] = w
+    return trials, wins, ties
+
+
+def write_table(trials, wins, ties, iterations, path=TABLE_PATH):
+    """Writes tallies from build_table to a table file which PreflopTable can load."""
+    with open(path, 'wb') as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, NUM_CLASSES, iterations))
+        for array in (trials, wins, ties):
+            f.write(np.ascontiguousarray(array, dtype='<u4').tobytes())
+
+
+if __name__ == '__main__':
+    # usage: python preflop.py [iterations per matchup]
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    write_table(*build_table(iterations, seed=0), iterations)
+    print('Wrote {0}'.format(TABLE_PATH))
@@ -0,0 +1,248 @@
+"""ranges.py
+
+This file contains a parser for hand-range notation such as "QQ+, AKs, 76s:0.5" and a weighted range of hole cards.
+"""
+
+import numpy as np
+from hands import parse_cards
+
+RANK_CHARS = '23456789TJQKA'
+
+# every pair of distinct card encodings a < b, in a fixed order, and the index of each pair
+COMBOS = np.array([(a, b) for b in range(52) for a in range(b)], dtype=np.intp)
+NUM_COMBOS = len(COMBOS)
+COMBO_INDEX = np.full((52, 52), -1, dtype=np.intp)
+COMBO_INDEX[COMBOS[:, 0], COMBOS[:, 1]] = np.arange(NUM_COMBOS)
+COMBO_INDEX[COMBOS[:, 1], COMBOS[:, 0]] = np.arange(NUM_COMBOS)
+
+
+def combo_index(first, second):
+    """Returns the index in COMBOS of the hole cards with the given encodings, in either order."""
+    return int(COMBO_INDEX[first, second])
+
+
+def class_combos(high, low, suited=None):
+    """
+    Returns the COMBOS indices of a starting-hand class, such as AKs or QQ.
+
+    Parameters:
+        high (int): The higher rank, from 2 to 14.
+        low (int): The lower rank, from 2 to 14; equal to high for a pair.
+        suited (bool): True for suited combos only, False for offsuit only, None for both.
+    """
+    indices = []
+    for s in range(4):
+        for t in range(4):
+            if high == low and t <= s:
+                continue
+            if high != low and suited is not None and (s == t) != suited:
+                continue
+            indices.append(COMBO_INDEX[4 * (high - 2) + s, 4 * (low - 2) + t])
+    return indices
+
+
+class AliasTable:
+    """
+    Samples indices in proportion to fixed weights in constant time per draw.
+
+    The table is built once with Vose's alias method: every index i gets a probability
+    prob[i] and an alias, and a draw picks an index uniformly, keeping it with probability
+    prob[i] and taking its alias otherwise.
+
+    Attributes:
+        prob (np.ndarray): The probability of keeping each index once it is picked.
+        alias (np.ndarray): The index taken instead of each index when it is not kept.
+    """
+    def __init__(self, weights):
+        weights = np.asarray(weights, dtype=float)
+        n = len(weights)
+        total = weights.sum()
+        if not n or total <= 0:
+            raise ValueError('weights must include at least one positive weight')
+        scaled = weights * (n / total)
+        self.prob = np.ones(n)
+        self.alias = np.arange(n)
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self.prob[less] = scaled[less]
+            self.alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+        # anything left over is exactly 1 up to rounding error, so it is always kept
+
+    def sample(self, rng, size):
+        """Returns an array of size indices drawn by weight."""
+        picked = rng.integers(len(self.prob), size=size)
+        keep = rng.random(size) < self.prob[picked]
+        return np.where(keep, picked, self.alias[picked])
+
+
+class Range:
+    """
+    Represents a weighted range of hole cards as a vector over all 1326 two-card combos.
+
+    Ranges are built from standard notation with from_str, and combined with | (the larger
+    weight of each combo), & (the smaller weight) and - (the first weight, less the second).
+
+    Attributes:
+        weights (np.ndarray): The weight of each combo, indexed like COMBOS, from 0 to 1.
+        label (str): A short description of the range, used in results.
+    """
+    def __init__(self, weights=None, label=''):
+        if weights is None:
+            weights = np.zeros(NUM_COMBOS)
+        self.weights = np.asarray(weights, dtype=float)
+        if self.weights.shape != (NUM_COMBOS,):
+            raise ValueError('a range has one weight for each of the {0} combos'.format(NUM_COMBOS))
+        self.label = label
+        self._index = None
+        self._alias = None
+
+    @staticmethod
+    def from_str(text):
+        """
+        Parses a comma-separated range such as "QQ+, AKs, A5s-A2s, 76s:0.5, AhKh".
+
+        Each term is a pair (QQ), a suited (AKs), offsuit (AKo) or any (AK) hand class, or
+        specific hole cards (AhKh). A pair followed by + includes every higher pair, and a
+        non-pair class followed by + raises its lower card up to one below the higher card,
+        so ATs+ is ATs, AJs, AQs and AKs. Two classes joined by - include everything between
+        them, as in 99-66 or A5s-A2s. A term may end with :weight to include its combos with
+        that weight instead of 1; later terms override earlier ones. 'random' is every combo.
+
+        Raises:
+            ValueError: If a term cannot be parsed.
+        """
+        weights = np.zeros(NUM_COMBOS)
+        for term in text.split(','):
+            term = term.strip()
+            if not term:
+                continue
+            weight = 1.0
+            if ':' in term:
+                term, _, value = term.partition(':')
+                try:
+                    weight = float(value)
+                except ValueError:
+                    raise ValueError('invalid weight in range term {0!r}'.format(term))
+                if not(0 <= weight <= 1):
+                    raise ValueError('range weights must be between 0 and 1')
+                term = term.strip()
+            weights[_parse_term(term)] = weight
+        return Range(weights, text)
+
+    def __len__(self):
+        """Returns the number of combos with a positive weight."""
+        return int(np.count_nonzero(self.weights))
+
+    def __contains__(self, hole_cards):
+        """Returns whether hole cards, as a string such as 'AhKh' or two Cards, have a positive weight."""
+        cards = parse_cards(hole_cards) if isinstance(hole_cards, str) else hole_cards
+        return bool(self.weights[combo_index(cards[0].to_int(), cards[1].to_int())] > 0)
+
+    def __or__(self, other):
+        return Range(np.maximum(self.weights, other.weights), '{0}, {1}'.format(self.label, other.label))
+
+    def __and__(self, other):
+        return Range(np.minimum(self.weights, other.weights), '({0}) & ({1})'.format(self.label, other.label))
+
+    def __sub__(self, other):
+        return Range(np.maximum(self.weights - other.weights, 0.0), '({0}) - ({1})'.format(self.label, other.label))
+
+    def __eq__(self, other):
+        if not isinstance(other, Range):
+            return NotImplemented
+        return bool(np.array_equal(self.weights, other.weights))
+
+    def __ne__(self, other):
+        result = self.__eq__(other)
+        return result if result is NotImplemented else not result
+
+    __hash__ = None
+
+    def __str__(self):
+        return self.label
+
+    def size(self):
+        """Returns the total weight of the range, i.e. the expected number of combos."""
+        return float(self.weights.sum())
+
+    def without(self, dead):
+        """Returns the range with every combo containing one of the dead card encodings removed."""
+        if not len(dead):
+            return self
+        weights = self.weights.copy()
+        dead = list(dead)
+        weights[np.isin(COMBOS, dead).any(axis=1)] = 0.0
+        return Range(weights, self.label)
+
+    def combos(self):
+        """Returns the (N, 2) array of card encodings of the combos with a positive weight, and their weights."""
+        index = np.flatnonzero(self.weights)
+        return COMBOS[index], self.weights[index]
+
+    def sample(self, rng, size):
+        """Returns an array of shape (size, 2) of combos drawn by weight, using an alias table built on first use."""
+        if self._alias is None:
+            self._index = np.flatnonzero(self.weights)
+            self._alias = AliasTable(self.weights[self._index])
+        return COMBOS[self._index[self._alias.sample(rng, size)]]
+
+
+def _parse_rank(char, term):
+    rank = RANK_CHARS.find(char.upper())
+    if rank < 0:
+        raise ValueError('invalid rank in range term {0!r}'.format(term))
+    return rank + 2
+
+
+def _parse_class(text, term):
+    """Parses a hand class such as 'AKs', 'QQ' or 'T9' into (high, low, suited)."""
+    if len(text) not in (2, 3):
+        raise ValueError('invalid range term {0!r}'.format(term))
+    high, low = _parse_rank(text[0], term), _parse_rank(text[1], term)
+    if high < low:
+        high, low = low, high
+    suited = None
+    if len(text) == 3:
+        if text[2].lower() not in 'so' or high == low:
+            raise ValueError('invalid range term {0!r}'.format(term))
+        suited = text[2].lower() == 's'
+    return high, low, suited
+
+
+def _parse_term(term):
+    """Returns the COMBOS indices of one term of a range, without its weight."""
+    if term.lower() in ('random', 'any'):
+        return list(range(NUM_COMBOS))
+    if len(term) >= 4 and term[-1] in 'hdcs' and '-' not in term:
+        cards = parse_cards(term)
+        if len(cards) != 2 or cards[0].is_same(cards[1]):
+            raise ValueError('invalid range term {0!r}'.format(term))
+        return [combo_index(cards[0].to_int(), cards[1].to_int())]
+
+    if term.endswith('+'):
+        high, low, suited = _parse_class(term[:-1], term)
+        if high == low:
+            return [i for rank in range(low, 15) for i in class_combos(rank, rank)]
+        return [i for rank in range(low, high) for i in class_combos(high, rank, suited)]
+
+    if '-' in term:
+        first, _, last = term.partition('-')
+        high, low, suited = _parse_class(first.strip(), term)
+        other_high, other_low, other_suited = _parse_class(last.strip(), term)
+        if high == low and other_high == other_low:
+            lowest, highest = sorted((low, other_low))
+            return [i for rank in range(lowest, highest + 1) for i in class_combos(rank, rank)]
+        if high != other_high or suited != other_suited or high == low or other_high == other_low:
+            raise ValueError('a range such as {0!r} must keep the same higher card'.format(term))
+        lowest, highest = sorted((low, other_low))
+        return [i for rank in range(lowest, highest + 1) for i in class_combos(high, rank, suited)]
+
+    high, low, suited = _parse_class(term, term)
+    return class_combos(high, low, suited)
@@ -0,0 +1,209 @@
+"""replay.py
+
+This file contains a replay engine which rebuilds the Game of any recorded hand at any point and plays it forward.
+"""
+
+from decimal import Decimal
+from game import Deck, Game
+from history import ACTIONS, ACTION_CODES, STREET_CODES, HistoryReader
+
+# blinds are recorded as actions, but are posted by the game itself rather than decided
+_FIRST_DECISION = ACTION_CODES['fold']
+
+
+class StackedDeck(Deck):
+    """
+    A deck which deals cards in a fixed order instead of shuffling.
+
+    Attributes:
+        codes (list): The card encodings dealt first, in order; the rest of the deck follows them.
+    """
+    def __init__(self, codes, rng=None):
+        self.codes = list(codes)
+        super().__init__(rng)
+        rest = [code for code in range(52) if code not in set(self.codes)]
+        self.order = self.codes + rest
+        for i, code in enumerate(self.order):
+            self.position[code] = i
+
+    def shuffle(self, num_cards=None):
+        """Leaves the deck in its fixed order."""
+        self.shuffled_to = None
+
+
+def _deal_order(record):
+    """
+    Returns the card encodings in the order a Game deals them in a recorded hand.
+
+    The hole cards go round the table twice from the seat after the button, and each street
+    is preceded by a burn card; burn cards and any board cards which were never dealt are
+    taken from the cards not otherwise used in the hand.
+    """
+    seats = [seat for seat in range(1, len(record.stacks) + 1) if record.hole_cards[seat - 1]]
+    seats = [s for s in seats if s > record.button] + [s for s in seats if s <= record.button]
+    used = {c.code for hole in record.hole_cards for c in hole} | {c.code for c in record.board}
+    spare = iter(code for code in range(52) if code not in used)
+    codes = [record.hole_cards[s - 1][k].code for k in range(2) for s in seats]
+    board = [c.code for c in record.board]
+    for start, end in ((0, 3), (3, 4), (4, 5)):
+        codes.append(next(spare))
+        codes.extend(board[i] if i < len(board) else next(spare) for i in range(start, end))
+    return codes
+
+
+class Replay:
+    """
+    Replays one recorded hand on a Game, one decision at a time.
+
+    The game is set up exactly as the hand began, with the recorded stacks, button and
+    blinds, and a deck stacked to deal the recorded cards, so start_hand() deals the same
+    hole cards and posts the same blinds. Every recorded decision is then applied with
+    apply_action(), so at each point the game's stacks, pot, players_in_hand, board and
+    previous_bet are exactly what the engine had. Because the game is an ordinary Game, a
+    different action may also be applied at any point to see what would have happened; the
+    board still comes from the recorded cards.
+
+    Attributes:
+        record (HandRecord): The hand being replayed.
+        names (list): The name of the player in each seat.
+        unit (Decimal): The money value of one recorded unit, which is the game's denomination.
+        game (Game): The game the hand is replayed on.
+        decisions (list): The recorded (seat, street, action, amount) decisions, without the blinds.
+        position (int): The number of decisions applied so far.
+    """
+    def __init__(self, record, names, unit=1):
+        self.record = record
+        self.names = names
+        self.unit = Decimal(unit)
+        self.decisions = [a for a in record.actions if a[2] >= _FIRST_DECISION]
+        self.restart()
+
+    def restart(self):
+        """Starts the hand again on a new game, before the first decision."""
+        record = self.record
+        self.game = Game(len(self.names), record.small_blind, record.big_blind, names=self.names,
+                         button=record.button, denomination=self.unit)
+        self.game.deck = StackedDeck(_deal_order(record), self.game.rng)
+        for player, stack, hole in zip(self.game.get_players(), record.stacks, record.hole_cards):
+            player.set_stack(stack)
+            if stack > 0 and not hole:
+                player.sit_out()
+        self.game.start_hand()
+        self.position = 0
+
+    def __len__(self):
+        return len(self.decisions)
+
+    def done(self):
+        """Returns whether every recorded decision has been applied."""
+        return self.position >= len(self.decisions)
+
+    def step(self):
+        """
+        Applies the next recorded decision and returns it.
+
+        Returns:
+            tuple: The player, action and amount applied.
+
+        Raises:
+            ValueError: If the recorded decision is not legal in the game, which means the
+                game is not being played as it was recorded.
+        """
+        seat, street, action, amount = self.decisions[self.position]
+        player = self.game.get_player_at_seat(seat)
+        if player is not self.game.to_act or STREET_CODES[self.game.street] != street:
+            raise ValueError('hand {0} does not replay: {1} acts out of turn'.format(self.record.number, player))
+        action = ACTIONS[action]
+        amount = amount if action in ('bet', 'raise') else None
+        self.game.apply_action(player, action, amount)
+        self.position += 1
+        return player, action, amount
+
+    def seek(self, position):
+        """
+        Moves the replay to just before the given decision.
+
+        Moving forward applies the decisions in between; moving back starts the hand again.
+        """
+        if not(0 <= position <= len(self.decisions)):
+            raise IndexError('hand {0} has {1} decisions'.format(self.record.number, len(self.decisions)))
+        if position < self.position:
+            self.restart()
+        while self.position < position:
+            self.step()
+
+    def find(self, street, seat=None):
+        """
+        Returns the index of the first decision on a street, optionally the first by one seat.
+
+        Raises:
+            ValueError: If nobody, or not that seat, acted on the street.
+        """
+        code = STREET_CODES[street]
+        for i, (acting, acted_street, _, _) in enumerate(self.decisions):
+            if acted_street == code and (seat is None or acting == seat):
+                return i
+        raise ValueError('nobody {0}acted on the {1} in hand {2}'.format(
+            '' if seat is None else 'in seat {0} '.format(seat), street, self.record.number))
+
+    def finish(self):
+        """Applies every remaining decision, so the hand ends as it did when recorded."""
+        while not self.done():
+            self.step()
+
+    def snapshot(self):
+        """
+        Returns the state of the game as a dict.
+
+        The dict holds the street, the seat to act (or None), each seat's stack and bet,
+        the pot, the seats still in the hand, the board and the bet to match.
+        """
+        game = self.game
+        return {
+            'hand': self.record.number,
+            'position': self.position,
+            'street': game.street,
+            'to_act': game.to_act.get_seat_num() if game.to_act else None,
+            'stacks': [p.get_stack() for p in game.get_players()],
+            'bets': [p.get_bet() for p in game.get_players()],
+            'pot': game.pot,
+            'players_in_hand': [p.get_seat_num() for p in game.players_in_hand],
+            'board': list(game.board),
+            'previous_bet': game.previous_bet,
+        }
+
+
+class Replayer:
+    """
+    Opens a hand-history file for replaying any of its hands.
+
+    Seeking reads only the hand asked for: its chunk is found from the file's chunk index,
+    and its rows are read straight from their offsets, so the cost of a seek does not depend
+    on how many hands come before it.
+
+    Attributes:
+        reader (HistoryReader): The file being replayed.
+    """
+    def __init__(self, path):
+        self.reader = HistoryReader(path)
+
+    def replay(self, number):
+        """Returns a Replay of a hand, positioned before its first decision."""
+        return Replay(self.reader.read_hand(number), self.reader.names, self.reader.unit)
+
+    def seek(self, number, position=0, street=None, seat=None):
+        """
+        Returns a Replay of a hand, positioned just before one of its decisions.
+
+        Parameters:
+            number (int): The number of the hand.
+            position (int): The index of the decision, not counting the blinds.
+            street (str): If given, the replay stops before the first decision on this
+                street instead, such as 'turn'.
+            seat (int): With street, the replay stops before this seat's first decision on it.
+        """
+        replay = self.replay(number)
+        if street is not None:
+            position = replay.find(street, seat)
+        replay.seek(position)
+        return replay
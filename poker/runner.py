@@ -0,0 +1,73 @@
+"""runner.py
+
+This file contains a process-pool runner which splits simulations across cores with reproducible seeding.
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+
+def split_work(total, chunks):
+    """Splits total units of work into chunks as evenly as possible, larger chunks first."""
+    size, extra = divmod(total, chunks)
+    return [size + (i < extra) for i in range(chunks)]
+
+
+def spawn_generators(seed, count):
+    """
+    Returns count independent numpy.random.Generator streams derived from one root seed.
+
+    Parameters:
+        seed: An int, a numpy.random.SeedSequence, or None for fresh entropy.
+        count (int): The number of streams.
+    """
+    root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    return [np.random.default_rng(child) for child in root.spawn(count)]
+
+
+def _merge(total, partial):
+    return partial if total is None else total.merge(partial)
+
+
+def run_parallel(task, total, seed=None, workers=None, merge=_merge):
+    """
+    Runs task over total units of work split across a pool of worker processes.
+
+    The work is split into one chunk per worker, and chunk i is run as task(count, rng) where
+    rng is the i-th Generator spawned from seed. Partial results are merged as soon as every
+    earlier chunk has been merged, so the merge order never depends on which worker finishes
+    first. Running again with the same seed and number of workers therefore gives a
+    bit-identical total.
+
+    Parameters:
+        task (callable): A picklable function, such as a module-level function or a
+            functools.partial of one, called as task(count, rng) and returning a partial result.
+        total (int): The total number of units of work, e.g. hands or equity trials.
+        seed: The root seed for every worker's Generator.
+        workers (int): The number of processes, defaulting to the number of cores. With one
+            worker, the task runs in this process.
+        merge (callable): Combines the running total (None at first) with a partial result
+            and returns the new total. By default, partial results are merged with their merge method.
+
+    Returns:
+        The merged result of every chunk.
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    counts = split_work(total, workers)
+    generators = spawn_generators(seed, workers)
+    result = None
+    if workers == 1:
+        return merge(result, task(counts[0], generators[0]))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, count, rng): i for i, (count, rng) in enumerate(zip(counts, generators))}
+        finished = {}
+        next_index = 0
+        for future in as_completed(futures):
+            finished[futures[future]] = future.result()
+            while next_index in finished:
+                result = merge(result, finished.pop(next_index))
+                next_index += 1
+    return result
@@ -0,0 +1,490 @@
+"""server.py
+
+This file contains an asyncio table server which runs many games in one event loop and streams their events to players over WebSockets.
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from decimal import Decimal
+from game import Game
+from frontends import WebFrontend, _to_json
+from simulate import check_call, random_action, tight_aggressive
+
+# the seconds a player has to act before they check, or fold if they cannot check
+ACTION_TIMEOUT = 30.0
+
+
+class Table:
+    """
+    One game hosted by a TableServer.
+
+    The table plays hands on its own Game whenever at least two players are seated and at
+    least one of them is remote, so bots never play on their own. Seats are taken by remote
+    players, through connections, or by bots. When it is a remote player's turn, the table
+    sends them their legal actions and waits for their reply without blocking the event
+    loop; if none arrives within action_timeout, they check, or fold if they cannot. A
+    remote player who leaves during a hand folds when their turn comes, and their seat is
+    only opened again once the hand is over. After every change, the new events are sent
+    to every connection at the table as one delta, with other players' hole cards hidden.
+
+    A connection is anything with an async send(text) method, such as a WebSocket
+    connection or the simulated clients of load_test().
+
+    Attributes:
+        table_id (str): The table's name on the server.
+        game (Game): The game played at the table, in integer chips.
+        frontend (WebFrontend): Queues the game's events in a JSON-friendly form.
+        starting_stack (int): The chips a player sits down with, and rebuys for when busted.
+        action_timeout (float): The seconds a remote player has to act.
+        bots (dict): Maps seat numbers to bot strategies, as in ScriptedFrontend.
+        connections (dict): Maps seat numbers to the connections of remote players.
+        hands_played (int): The number of hands finished at the table.
+        timeouts (int): The number of actions taken for players who ran out of time.
+    """
+    def __init__(self, table_id, num_seats=6, small_blind=1, big_blind=2, starting_stack=200,
+                 denomination=Decimal('0.01'), action_timeout=ACTION_TIMEOUT, bots=None):
+        self.table_id = table_id
+        self.frontend = WebFrontend()
+        self.game = Game(num_seats, small_blind, big_blind, frontend=self.frontend, button=1,
+                         names=['Seat {0}'.format(i) for i in range(1, num_seats + 1)], denomination=denomination)
+        self.starting_stack = starting_stack
+        self.action_timeout = action_timeout
+        self.bots = dict(bots or {})
+        self.connections = {}
+        self.hands_played = 0
+        self.timeouts = 0
+        self._reply = None
+        # the seats of players who left during the current hand
+        self._vacating = set()
+        self._seated = asyncio.Event()
+        self._closed = False
+        for p in self.game.get_players():
+            if p.get_seat_num() in self.bots:
+                p.set_stack(starting_stack)
+            else:
+                p.sit_out()
+
+    def _can_play(self):
+        return bool(self.connections) and len(self.bots) + len(self.connections) >= 2
+
+    def open_seats(self):
+        """Returns the seat numbers nobody has taken."""
+        return [seat for seat in range(1, self.game.num_players + 1)
+                if seat not in self.bots and seat not in self.connections and seat not in self._vacating]
+
+    async def join(self, connection, seat=None, name=None):
+        """
+        Seats a remote player and sends them the state of the table.
+
+        Returns:
+            int: The seat taken.
+
+        Raises:
+            ValueError: If the seat, or every seat, is taken.
+        """
+        open_seats = self.open_seats()
+        if seat is None:
+            if not open_seats:
+                raise ValueError('table {0} is full'.format(self.table_id))
+            seat = open_seats[0]
+        elif seat not in open_seats:
+            raise ValueError('seat {0} is not open'.format(seat))
+        player = self.game.get_player_at_seat(seat)
+        if name:
+            player.name = name
+        # the seat is not in a hand, but may still hold the cards of the last one
+        player.clear_hand()
+        player.set_stack(self.starting_stack)
+        # a player who sits down during a hand is dealt in from the next one
+        player.come_back()
+        self.connections[seat] = connection
+        await self._send(seat, {'type': 'joined', 'table': self.table_id, 'seat': seat, 'state': self.state(seat)})
+        if self._can_play():
+            self._seated.set()
+        return seat
+
+    def leave(self, seat):
+        """Removes a remote player; if they are in the hand, they fold when it is their turn, or at once if it is."""
+        self.connections.pop(seat, None)
+        player = self.game.get_player_at_seat(seat)
+        player.sit_out()
+        if not self.game.hand_over and player in self.game.players_in_hand:
+            self._vacating.add(seat)
+        if self._reply is not None and not self._reply.done() and self.game.to_act is not None \
+                and self.game.to_act.get_seat_num() == seat:
+            self._reply.set_result(('fold', None))
+        if not self._can_play():
+            self._seated.clear()
+
+    def receive(self, seat, message):
+        """
+        Handles an action message from the player at seat.
+
+        Returns:
+            str: An error to send back, or None if the action was accepted for the player to act.
+        """
+        if self._reply is None or self._reply.done() or self.game.to_act is None \
+                or self.game.to_act.get_seat_num() != seat:
+            return 'it is not your turn'
+        amount = message.get('amount')
+        if amount is not None:
+            try:
+                amount = self.game.to_chips(Decimal(str(amount)))
+            except (ArithmeticError, ValueError):
+                return 'invalid amount {0!r}'.format(amount)
+        self._reply.set_result((str(message.get('action', '')), amount))
+        return None
+
+    def state(self, seat=None):
+        """Returns the whole state of the table, as seen from seat, in a JSON-friendly form."""
+        game = self.game
+        players = []
+        for p in game.get_players():
+            players.append({
+                'seat': p.get_seat_num(),
+                'name': p.get_name(),
+                'stack': _to_json(game.to_money(p.get_stack())),
+                'bet': _to_json(game.to_money(p.get_bet())),
+                'in_hand': p in game.players_in_hand and not game.hand_over,
+                'sitting_out': p.sitting_out,
+            })
+        own = game.get_player_at_seat(seat).get_hole_cards() if seat else []
+        return {
+            'players': players,
+            'button': game.button.get_seat_num(),
+            'street': game.street,
+            'board': _to_json(game.board),
+            'pot': _to_json(game.to_money(game.pot)),
+            'to_act': game.to_act.get_seat_num() if game.to_act else None,
+            'hole_cards': _to_json(own),
+        }
+
+    async def _send(self, seat, message):
+        """Sends a message to the connection at seat, dropping the player if the connection has gone."""
+        connection = self.connections.get(seat)
+        if connection is None:
+            return
+        try:
+            await connection.send(json.dumps(message))
+        except Exception:
+            self.leave(seat)
+
+    async def broadcast(self):
+        """Sends the events queued since the last broadcast to every connection, as one delta."""
+        events = self.frontend.poll()
+        if not events or not self.connections:
+            return
+        private = any(e['event'] == 'hole_card' for e in events)
+        public = json.dumps({'type': 'events', 'table': self.table_id, 'events': [
+            {'event': 'hole_card', 'player': e['player']} if e['event'] == 'hole_card' else e for e in events]})
+        for seat, connection in list(self.connections.items()):
+            if private:
+                text = json.dumps({'type': 'events', 'table': self.table_id, 'events': [
+                    {'event': 'hole_card', 'player': e['player']}
+                    if e['event'] == 'hole_card' and e['player'] != seat else e for e in events]})
+            else:
+                text = public
+            try:
+                await connection.send(text)
+            except Exception:
+                self.leave(seat)
+
+    async def get_action(self, player):
+        """Returns the (action, amount) of the player to act, in chips, waiting for a remote player's reply."""
+        seat = player.get_seat_num()
+        legal = self.game.legal_actions()
+        if seat in self._vacating:
+            return ('fold', None)
+        if seat in self.bots:
+            # let the other tables run between bot actions
+            await asyncio.sleep(0)
+            return self.bots[seat](self.game, player, legal)
+        if seat in self.connections:
+            self._reply = asyncio.get_running_loop().create_future()
+            await self._send(seat, {
+                'type': 'turn', 'table': self.table_id, 'timeout': self.action_timeout,
+                'legal': [[action, _to_json(self.game.to_money(low)), _to_json(self.game.to_money(high))]
+                          for action, low, high in legal]})
+            try:
+                return await asyncio.wait_for(self._reply, self.action_timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+            finally:
+                self._reply = None
+        # the player has run out of time or gone
+        return ('check', None) if any(action == 'check' for action, _, _ in legal) else ('fold', None)
+
+    async def play_hand(self):
+        """Plays one hand, asking bots and remote players for their actions."""
+        game = self.game
+        for p in game.get_players():
+            seat = p.get_seat_num()
+            if seat in self.bots or seat in self.connections:
+                p.come_back()
+                if p.get_stack() == 0:
+                    p.set_stack(self.starting_stack)
+            else:
+                p.sit_out()
+        game.move_button()
+        game.start_hand()
+        await self.broadcast()
+        while not game.hand_over:
+            player = game.to_act
+            action, amount = await self.get_action(player)
+            try:
+                game.apply_action(player, action, amount)
+            except ValueError as e:
+                await self._send(player.get_seat_num(), {'type': 'error', 'table': self.table_id, 'message': str(e)})
+            await self.broadcast()
+        self._vacating.clear()
+        self.hands_played += 1
+
+    async def run(self, hands=None):
+        """Plays hands whenever a remote player has company, until hands have been played or close() is called."""
+        while not self._closed and (hands is None or self.hands_played < hands):
+            if not self._can_play():
+                await self._seated.wait()
+                continue
+            await self.play_hand()
+        for seat in list(self.connections):
+            await self._send(seat, {'type': 'closed', 'table': self.table_id})
+
+    def close(self):
+        """Stops the table after the current hand."""
+        self._closed = True
+        self._seated.set()
+
+
+class TableServer:
+    """
+    Hosts many tables in one event loop.
+
+    Each client connection sends JSON messages: {"type": "join", "table": ..., "seat": ...,
+    "name": ...} to sit down, {"type": "action", "action": "raise", "amount": "0.40"} when
+    it is their turn, and {"type": "leave"}. The server replies with 'joined', 'turn',
+    'events', 'error' and 'closed' messages; amounts are in money, as strings.
+
+    Attributes:
+        tables (dict): Maps each table's name to its Table.
+    """
+    def __init__(self):
+        self.tables = {}
+
+    def add_table(self, table_id=None, **options):
+        """Creates a Table, passing options to its constructor, and returns it."""
+        if table_id is None:
+            table_id = 'table-{0}'.format(len(self.tables) + 1)
+        table = Table(table_id, **options)
+        self.tables[table_id] = table
+        return table
+
+    async def handle(self, connection):
+        """
+        Serves one client until its connection closes.
+
+        The connection must support async iteration over the text messages it receives,
+        as WebSocket connections do.
+        """
+        table = seat = None
+
+        async def reply(message):
+            try:
+                await connection.send(json.dumps(message))
+            except Exception:
+                pass
+
+        try:
+            async for text in connection:
+                try:
+                    message = json.loads(text)
+                except ValueError:
+                    await reply({'type': 'error', 'message': 'messages must be JSON'})
+                    continue
+                kind = message.get('type')
+                if kind == 'join' and table is None:
+                    table = self.tables.get(message.get('table'))
+                    if table is None:
+                        await reply({'type': 'error', 'message': 'no table {0!r}'.format(message.get('table'))})
+                        continue
+                    try:
+                        seat = await table.join(connection, message.get('seat'), message.get('name'))
+                    except ValueError as e:
+                        table = None
+                        await reply({'type': 'error', 'message': str(e)})
+                elif kind == 'action' and table is not None:
+                    error = table.receive(seat, message)
+                    if error:
+                        await reply({'type': 'error', 'table': table.table_id, 'message': error})
+                elif kind == 'leave' and table is not None:
+                    table.leave(seat)
+                    table = seat = None
+                else:
+                    await reply({'type': 'error', 'message': 'unexpected {0!r} message'.format(kind)})
+        finally:
+            if table is not None and table.connections.get(seat) is connection:
+                table.leave(seat)
+
+    async def run_tables(self, hands=None):
+        """Runs every table at once, until each has played hands, or forever."""
+        await asyncio.gather(*(table.run(hands) for table in self.tables.values()))
+
+    async def serve(self, host='localhost', port=8765):
+        """
+        Accepts WebSocket clients on host and port and runs every table.
+
+        Raises:
+            ImportError: If the optional websockets package is not installed.
+        """
+        try:
+            import websockets
+        except ImportError:
+            raise ImportError('the table server needs the websockets package: pip install websockets')
+        async with websockets.serve(self.handle, host, port):
+            await self.run_tables()
+
+
+class SimulatedClient:
+    """
+    A client for load tests, which talks to a TableServer through in-memory queues.
+
+    It joins a table, plays every turn with a bot strategy after think_time seconds, and
+    records how long the server waited for each of its replies. A client with think_time
+    longer than the table's action timeout exercises the timeouts.
+
+    Attributes:
+        table_id (str): The table to join.
+        strategy (callable): Chooses actions, as in ScriptedFrontend, from the legal actions in chips.
+        think_time (float): The seconds to wait before replying to each turn.
+        seat (int): The seat the client was given, once it has joined.
+        messages (int): The number of messages received.
+        latencies (list): The seconds from each turn message being sent to the reply being sent.
+    """
+    def __init__(self, table_id, strategy=check_call, think_time=0.0):
+        self.table_id = table_id
+        self.strategy = strategy
+        self.think_time = think_time
+        self.seat = None
+        self.messages = 0
+        self.latencies = []
+        self._incoming = asyncio.Queue()
+        self._outgoing = asyncio.Queue()
+
+    async def send(self, text):
+        """Called by the server to deliver a message to this client."""
+        await self._incoming.put((time.perf_counter(), text))
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        """Yields the messages this client sends to the server, until it stops."""
+        text = await self._outgoing.get()
+        if text is None:
+            raise StopAsyncIteration
+        return text
+
+    async def play(self, table):
+        """Joins the table and plays until it closes."""
+        await self._outgoing.put(json.dumps({'type': 'join', 'table': self.table_id}))
+        game = table.game
+        while True:
+            sent, text = await self._incoming.get()
+            self.messages += 1
+            message = json.loads(text)
+            if message['type'] == 'closed':
+                break
+            if message['type'] == 'joined':
+                self.seat = message['seat']
+            elif message['type'] == 'turn':
+                if self.think_time:
+                    await asyncio.sleep(self.think_time)
+                # the bot strategies look at the game itself, which a real client would rebuild from the events
+                player = game.to_act
+                if player is None or player.get_seat_num() != self.seat:
+                    # the turn timed out while thinking
+                    continue
+                action, amount = self.strategy(game, player, game.legal_actions())
+                self.latencies.append(time.perf_counter() - sent)
+                await self._outgoing.put(json.dumps({'type': 'action', 'action': action,
+                                                     'amount': _to_json(game.to_money(amount))}))
+        await self._outgoing.put(None)
+
+
+async def _load_test(tables, hands, clients, think_time, action_timeout):
+    server = TableServer()
+    simulated = []
+    for _ in range(tables):
+        table = server.add_table(action_timeout=action_timeout,
+                                 bots={seat: s for seat, s in zip(range(clients + 1, 7),
+                                                                  [tight_aggressive, random_action] * 3)})
+        for i in range(clients):
+            client = SimulatedClient(table.table_id, [check_call, random_action][i % 2], think_time)
+            simulated.append((client, table))
+    start = time.perf_counter()
+    handlers = [asyncio.ensure_future(server.handle(client)) for client, _ in simulated]
+    players = [asyncio.ensure_future(client.play(table)) for client, table in simulated]
+    await server.run_tables(hands)
+    await asyncio.gather(*players, *handlers)
+    elapsed = time.perf_counter() - start
+    latencies = sorted(latency for client, _ in simulated for latency in client.latencies)
+    return {
+        'tables': tables,
+        'hands': sum(t.hands_played for t in server.tables.values()),
+        'elapsed': elapsed,
+        'hands_per_second': sum(t.hands_played for t in server.tables.values()) / elapsed,
+        'messages': sum(client.messages for client, _ in simulated),
+        'timeouts': sum(t.timeouts for t in server.tables.values()),
+        'turn_p50': latencies[len(latencies) // 2] if latencies else 0.0,
+        'turn_p99': latencies[int(len(latencies) * 0.99)] if latencies else 0.0,
+    }
+
+
+def load_test(tables=100, hands=20, clients=2, think_time=0.0, action_timeout=ACTION_TIMEOUT):
+    """
+    Runs many six-seat tables in this process with simulated clients, to see how many one process can handle.
+
+    Each table seats the given number of simulated remote clients, which talk to the
+    server through the same messages a WebSocket client would send, and fills its other
+    seats with bots.
+
+    Returns:
+        dict: The number of tables and hands played, the elapsed seconds, hands per second,
+        messages delivered to clients, actions timed out, and the median and 99th percentile
+        time from a turn being sent to the client's reply.
+    """
+    return asyncio.run(_load_test(tables, hands, clients, think_time, action_timeout))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Runs the poker table server, or a local load test of it.')
+    parser.add_argument('command', choices=['serve', 'loadtest'])
+    parser.add_argument('--tables', type=int, default=10, help='the number of tables')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--timeout', type=float, default=ACTION_TIMEOUT, help='seconds a player has to act')
+    parser.add_argument('--hands', type=int, default=20, help='hands per table in the load test')
+    parser.add_argument('--clients', type=int, default=2, help='simulated clients per table in the load test')
+    parser.add_argument('--think', type=float, default=0.0, help='seconds each simulated client takes to act')
+    args = parser.parse_args(args)
+
+    if args.command == 'loadtest':
+        result = load_test(args.tables, args.hands, args.clients, args.think, args.timeout)
+        print('{tables} tables played {hands} hands in {elapsed:.2f}s: {hands_per_second:.0f} hands/s, '
+              '{messages} messages, {timeouts} timeouts, turn replies p50 {turn_p50:.6f}s p99 {turn_p99:.6f}s'
+              .format(**result))
+        return 0
+    server = TableServer()
+    for _ in range(args.tables):
+        # every table has two bots, so that a player who sits down alone has opponents
+        server.add_table(action_timeout=args.timeout, bots={5: tight_aggressive, 6: random_action})
+    print('Serving {0} tables on ws://{1}:{2}'.format(args.tables, args.host, args.port))
+    asyncio.run(server.serve(args.host, args.port))
+    return 0
+
+
+if __name__ == '__main__':
+    # usage: python3 server.py serve [--tables N] [--port P] | python3 server.py loadtest [--tables N] [--hands H]
+    sys.exit(main())
@@ -0,0 +1,279 @@
+"""simulate.py
+
+This file contains a simulator which plays bot strategies against each other over many hands or whole tournaments.
+"""
+
+import time
+from functools import partial
+import numpy as np
+from game import Game
+from frontends import ScriptedFrontend
+from runner import run_parallel
+from history import HandRecorder
+
+
+def check_call(game, player, legal_actions):
+    """A strategy which checks or calls every bet, but never bets or folds."""
+    for action, low, high in legal_actions:
+        if action in ('check', 'call'):
+            return action, low
+
+
+def random_action(game, player, legal_actions):
+    """A strategy which picks one of the legal actions at random, using the game's generator."""
+    action, low, high = legal_actions[game.rng.integers(len(legal_actions))]
+    if action in ('bet', 'raise') and game.rng.random() < 0.25:
+        return action, high
+    return action, low
+
+
+def tight_aggressive(game, player, legal_actions):
+    """
+    A strategy which raises strong hands, calls medium ones and folds the rest.
+
+    Before the flop, hands are judged by their hole cards alone; afterwards, by the
+    category of the best hand they make with the board, which the player's hand state
+    keeps up to date as the board is dealt.
+    """
+    legal = {action: (low, high) for action, low, high in legal_actions}
+    cards = player.get_hole_cards()
+    if not game.board:
+        high, low = sorted(c.rank for c in cards)[::-1]
+        pair = high == low
+        strength = 2 if (pair and high >= 10) or (high == 14 and low >= 12) else \
+            1 if pair or high >= 12 and low >= 10 or cards[0].suit == cards[1].suit and high == 14 else 0
+    else:
+        category = player.hand_state.category()
+        strength = 2 if category >= 4 else 1 if category >= 2 else 0
+    aggressive = 'raise' if 'raise' in legal else 'bet'
+    if strength == 2 and aggressive in legal:
+        low, high = legal[aggressive]
+        return aggressive, min(high, max(low, game.pot))
+    if 'check' in legal:
+        return 'check', None
+    if strength >= 1 and 'call' in legal:
+        return 'call', legal['call'][0]
+    return 'fold', None
+
+
+class SimulationResult:
+    """
+    Represents the outcome of a simulation, for each strategy.
+
+    Winnings are kept in integer chips, so results from different processes can be merged
+    exactly, and are converted to big blinds only when they are reported.
+
+    Attributes:
+        names (list): The name of each strategy, in seat order.
+        big_blind (int): The big blind of the cash games, in chips.
+        hands (int): The number of cash-game hands played.
+        winnings (list): For each strategy, the sum of its winnings per hand, in chips.
+        squares (list): For each strategy, the sum of the squares of its winnings per hand.
+        places (list): For each strategy, how many tournaments it finished in each place.
+        tournaments (int): The number of tournaments played.
+        tournament_hands (int): The number of hands played in those tournaments.
+        elapsed (float): The wall-clock time of the simulation in seconds.
+    """
+    def __init__(self, names, big_blind=1):
+        self.names = list(names)
+        self.big_blind = big_blind
+        self.hands = 0
+        self.winnings = [0] * len(self.names)
+        self.squares = [0] * len(self.names)
+        self.places = [[0] * len(self.names) for _ in self.names]
+        self.tournaments = 0
+        self.tournament_hands = 0
+        self.elapsed = 0.0
+
+    def add_hand(self, results):
+        """Tallies one hand, given each strategy's winnings in chips."""
+        self.hands += 1
+        for i, won in enumerate(results):
+            self.winnings[i] += won
+            self.squares[i] += won * won
+
+    def add_tournament(self, finish):
+        """Tallies one tournament, given the strategy indices from the winner to the first to bust."""
+        self.tournaments += 1
+        for place, i in enumerate(finish):
+            self.places[i][place] += 1
+
+    def merge(self, other):
+        """Adds the tallies of another result for the same strategies into this one, and returns this one."""
+        self.hands += other.hands
+        self.tournaments += other.tournaments
+        self.tournament_hands += other.tournament_hands
+        self.elapsed = max(self.elapsed, other.elapsed)
+        for i in range(len(self.names)):
+            self.winnings[i] += other.winnings[i]
+            self.squares[i] += other.squares[i]
+            self.places[i] = [a + b for a, b in zip(self.places[i], other.places[i])]
+        return self
+
+    def bb_per_100(self):
+        """Returns each strategy's average winnings per 100 hands, in big blinds."""
+        if not self.hands:
+            return [0.0] * len(self.names)
+        return [w * 100 / (self.hands * self.big_blind) for w in self.winnings]
+
+    def confidence_interval(self, z=1.96):
+        """Returns the half-width of each strategy's confidence interval for bb/100 (95% by default)."""
+        if self.hands < 2:
+            return [float('inf')] * len(self.names)
+        widths = []
+        for w, sq in zip(self.winnings, self.squares):
+            mean = w / self.hands
+            variance = max(sq / self.hands - mean * mean, 0.0) * self.hands / (self.hands - 1)
+            widths.append(z * (variance / self.hands) ** 0.5 * 100 / self.big_blind)
+        return widths
+
+    def hands_per_second(self):
+        """Returns the number of hands simulated per second of wall-clock time."""
+        return (self.hands + self.tournament_hands) / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        lines = []
+        if self.hands:
+            for name, rate, width in zip(self.names, self.bb_per_100(), self.confidence_interval()):
+                lines.append('{0}: {1:+.2f} bb/100 (+/- {2:.2f})'.format(name, rate, width))
+        if self.tournaments:
+            for name, places in zip(self.names, self.places):
+                lines.append('{0}: won {1} of {2} tournaments'.format(name, places[0], self.tournaments))
+        lines.append('{0} hands in {1:.2f}s ({2:.0f} hands/s)'.format(
+            self.hands + self.tournament_hands, self.elapsed, self.hands_per_second()))
+        return '\n'.join(lines)
+
+
+class Simulator:
+    """
+    Plays bot strategies against each other.
+
+    Each strategy sits in its own seat, in order, and the button moves every hand. Games
+    are played in integer chips. In cash games, every hand starts from the same stacks
+    and each strategy's winnings are measured in big blinds. In tournaments, stacks carry
+    over between hands, the blinds go up on a schedule, and players are knocked out when
+    they run out of chips.
+
+    Attributes:
+        strategies (list): Callables called as strategy(game, player, legal_actions).
+        names (list): A name for each strategy.
+        small_blind (int): The small blind in chips, or the first level's small blind in tournaments.
+        big_blind (int): The big blind in chips, or the first level's big blind in tournaments.
+        starting_stack (int): The stack every player starts with, in chips.
+        blind_levels (list): (small_blind, big_blind) pairs for each tournament level after the first.
+        hands_per_level (int): The number of tournament hands between blind increases.
+    """
+    def __init__(self, strategies, small_blind=1, big_blind=2, starting_stack=None,
+                 names=None, blind_levels=None, hands_per_level=10):
+        if not(2 <= len(strategies) <= 10):
+            raise ValueError('between 2 and 10 strategies are needed')
+        self.strategies = list(strategies)
+        self.names = list(names) if names else [getattr(s, '__name__', str(s)) for s in strategies]
+        self.small_blind = int(small_blind)
+        self.big_blind = int(big_blind)
+        self.starting_stack = int(starting_stack) if starting_stack else 100 * self.big_blind
+        if blind_levels is None:
+            blind_levels = [(self.small_blind * 2 ** i, self.big_blind * 2 ** i) for i in range(1, 20)]
+        self.blind_levels = blind_levels
+        self.hands_per_level = hands_per_level
+
+    def _new_game(self, rng):
+        names = ['{0} ({1})'.format(name, i + 1) for i, name in enumerate(self.names)]
+        return Game(len(self.strategies), self.small_blind, self.big_blind,
+                    frontend=ScriptedFrontend(self.strategies), rng=rng, names=names, button=1)
+
+    def play_hands(self, count, rng=None, history=None):
+        """
+        Plays count cash-game hands in this process and returns a SimulationResult.
+
+        If history is a path, every hand is also recorded to that hand-history file.
+        """
+        start = time.perf_counter()
+        result = SimulationResult(self.names, self.big_blind)
+        game = self._new_game(rng)
+        recorder = HandRecorder(history, game) if history else None
+        players = game.get_players()
+        for _ in range(count):
+            for p in players:
+                p.set_stack(self.starting_stack)
+            game.play_hand()
+            result.add_hand([p.get_stack() - self.starting_stack for p in players])
+            game.move_button()
+        if recorder:
+            recorder.close()
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def play_tournaments(self, count, rng=None, history=None):
+        """
+        Plays count tournaments in this process and returns a SimulationResult.
+
+        If history is a path, every hand is also recorded to that hand-history file.
+        """
+        start = time.perf_counter()
+        result = SimulationResult(self.names, self.big_blind)
+        game = self._new_game(rng)
+        recorder = HandRecorder(history, game) if history else None
+        players = game.get_players()
+        for _ in range(count):
+            game.set_blinds(self.small_blind, self.big_blind)
+            for p in players:
+                p.set_stack(self.starting_stack)
+                p.come_back()
+            busted = []
+            hands = 0
+            while len(busted) < len(players) - 1:
+                level = hands // self.hands_per_level
+                if level:
+                    game.set_blinds(*self.blind_levels[min(level, len(self.blind_levels)) - 1])
+                before = {p: p.get_stack() for p in players}
+                game.play_hand()
+                hands += 1
+                result.tournament_hands += 1
+                # players knocked out in the same hand are ranked by the stacks they started it with
+                out = [p for p in players if not p.sitting_out and p.get_stack() == 0]
+                for p in sorted(out, key=lambda p: before[p]):
+                    p.sit_out()
+                    busted.append(p)
+                game.move_button()
+            winner = [p for p in players if not p.sitting_out]
+            finish = winner + busted[::-1]
+            result.add_tournament([p.get_seat_num() - 1 for p in finish])
+        if recorder:
+            recorder.close()
+        result.elapsed = time.perf_counter() - start
+        return result
+
+    def run(self, hands=0, tournaments=0, seed=None, workers=None):
+        """
+        Plays hands and tournaments across a pool of processes.
+
+        Parameters:
+            hands (int): The number of cash-game hands to play.
+            tournaments (int): The number of tournaments to play.
+            seed: The root seed; the same seed and number of workers give identical results.
+            workers (int): The number of processes, defaulting to the number of cores.
+
+        Returns:
+            SimulationResult: The merged results, with elapsed set to the wall-clock time.
+        """
+        start = time.perf_counter()
+        result = SimulationResult(self.names, self.big_blind)
+        # the hands and the tournaments each get their own streams, independent of each other
+        root = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        hands_seed, tournaments_seed = root.spawn(2)
+        if hands:
+            result.merge(run_parallel(partial(_play_hands, self), hands, seed=hands_seed, workers=workers))
+        if tournaments:
+            result.merge(run_parallel(partial(_play_tournaments, self), tournaments, seed=tournaments_seed,
+                                      workers=workers))
+        result.elapsed = time.perf_counter() - start
+        return result
+
+
+def _play_hands(simulator, count, rng):
+    return simulator.play_hands(count, rng)
+
+
+def _play_tournaments(simulator, count, rng):
+    return simulator.play_tournaments(count, rng)
@@ -1,11 +1,40 @@
 """tests.py
 
 This file contains unit tests responsible for testing the functionality of the functions
-in hands.py, determine_hand.py, and game.py.
+in hands.py, determine_hand.py, evaluator.py, equity.py, ranges.py, board.py, preflop.py, runner.py, pot.py, game.py, history.py, analytics.py, replay.py, simulate.py, benchmark.py, instrument.py, and server.py.
 """
 import unittest
+import pickle
+from itertools import combinations
+from numpy import random
 from hands import *
-from determine_hand import get_hand, best_hand
+import hands
+from evaluator import evaluate, HandState
+import equity as equity_module
+from equity import monte_carlo_equity, exact_equity, equity
+from ranges import Range, AliasTable
+from runner import run_parallel, split_work, spawn_generators
+import preflop
+from board import Board, board_cache_info
+import os
+import tempfile
+from game import Deck, Game
+from pot import Pot
+from history import HandRecorder, HistoryReader
+import io
+from analytics import Stats, analyse, stream_stats
+from replay import Replayer
+import benchmark
+import json
+import determine_hand
+from instrument import Instrumentation, Histogram
+import asyncio
+import server
+from frontends import ScriptedFrontend, WebFrontend
+from simulate import Simulator, check_call, random_action, tight_aggressive
+from decimal import Decimal
+from determine_hand import identify_hand as get_hand, best_hand, evaluate_batch, DetermineHand, HandCache, hand_cache, \
+    hand_from_strength
 
 
 class ComparisonTests(unittest.TestCase):
@@ -120,6 +149,51 @@ class ComparisonTests(unittest.TestCase):
         self.assertFalse(lower == higher)
         self.assertFalse(higher == lower)
 
+    def test_strength_key(self):
+        hands = [
+            TwoPair(1, 9, 13),
+            Straight(5),
+            OnePair(1, [Card(5, Suit.CLUBS), Card(7, Suit.CLUBS), Card(10, Suit.CLUBS)]),
+            FullHouse(2, 3),
+            TwoPair(9, 1, 13),
+            Straight(1)
+        ]
+        ordered = sorted(hands)
+        self.assertEqual([h.strength for h in ordered], sorted(h.strength for h in hands))
+        self.assertIsInstance(ordered[0], OnePair)
+        self.assertIsInstance(ordered[-1], FullHouse)
+        self.assertEqual(5, len(set(hands)))
+        self.assertTrue(hands[0] == hands[4])
+        self.assertEqual(hash(hands[0]), hash(hands[4]))
+        self.assertTrue(TwoPair(1, 9, 13) <= TwoPair(1, 9, 13))
+        self.assertTrue(Straight(6) >= Straight(5))
+
+
+class CardTests(unittest.TestCase):
+    """This class contains tests for the integer encoding of cards in hands.py."""
+
+    def test_interned(self):
+        self.assertIs(Card(1, Suit.HEARTS), Card(1, Suit.HEARTS))
+        self.assertIs(Card(12, Suit.CLUBS), pickle.loads(pickle.dumps(Card(12, Suit.CLUBS))))
+        self.assertFalse(hasattr(Card(2, Suit.SPADES), '__dict__'))
+
+    def test_int_round_trip(self):
+        codes = set()
+        for s in Suit:
+            for n in range(1, 14):
+                card = Card(n, s)
+                self.assertIs(card, Card.from_int(card.to_int()))
+                codes.add(card.to_int())
+        self.assertEqual(set(range(52)), codes)
+        self.assertEqual(51, Card(1, Suit.SPADES).to_int())
+        self.assertEqual(0, Card(2, Suit.HEARTS).to_int())
+
+    def test_sort(self):
+        cards = [Card(5, Suit.CLUBS), Card(1, Suit.HEARTS), Card(13, Suit.SPADES), Card(2, Suit.DIAMONDS)]
+        cards.sort(key=card_rank, reverse=True)
+        self.assertEqual([1, 13, 5, 2], [c.get_num() for c in cards])
+        self.assertTrue(Card(13, Suit.HEARTS) < Card(1, Suit.CLUBS))
+
 
 class DetermineHandTests(unittest.TestCase):
     """This class contains tests for determine_hand.py."""
@@ -409,6 +483,1059 @@ class DetermineHandTests(unittest.TestCase):
         self.assertTrue(hand, isinstance(hand, StraightFlush))
         self.assertEqual(1, hand.high_num)
 
+    def test_hand_cache(self):
+        rng = random.default_rng(24)
+        cache = HandCache(maxsize=100)
+        for _ in range(500):
+            cards = [Card.from_int(int(code)) for code in rng.permutation(52)[:5]]
+            expected = DetermineHand(list(cards)).identify()
+            hand = cache.get(cards)
+            self.assertIs(type(expected), type(hand))
+            self.assertEqual(expected.strength, hand.strength)
+            self.assertEqual(str(expected), str(hand))
+            for attribute in ('cards', 'kickers'):
+                if hasattr(expected, attribute):
+                    self.assertEqual(repr(getattr(expected, attribute)), repr(getattr(hand, attribute)))
+        info = cache.info()
+        self.assertEqual(500, info.hits + info.misses)
+        self.assertEqual(100, info.currsize)
+        cache.resize(10)
+        self.assertEqual(10, len(cache))
+
+        # the same ranks share one cached strength unless only one of them is a flush, but
+        # every hand is built from its own cards
+        get_hand(parse_cards('AhKdQc9s2h'))
+        hits = hand_cache.info().hits
+        second = get_hand(parse_cards('AsKcQd9h2s'))
+        self.assertEqual(hits + 1, hand_cache.info().hits)
+        self.assertEqual('[As, Kc, Qd, 9h, 2s]', repr(second.cards))
+        self.assertIsInstance(second.cards, list)
+        flush = get_hand(parse_cards('AhKhQh9h2h'))
+        self.assertIsInstance(flush, Flush)
+        clubs = get_hand(parse_cards('AcKcQc9c2c'))
+        self.assertEqual(flush, clubs)
+        self.assertEqual('[Ac, Kc, Qc, 9c, 2c]', repr(clubs.cards))
+        pair = get_hand(parse_cards('7d7cKsQh2d'))
+        self.assertEqual('[Ks, Qh, 2d]', repr(pair.kickers))
+        self.assertEqual('[Kd, Qc, 2s]', repr(get_hand(parse_cards('7h7sKdQc2s')).kickers))
+        with self.assertRaises(ValueError):
+            get_hand(parse_cards('AhAhQh9h2h'))
+        with self.assertRaises(TypeError):
+            get_hand(tuple(parse_cards('AhKhQh9h2h')))
+
+
+class EvaluatorTests(unittest.TestCase):
+    """This class contains tests for evaluator.py."""
+
+    def test_matches_combinations(self):
+        deck = [Card(n, s) for s in Suit for n in range(1, 14)]
+        rng = random.default_rng(0)
+        for _ in range(300):
+            cards = [deck[i] for i in rng.choice(52, size=7, replace=False)]
+            expected = max([get_hand(list(c)) for c in combinations(cards, 5)])
+            hand = best_hand(cards)
+            self.assertEqual(type(expected), type(hand.hand))
+            self.assertTrue(expected == hand)
+            self.assertTrue(hand == expected)
+            self.assertEqual(evaluate(cards), hand.strength)
+
+    def test_strength_order(self):
+        wheel = [
+            Card(1, Suit.CLUBS),
+            Card(2, Suit.HEARTS),
+            Card(3, Suit.DIAMONDS),
+            Card(4, Suit.SPADES),
+            Card(5, Suit.SPADES)
+        ]
+        six_high = wheel[1:] + [Card(6, Suit.CLUBS)]
+        trips = [
+            Card(1, Suit.CLUBS),
+            Card(1, Suit.HEARTS),
+            Card(1, Suit.DIAMONDS),
+            Card(13, Suit.SPADES),
+            Card(12, Suit.SPADES)
+        ]
+        self.assertLess(evaluate(trips), evaluate(wheel))
+        self.assertLess(evaluate(wheel), evaluate(six_high))
+        self.assertEqual(5, best_hand(wheel).high_num)
+
+    def test_hand_value(self):
+        cards = parse_cards('AhAdKcKs7h7d2c')
+        value = best_hand(cards)
+        self.assertIsNone(value._hand)
+        self.assertEqual(TwoPair.value, value.value)
+        self.assertLess(best_hand(parse_cards('AhAdKcQs7h5d2c')), value)
+        self.assertEqual(hash(get_hand(parse_cards('AhAdKcKs7h'))), hash(value))
+        self.assertEqual(len({value, best_hand(parse_cards('AsAcKhKd7c3d2h'))}), 1)
+        # the Hand is built only when something other than the strength is needed
+        cards.clear()
+        self.assertEqual('Two pair, aces and kings', str(value))
+        self.assertIsInstance(value.hand, TwoPair)
+        self.assertEqual(7, value.kicker)
+        self.assertEqual(value.strength, pickle.loads(pickle.dumps(value)).strength)
+        with self.assertRaises(AttributeError):
+            value.no_such_attribute
+
+    def test_trusted_constructors(self):
+        previous = hands.validation_enabled()
+        rng = random.default_rng(25)
+        try:
+            for _ in range(300):
+                cards = [Card.from_int(int(code)) for code in rng.permutation(52)[:7]]
+                strength = evaluate(cards)
+                hands.set_validation(False)
+                fast = hand_from_strength(strength, cards)
+                hands.set_validation(True)
+                checked = hand_from_strength(strength, cards)
+                self.assertIs(type(checked), type(fast))
+                self.assertEqual(checked.strength, fast.strength)
+                self.assertEqual(str(checked), str(fast))
+            with self.assertRaises(ValueError):
+                OnePair.trusted(1, [])
+            with self.assertRaises(ValueError):
+                Straight.trusted(9, strength=Straight(10).strength)
+            # trusted() skips the checks unless validation is turned on
+            hands.set_validation(False)
+            self.assertFalse(hands.validation_enabled())
+            self.assertEqual(0, OnePair.trusted(1, [], strength=0).strength)
+            self.assertEqual(TwoPair(13, 1, 5).strength, TwoPair.trusted(1, 13, 5).strength)
+        finally:
+            hands.set_validation(previous)
+
+    def test_flush_from_seven(self):
+        cards_available = [
+            Card(2, Suit.HEARTS),
+            Card(9, Suit.HEARTS),
+            Card(13, Suit.HEARTS),
+            Card(13, Suit.SPADES),
+            Card(13, Suit.DIAMONDS),
+            Card(6, Suit.HEARTS),
+            Card(4, Suit.HEARTS)
+        ]
+        hand = best_hand(cards_available)
+        self.assertTrue(isinstance(hand.hand, Flush))
+        self.assertEqual([13, 9, 6, 4, 2], [c.get_num() for c in hand.cards])
+        for c in hand.cards:
+            self.assertEqual(Suit.HEARTS, c.get_suit())
+
+    def test_batch_matches_best_hand(self):
+        rng = random.default_rng(1)
+        for num_cards in (5, 6, 7):
+            cards = rng.random((500, 52)).argsort(axis=1)[:, :num_cards]
+            strengths = evaluate_batch(cards)
+            for row, strength in zip(cards, strengths):
+                hand = best_hand([Card.from_int(int(code)) for code in row])
+                self.assertEqual(hand.strength, strength)
+
+    def test_batch_invalid(self):
+        with self.assertRaises(ValueError):
+            evaluate_batch([[0, 0, 1, 2, 3, 4, 5]])
+        with self.assertRaises(ValueError):
+            evaluate_batch([[0, 1, 2, 3]])
+        with self.assertRaises(ValueError):
+            evaluate_batch([[0, 1, 2, 3, 52]])
+
+
+    def test_hand_state(self):
+        rng = random.default_rng(13)
+        for _ in range(200):
+            cards = [Card.from_int(int(c)) for c in rng.choice(52, 7, replace=False)]
+            state = HandState(cards[:2])
+            for i in range(2, 7):
+                state.add(cards[i])
+                if i >= 4:
+                    self.assertEqual(evaluate(cards[:i + 1]), state.strength())
+        self.assertEqual(2, HandState(parse_cards('AhAd')).category())
+        self.assertEqual(['flush draw'], HandState(parse_cards('AhKh7h2hJd')).draws())
+        self.assertEqual(['open-ended straight draw'], HandState(parse_cards('9h8c7d6s2c')).draws())
+        self.assertEqual(['gutshot'], HandState(parse_cards('9h8c7dJs2c')).draws())
+        self.assertEqual([], HandState(parse_cards('9h8c7dJs2cAhAd')).draws())
+
+class EquityTests(unittest.TestCase):
+    """This class contains tests for equity.py."""
+
+    def test_ranges_that_cannot_be_dealt(self):
+        impossible = (['AhKh', 'AhQd'], ['AhKh', ['QdQc', 'AhQs'], 'QdQc'])
+        for ranges in impossible:
+            with self.assertRaises(ValueError):
+                exact_equity(ranges)
+            with self.assertRaises(ValueError):
+                monte_carlo_equity(ranges, time_limit=0.05)
+        # one hand in each range which can be dealt is enough
+        result = exact_equity(['AhKh', ['AhQd', 'QsQd']], board='2c3d4h5s')
+        self.assertEqual(44, result.trials)
+
+    def test_monte_carlo(self):
+        result = monte_carlo_equity(['AhAd', 'KsKc'], iterations=20000, seed=0)
+        equity = result.equity()
+        self.assertEqual(20000, result.trials)
+        self.assertAlmostEqual(1.0, sum(equity))
+        self.assertLess(abs(equity[0] - 0.82), 4 * result.stderr()[0])
+
+    def test_seed_is_reproducible(self):
+        first = monte_carlo_equity(['AhKh', ['QsQd', 'JsJd']], board='Qh7h2c', iterations=5000, seed=7)
+        second = monte_carlo_equity(['AhKh', ['QsQd', 'JsJd']], board='Qh7h2c', iterations=5000, seed=7)
+        self.assertEqual(first.share_units, second.share_units)
+
+    def test_board_plays(self):
+        result = monte_carlo_equity(['AhKh', '2c2d'], board='3c4d5s6h7h', iterations=100)
+        self.assertEqual([0, 0], result.wins)
+        self.assertEqual([100, 100], result.ties)
+        self.assertEqual([0.5, 0.5], result.equity())
+
+    def test_exact_turn(self):
+        result = exact_equity(['AhKh', 'QsQd'], board='Qh7h2c3s')
+        self.assertTrue(result.exact)
+        self.assertEqual(44, result.trials)
+        # nine hearts remain, but the 2h and 3h pair the board and give QsQd a full house
+        self.assertEqual([7, 37], result.wins)
+        self.assertEqual([0.0, 0.0], result.stderr())
+
+    def test_suit_isomorphism(self):
+        reduced = exact_equity(['AhAd', 'KhKd'], board='2c')
+        self.assertEqual(178365, reduced.trials)
+        original = equity_module._suit_symmetries
+        equity_module._suit_symmetries = lambda groups: [(0, 1, 2, 3)]
+        try:
+            full = exact_equity(['AhAd', 'KhKd'], board='2c')
+        finally:
+            equity_module._suit_symmetries = original
+        self.assertEqual(full.wins, reduced.wins)
+        self.assertEqual(full.ties, reduced.ties)
+        self.assertEqual(full.share_units, reduced.share_units)
+
+    def test_equity_chooses_calculator(self):
+        self.assertTrue(equity(['AhKh', 'QsQd'], board='Qh7h2c').exact)
+        self.assertFalse(equity(['AhKh', ['QsQd', 'JsJd'], 'Tc9c'], iterations=1000).exact)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            monte_carlo_equity(['AhKh'])
+        with self.assertRaises(ValueError):
+            monte_carlo_equity(['AhKh', 'QsQd'], board='Ah7h2c')
+        with self.assertRaises(ValueError):
+            monte_carlo_equity(['AhKh', 'QsQd'], board='Qh7h2c', dead='Qh')
+
+
+class RangeTests(unittest.TestCase):
+    """This class contains tests for ranges.py."""
+
+    def test_parse(self):
+        self.assertEqual(18, len(Range.from_str('QQ+')))
+        self.assertEqual(4, len(Range.from_str('AKs')))
+        self.assertEqual(12, len(Range.from_str('AKo')))
+        self.assertEqual(16, len(Range.from_str('A5s-A2s')))
+        self.assertEqual(16, len(Range.from_str('ATs+')))
+        self.assertEqual(18, len(Range.from_str('44-22')))
+        self.assertEqual(1326, len(Range.from_str('random')))
+        r = Range.from_str('QQ+, AKs, A5s-A2s, 76s:0.5')
+        self.assertEqual(42, len(r))
+        self.assertEqual(40, r.size())
+        self.assertIn('AhKh', r)
+        self.assertNotIn('AhKd', r)
+        for text in ['AKx', 'QQs', 'A5s-K2s', 'AA:2', 'AhKhQd', 'AhAh', 'AhKhQdJc']:
+            with self.assertRaises(ValueError):
+                Range.from_str(text)
+
+    def test_dead_cards_and_set_operations(self):
+        aces = Range.from_str('AA')
+        self.assertEqual(3, len(aces.without([Card.from_str('Ah').to_int()])))
+        both = aces | Range.from_str('KK')
+        self.assertEqual(12, len(both))
+        self.assertEqual(aces, both & aces)
+        self.assertEqual(Range.from_str('KK'), both - aces)
+
+    def test_alias_sampling(self):
+        table = AliasTable([1, 0, 3])
+        counts = [0, 0, 0]
+        for i in table.sample(random.default_rng(2), 40000):
+            counts[i] += 1
+        self.assertEqual(0, counts[1])
+        self.assertAlmostEqual(0.75, counts[2] / 40000, delta=0.01)
+
+    def test_equity_accepts_ranges(self):
+        # one ace is on the board, so three combos of aces face six combos of kings
+        result = exact_equity(['AA', 'KK'], board='Ah7c2d')
+        self.assertEqual(18 * 990, result.trials)
+        self.assertGreater(result.equity()[0], 0.9)
+        result = monte_carlo_equity([Range.from_str('QQ+, AKs'), '76s:0.5'], iterations=5000, seed=1)
+        self.assertGreater(result.equity()[0], 0.6)
+
+
+class BoardTests(unittest.TestCase):
+    """This class contains tests for board.py."""
+
+    def test_scores_match_evaluator(self):
+        rng = random.default_rng(12)
+        for size in (3, 4, 5):
+            codes = [int(c) for c in rng.choice(52, size, replace=False)]
+            board = Board(codes)
+            self.assertEqual(1326, len(board.scores()))
+            for _ in range(100):
+                hole = [Card.from_int(int(c)) for c in rng.choice(52, 2, replace=False)]
+                if hole[0].code in codes or hole[1].code in codes:
+                    continue
+                self.assertEqual(best_hand(hole + board.cards).strength, board.strength(hole))
+
+    def test_isomorphic_boards_share_cache(self):
+        first = Board('Ah7h2c')
+        first.scores()
+        hits = board_cache_info().hits
+        second = Board('2d7sAs')
+        self.assertEqual(first.strength('KhQh'), second.strength('KsQs'))
+        self.assertEqual(hits + 1, board_cache_info().hits)
+
+    def test_texture(self):
+        self.assertEqual('unpaired monotone disconnected', Board('AhKh7h').texture())
+        self.assertEqual('paired rainbow disconnected', Board('7c7d2s').texture())
+        self.assertEqual('unpaired two-tone connected', Board('Ts9s8d2c').texture())
+        self.assertTrue(Board('Ts9s8d2c').flush_draw_possible())
+        self.assertFalse(Board('Ts9s8d2c').flush_possible())
+        self.assertEqual(1.0, Board('AhKh7h').percentile('QhJh'))
+        with self.assertRaises(ValueError):
+            Board('AhKh')
+
+
+class PreflopTableTests(unittest.TestCase):
+    """This class contains tests for the preflop equity table in preflop.py."""
+
+    def test_hand_classes(self):
+        self.assertEqual(169, len(set(preflop.HAND_CLASSES)))
+        self.assertEqual('AKs', preflop.HAND_CLASSES[preflop.class_index('AhKh')])
+        self.assertEqual('AKo', preflop.HAND_CLASSES[preflop.class_index('KdAh')])
+        self.assertEqual('QQ', preflop.HAND_CLASSES[preflop.class_index('QQ')])
+        self.assertEqual(preflop.class_index('T9s'), preflop.as_class('T9s'))
+        self.assertIsNone(preflop.as_class('AhKh'))
+        self.assertIsNone(preflop.as_class('QQ+'))
+        for index in range(169):
+            self.assertIn(len(preflop.class_range(index)), (4, 6, 12))
+
+    def test_write_and_load(self):
+        aces, kings = preflop.class_index('AA'), preflop.class_index('KK')
+        trials, wins, ties = preflop._store_tallies(
+            [preflop._build_chunk([(aces, kings), (aces, aces)], 4000, random.default_rng(3))])
+        path = os.path.join(tempfile.mkdtemp(), 'table.bin')
+        preflop.write_table(trials, wins, ties, 4000, path)
+        table = preflop.PreflopTable(path)
+        self.assertEqual(4000, table.iterations)
+        result = table.lookup('AA', 'KK')
+        self.assertAlmostEqual(0.82, result.equity()[0], delta=0.03)
+        self.assertAlmostEqual(1.0, sum(result.equity()))
+        self.assertAlmostEqual(result.equity()[1], table.equity('KhKs', 'AcAd'))
+        # a same-class matchup is exactly even, however the runouts fell
+        self.assertEqual(0.5, table.equity('AA', 'AA'))
+
+    @unittest.skipIf(preflop.get_table() is None, 'the preflop table has not been built')
+    def test_table_is_symmetric(self):
+        table = preflop.get_table()
+        for i in range(169):
+            for j in range(i, 169):
+                self.assertAlmostEqual(1.0, table.equity(i, j) + table.equity(j, i), msg=(i, j))
+
+    @unittest.skipIf(preflop.get_table() is None, 'the preflop table has not been built')
+    def test_equity_uses_table(self):
+        result = equity(['AA', 'KK'])
+        self.assertFalse(result.exact)
+        self.assertEqual(['AA', 'KK'], result.players)
+        self.assertAlmostEqual(0.82, result.equity()[0], delta=0.01)
+
+
+class DeckTests(unittest.TestCase):
+    """This class contains tests for the Deck in game.py."""
+
+    def test_deals_every_card_once(self):
+        deck = Deck(random.default_rng(5))
+        deck.shuffle(3)
+        dealt = [deck.get_top_card().to_int() for _ in range(52)]
+        self.assertEqual(list(range(52)), sorted(dealt))
+        with self.assertRaises(IndexError):
+            deck.get_top_card()
+
+    def test_remove(self):
+        deck = Deck(random.default_rng(6))
+        known = parse_cards('AhKh Qh7h2c')
+        deck.remove(known)
+        deck.shuffle(5)
+        self.assertEqual(47, len(deck))
+        dealt = [deck.get_top_card().to_int() for _ in range(47)]
+        self.assertFalse(set(c.to_int() for c in known) & set(dealt))
+        deck.reset()
+        self.assertEqual(52, len(deck))
+        deck.burn_card()
+        with self.assertRaises(ValueError):
+            deck.remove([Card.from_int(deck.order[0])])
+
+
+def check_or_call(game, player, legal_actions):
+    """A strategy for scripted tests which never bets or folds."""
+    for action, low, high in legal_actions:
+        if action in ('check', 'call'):
+            return action, low
+
+
+def random_strategy(rng):
+    """Returns a strategy for scripted tests which picks a legal action at random."""
+    def strategy(game, player, legal_actions):
+        action, low, high = legal_actions[rng.integers(len(legal_actions))]
+        if action in ('bet', 'raise') and rng.random() < 0.3:
+            return action, high
+        return action, low
+    return strategy
+
+
+class PotTests(unittest.TestCase):
+    """This class contains tests for the Pot in pot.py."""
+
+    def make_pot(self, contributions):
+        pot = Pot()
+        for player, chips in contributions.items():
+            pot.add(player, chips)
+        return pot
+
+    def test_side_pots(self):
+        pot = self.make_pot({'a': 50, 'b': 100, 'c': 200, 'd': 80})
+        # d folded, and nobody could match the last 100 of c's bet
+        self.assertEqual([(200, ['a', 'b', 'c']), (130, ['b', 'c']), (100, ['c'])], pot.side_pots(['a', 'b', 'c']))
+        self.assertEqual(430, pot.total)
+
+    def test_award_in_one_pass(self):
+        pot = self.make_pot({'a': 50, 'b': 100, 'c': 200})
+        strength = {'a': 3, 'b': 2, 'c': 1}.get
+        awards = pot.award(['a', 'b', 'c'], strength, ['a', 'b', 'c'])
+        self.assertEqual([('a', 150, 0, False), ('b', 100, 1, False), ('c', 100, 2, False)], awards)
+
+    def test_split_with_odd_chips(self):
+        pot = self.make_pot({'a': 34, 'b': 34, 'c': 33})
+        strength = {'a': 5, 'b': 5, 'c': 5}.get
+        # c is all in for less, so a and b split the chip c could not match
+        awards = pot.award(['a', 'b', 'c'], strength, ['b', 'c', 'a'])
+        self.assertEqual([('b', 33, 0, True), ('c', 33, 0, True), ('a', 33, 0, True),
+                          ('b', 1, 1, True), ('a', 1, 1, True)], awards)
+        pot = self.make_pot({'a': Decimal('0.51'), 'b': Decimal('0.51'), 'c': Decimal('0.51')})
+        awards = pot.award(['a', 'b', 'c'], {'a': 5, 'b': 5, 'c': 1}.get, ['b', 'a', 'c'], Decimal('0.01'))
+        self.assertEqual([('b', Decimal('0.77'), 0, True), ('a', Decimal('0.76'), 0, True)], awards)
+
+
+class GameTests(unittest.TestCase):
+    """This class contains tests for the headless Game in game.py."""
+
+    def make_game(self, strategies, stack=200):
+        game = Game(len(strategies), Decimal(1), Decimal(2), frontend=ScriptedFrontend(strategies),
+                    rng=random.default_rng(8), button=1)
+        for p in game.get_players():
+            p.set_stack(Decimal(stack))
+        return game
+
+    def test_legal_actions(self):
+        game = self.make_game([check_or_call] * 3)
+        game.start_hand()
+        # seat 1 has the button, so seat 2 posts the small blind and seat 3 the big blind
+        self.assertIs(game.get_player_at_seat(1), game.to_act)
+        self.assertEqual([('fold', None, None), ('call', 2, 2), ('raise', 4, 200)], game.legal_actions())
+        with self.assertRaises(ValueError):
+            game.apply_action(game.get_player_at_seat(2), 'call')
+        with self.assertRaises(ValueError):
+            game.apply_action(game.to_act, 'check')
+        with self.assertRaises(ValueError):
+            game.apply_action(game.to_act, 'raise', Decimal(3))
+        game.apply_action(game.to_act, 'raise', Decimal(6))
+        game.apply_action(game.to_act, 'fold')
+        game.apply_action(game.to_act, 'fold')
+        self.assertTrue(game.hand_over)
+        self.assertEqual(Decimal(203), game.get_player_at_seat(1).get_stack())
+
+    def test_check_down(self):
+        game = self.make_game([check_or_call] * 2)
+        game.play_hand()
+        self.assertTrue(game.hand_over)
+        self.assertEqual(5, len(game.board))
+        self.assertEqual(Decimal(400), sum(p.get_stack() for p in game.get_players()))
+
+    def test_chips_are_conserved(self):
+        rng = random.default_rng(9)
+        game = self.make_game([random_strategy(rng)] * 6)
+        for _ in range(300):
+            if sum(p.get_stack() > 0 for p in game.get_players()) < 2:
+                break
+            game.play_hand()
+            self.assertEqual(Decimal(1200), sum(p.get_stack() for p in game.get_players()))
+            game.move_button()
+
+    def test_all_in(self):
+        def shove(game, player, legal_actions):
+            action, low, high = legal_actions[-1]
+            return action, high
+        game = self.make_game([shove, shove])
+        events = []
+        game.listeners.append(lambda game, event, data: event == 'all_in' and events.append(game.equities()))
+        game.play_hand()
+        shares = events
+        self.assertEqual(1, len(shares))
+        self.assertAlmostEqual(1.0, sum(shares[0]))
+        self.assertEqual(5, len(game.board))
+
+    def test_short_all_in_raise_does_not_reopen_betting(self):
+        def start():
+            game = Game(3, 1, 2, rng=random.default_rng(9), names=['A', 'B', 'C'], button=1)
+            for p, stack in zip(game.get_players(), (200, 14, 200)):
+                p.set_stack(stack)
+            game.start_hand()
+            first, short, big = game.get_players()
+            self.assertIs(big, game.big_blind_player)
+            self.assertTrue(game.is_big_blind(big))
+            game.apply_action(first, 'raise', 10)
+            # all in for 14 is a raise of 4, less than the full raise of 8
+            game.apply_action(short, 'raise', 14)
+            return game, first, big
+
+        game, first, big = start()
+        # the big blind has not acted yet, so may still raise
+        self.assertIn('raise', [a for a, _, _ in game.legal_actions()])
+        game.apply_action(big, 'call')
+        self.assertIs(first, game.to_act)
+        self.assertEqual(['fold', 'call'], [a for a, _, _ in game.legal_actions()])
+        with self.assertRaises(ValueError):
+            game.apply_action(first, 'raise', 40)
+
+        # a full raise after the short one reopens the betting
+        game, first, big = start()
+        game.apply_action(big, 'raise', 30)
+        self.assertIs(first, game.to_act)
+        self.assertIn('raise', [a for a, _, _ in game.legal_actions()])
+
+    def test_equities_use_the_actual_hole_cards(self):
+        game = self.make_game([check_or_call] * 2)
+        game.start_hand()
+        # the same hand classes, AKs against QQ, with and without a queen of hearts blocking the flush
+        for cards in (['Ah', 'Kh', 'Qh', 'Qd'], ['Ah', 'Kh', 'Qs', 'Qc']):
+            for p, hole in zip(game.players_in_hand, (cards[:2], cards[2:])):
+                p.clear_hand()
+                for code in hole:
+                    p.add_card(Card.from_str(code))
+            expected = exact_equity([''.join(cards[:2]), ''.join(cards[2:])]).equity()
+            for share, exact in zip(game.equities(), expected):
+                self.assertAlmostEqual(exact, share)
+
+    def test_hand_states_follow_the_board(self):
+        game = self.make_game([check_or_call] * 3)
+        game.start_hand()
+        while game.street == 'preflop':
+            game.apply_action(game.to_act, *check_or_call(game, game.to_act, game.legal_actions()))
+        for p in game.players_in_hand:
+            self.assertEqual(best_hand(p.get_hole_cards() + game.board).strength, p.get_strength())
+            self.assertEqual(best_hand(p.get_hole_cards() + game.board), p.get_made_hand())
+            self.assertIsInstance(p.get_draws(), list)
+        game.play_hand()
+        for p in game.players_in_hand:
+            self.assertEqual(best_hand(p.get_hole_cards() + game.board).strength, p.get_hand().strength)
+
+    def test_side_pots_conserve_chips(self):
+        rng = random.default_rng(14)
+        game = self.make_game([random_strategy(rng)] * 6)
+        for i, p in enumerate(game.get_players()):
+            p.set_stack(Decimal(20 * (i + 1)))
+        for _ in range(200):
+            if sum(p.get_stack() > 0 for p in game.get_players()) < 2:
+                break
+            game.play_hand()
+            self.assertEqual(Decimal(420), sum(p.get_stack() for p in game.get_players()))
+            game.move_button()
+
+    def test_integer_chips(self):
+        rng = random.default_rng(15)
+        frontend = ScriptedFrontend([random_strategy(rng)] * 4)
+        game = Game(4, 25, 50, frontend=frontend, rng=random.default_rng(2), button=1, denomination=Decimal('0.01'))
+        for p in game.get_players():
+            p.set_stack(5000)
+        for _ in range(50):
+            if sum(p.get_stack() > 0 for p in game.get_players()) < 2:
+                break
+            game.play_hand()
+            self.assertTrue(all(type(p.get_stack()) is int for p in game.get_players()))
+            self.assertEqual(20000, sum(p.get_stack() for p in game.get_players()))
+            game.move_button()
+        self.assertEqual(Decimal('12.34'), game.to_money(1234))
+        self.assertEqual(1234, game.to_chips(Decimal('12.34')))
+        with self.assertRaises(ValueError):
+            game.to_chips(Decimal('0.005'))
+
+    def test_web_frontend(self):
+        frontend = WebFrontend()
+        game = Game(2, Decimal(1), Decimal(2), frontend=frontend, rng=random.default_rng(1), button=1)
+        for p in game.get_players():
+            p.set_stack(Decimal(100))
+        game.start_hand()
+        frontend.submit(game, 1, 'raise', 6)
+        frontend.submit(game, 2, 'fold')
+        events = frontend.poll()
+        self.assertEqual('hand_start', events[0]['event'])
+        self.assertIn({'event': 'action', 'player': 1, 'action': 'raise', 'amount': '6'}, events)
+        self.assertEqual('hand_end', events[-1]['event'])
+        self.assertEqual([], frontend.poll())
+
+    def test_web_frontend_converts_chips(self):
+        frontend = WebFrontend()
+        game = Game(2, 50, 100, frontend=frontend, rng=random.default_rng(1), button=1, denomination=Decimal('0.01'))
+        for p in game.get_players():
+            p.set_stack(10000)
+        game.start_hand()
+        frontend.submit(game, 1, 'raise', '3.00')
+        self.assertEqual(300, game.get_player_at_seat(1).get_bet())
+        self.assertIn({'event': 'action', 'player': 1, 'action': 'raise', 'amount': '3.00'}, frontend.poll())
+
+
+def _draws(count, rng):
+    """A run_parallel task which draws count random numbers."""
+    return rng.integers(1000, size=count).tolist()
+
+
+class RunnerTests(unittest.TestCase):
+    """This class contains tests for runner.py."""
+
+    def test_run_parallel(self):
+        def concatenate(total, partial):
+            return partial if total is None else total + partial
+        first = run_parallel(_draws, 10, seed=12, workers=3, merge=concatenate)
+        self.assertEqual(10, len(first))
+        # the chunks are merged in order, so the same seed and workers give the same result
+        self.assertEqual(first, run_parallel(_draws, 10, seed=12, workers=3, merge=concatenate))
+        streams = spawn_generators(12, 3)
+        expected = [n for count, rng in zip(split_work(10, 3), streams) for n in _draws(count, rng)]
+        self.assertEqual(expected, first)
+
+    def test_split_work(self):
+        self.assertEqual([4, 3, 3], split_work(10, 3))
+        self.assertEqual(10, sum(split_work(10, 4)))
+
+    def test_parallel_equity_is_reproducible(self):
+        first = monte_carlo_equity(['AhKh', 'QsQd', 'JcTc'], iterations=6000, seed=3, workers=2)
+        second = monte_carlo_equity(['AhKh', 'QsQd', 'JcTc'], iterations=6000, seed=3, workers=2)
+        self.assertEqual(first.share_units, second.share_units)
+        self.assertEqual(first.share_squares, second.share_squares)
+        self.assertLessEqual(first.trials, 6000)
+
+    def test_seeded_deck(self):
+        first = Deck(random.default_rng(11))
+        second = Deck(random.default_rng(11))
+        first.shuffle()
+        second.shuffle()
+        self.assertEqual([c.code for c in first.cards], [c.code for c in second.cards])
+
+
+class SimulatorTests(unittest.TestCase):
+    """This class contains tests for simulate.py."""
+
+    def test_cash_game(self):
+        sim = Simulator([tight_aggressive, check_call, random_action])
+        result = sim.run(hands=400, seed=4, workers=1)
+        self.assertEqual(400, result.hands)
+        # every chip won by one strategy was lost by another
+        self.assertEqual(0, sum(result.winnings))
+        self.assertEqual(3, len(result.confidence_interval()))
+        self.assertGreater(result.hands_per_second(), 0)
+
+    def test_parallel_runs_are_reproducible(self):
+        sim = Simulator([check_call, random_action])
+        first = sim.run(hands=600, seed=5, workers=2)
+        second = sim.run(hands=600, seed=5, workers=2)
+        self.assertEqual(first.winnings, second.winnings)
+        self.assertEqual(first.squares, second.squares)
+
+    def test_tournament(self):
+        sim = Simulator([tight_aggressive, check_call, random_action], starting_stack=40,
+                        hands_per_level=5)
+        result = sim.run(tournaments=5, seed=6, workers=1)
+        self.assertEqual(5, result.tournaments)
+        self.assertGreater(result.tournament_hands, 0)
+        for place in range(3):
+            self.assertEqual(5, sum(places[place] for places in result.places))
+
+    def test_tournament_hands_replay(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        sim = Simulator([tight_aggressive, random_action, random_action], starting_stack=200, hands_per_level=3)
+        sim.play_tournaments(3, random.default_rng(7), history=path)
+        # every raise was legal at the blinds of its own level
+        replayer = Replayer(path)
+        for record in replayer.reader.hands():
+            replayer.replay(record.number).finish()
+
+    def test_set_blinds(self):
+        game = Game(2, 1, 2, rng=random.default_rng(3), button=1)
+        for p in game.get_players():
+            p.set_stack(500)
+        game.start_hand()
+        with self.assertRaises(ValueError):
+            game.set_blinds(2, 4)
+        game.apply_action(game.to_act, 'raise', 6)
+        game.apply_action(game.to_act, 'fold')
+        game.set_blinds(16, 32)
+        game.start_hand()
+        self.assertEqual(('raise', 64, game.to_act.get_bet() + game.to_act.get_stack()), game.legal_actions()[-1])
+
+
+class HistoryTests(unittest.TestCase):
+    """This class contains tests for history.py."""
+
+    def record(self, path, hands, seed):
+        sim = Simulator([tight_aggressive, check_call, random_action])
+        game = sim._new_game(random.default_rng(seed))
+        with HandRecorder(path, game, chunk_size=64):
+            for _ in range(hands):
+                for p in game.get_players():
+                    p.set_stack(200)
+                game.play_hand()
+                game.move_button()
+
+    def test_record_and_read(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        self.record(path, 150, 16)
+        reader = HistoryReader(path)
+        self.assertEqual(150, len(reader))
+        self.assertEqual([0, 64, 128], [first for _, first, _ in reader.index()])
+        records = list(reader.hands())
+        self.assertEqual(list(range(150)), [r.number for r in records])
+        for r in records:
+            self.assertEqual([200] * 3, r.stacks)
+            cards = [c.code for hole in r.hole_cards for c in hole] + [c.code for c in r.board]
+            self.assertEqual(len(cards), len(set(cards)))
+            blinds = tuple(['small_blind', 'big_blind'][a[2]] for a in r.actions[:2])
+            self.assertEqual(('small_blind', 'big_blind'), blinds)
+            self.assertGreaterEqual(sum(r.won), 3)
+        # recording more hands appends chunks and continues the numbering
+        self.record(path, 10, 17)
+        reader = HistoryReader(path)
+        self.assertEqual(160, len(reader))
+        self.assertEqual(159, list(reader.hands())[-1].number)
+
+    def test_export_text(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        self.record(path, 20, 18)
+        out = io.StringIO()
+        HistoryReader(path).export_text(out)
+        text = out.getvalue()
+        self.assertEqual(20, text.count('*** SUMMARY ***'))
+        self.assertIn('Hand #19:', text)
+        self.assertIn('posts big blind $2', text)
+
+
+class AnalyticsTests(unittest.TestCase):
+    """This class contains tests for analytics.py."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        cls.result = Simulator([tight_aggressive, check_call, random_action]).play_hands(
+            600, random.default_rng(19), history=cls.path)
+
+    def test_matches_simulation(self):
+        stats = analyse(self.path, workers=1)
+        for name, expected in zip(stats.players, self.result.bb_per_100()):
+            self.assertAlmostEqual(expected, stats[name].summary()['bb_per_100'])
+        self.assertEqual(0, sum(p.won for p in stats.players.values()))
+        check = stats['check_call (2)'].summary()
+        self.assertEqual(600, check['hands'])
+        self.assertEqual(0.0, check['pfr'])
+        self.assertEqual(0.0, check['af'])
+        for p in stats.players.values():
+            self.assertLessEqual(p.pfr, p.vpip)
+            self.assertLessEqual(p.showdowns_won, p.showdowns)
+            self.assertLessEqual(p.showdowns, p.saw_flop)
+
+    def test_streaming_and_merging(self):
+        path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        game = Simulator([tight_aggressive, check_call, random_action])._new_game(random.default_rng(20))
+        with HandRecorder(path, game, chunk_size=50):
+            for _ in range(300):
+                for p in game.get_players():
+                    p.set_stack(200)
+                game.play_hand()
+                game.move_button()
+        reader = HistoryReader(path)
+        partials = [Stats(), Stats()]
+        for i, chunk in enumerate(reader.chunks()):
+            partials[i % 2].add_chunk(chunk, reader.names)
+        merged = partials[0].merge(partials[1])
+        for running in stream_stats(reader):
+            pass
+        self.assertEqual(merged.summary(), running.summary())
+        doubled = analyse([path, path], workers=1)
+        for name, stats in running.players.items():
+            self.assertEqual(2 * stats.vpip, doubled[name].vpip)
+            self.assertEqual(2 * stats.won, doubled[name].won)
+
+    def test_uncalled_bets_are_not_won_at_showdown(self):
+        def shove(game, player, legal_actions):
+            action, low, high = legal_actions[-1]
+            return action, high
+        path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        game = Game(2, 1, 2, frontend=ScriptedFrontend([shove, shove]), rng=random.default_rng(21),
+                    names=['deep', 'short'], button=1)
+        with HandRecorder(path, game):
+            for _ in range(40):
+                game.get_player_at_seat(1).set_stack(300)
+                game.get_player_at_seat(2).set_stack(100)
+                game.play_hand()
+                game.move_button()
+        reader = HistoryReader(path)
+        # the deep stack always gets back the 200 the short stack could not call
+        contested = sum(int((chunk.seats['won'][:, 0] > 200).sum()) for chunk in reader.chunks())
+        deep = analyse(path, workers=1)['deep']
+        self.assertEqual(40, deep.showdowns)
+        self.assertEqual(40, deep.pfr)
+        self.assertEqual(contested, deep.showdowns_won)
+        self.assertLess(deep.showdowns_won, deep.showdowns)
+
+
+class ReplayTests(unittest.TestCase):
+    """This class contains tests for replay.py."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.path = os.path.join(tempfile.mkdtemp(), 'hands.bin')
+        cls.states = {}
+
+        def watched(strategy):
+            def decide(game, player, legal_actions):
+                # remember the state before every decision, to compare with the replays
+                state = ([p.get_stack() for p in game.get_players()], game.pot,
+                         [p.get_seat_num() for p in game.players_in_hand], list(game.board), game.previous_bet)
+                cls.states.setdefault(recorder.hands_recorded, []).append(state)
+                return strategy(game, player, legal_actions)
+            return decide
+
+        strategies = [watched(s) for s in (tight_aggressive, check_call, random_action, check_call)]
+        game = Simulator(strategies)._new_game(random.default_rng(21))
+        with HandRecorder(cls.path, game, chunk_size=16) as recorder:
+            for _ in range(60):
+                for p in game.get_players():
+                    if not p.get_stack():
+                        p.set_stack(50)
+                game.play_hand()
+                game.move_button()
+
+    def test_every_hand_replays(self):
+        replayer = Replayer(self.path)
+        for number in range(60):
+            replay = replayer.replay(number)
+            won = [0] * 4
+
+            def tally(game, event, data):
+                if event == 'win':
+                    won[data['player'].get_seat_num() - 1] += data['amount']
+
+            replay.game.listeners.append(tally)
+            replay.finish()
+            self.assertTrue(replay.game.hand_over)
+            self.assertEqual(replay.record.won, won)
+
+    def test_seek(self):
+        replayer = Replayer(self.path)
+        self.assertEqual(37, replayer.reader.read_hand(37).number)
+        replay = replayer.replay(37)
+        self.assertEqual(len(self.states[37]), len(replay))
+        # seeking backwards starts the hand again, so every state is rebuilt from the start
+        for position in reversed(range(len(replay))):
+            replay.seek(position)
+            snapshot = replay.snapshot()
+            self.assertEqual(self.states[37][position], (snapshot['stacks'], snapshot['pot'],
+                             snapshot['players_in_hand'], snapshot['board'], snapshot['previous_bet']))
+            self.assertEqual(replay.decisions[position][0], snapshot['to_act'])
+        replay.finish()
+        self.assertIsNone(replay.snapshot()['to_act'])
+        with self.assertRaises(IndexError):
+            replayer.replay(60)
+
+    def test_seek_to_street(self):
+        replayer = Replayer(self.path)
+        for number in range(60):
+            record = replayer.reader.read_hand(number)
+            turn = [a for a in record.actions if a[1] == 2]
+            if turn:
+                replay = replayer.seek(number, street='turn', seat=turn[-1][0])
+                self.assertEqual('turn', replay.game.street)
+                self.assertIs(replay.game.get_player_at_seat(turn[-1][0]), replay.game.to_act)
+                self.assertEqual(4, len(replay.game.board))
+                return
+        self.fail('no hand reached the turn')
+
+class BenchmarkTests(unittest.TestCase):
+    """This class contains tests for benchmark.py."""
+
+    def test_run_and_compare(self):
+        results = benchmark.run_benchmarks(warmup=0, repeats=2, scale=0.005)
+        self.assertEqual(set(benchmark.BENCHMARKS), set(results['benchmarks']))
+        for result in results['benchmarks'].values():
+            self.assertEqual(2, len(result['times']))
+            self.assertGreaterEqual(result['best'], result['median'])
+        # results survive a round trip through JSON, so they can be saved as a baseline
+        baseline = json.loads(json.dumps(results))
+        baseline['benchmarks']['deck']['median'] = results['benchmarks']['deck']['median'] * 2
+        rows = {row[0]: row for row in benchmark.compare(results, baseline, threshold=0.1)}
+        self.assertTrue(rows['deck'][4])
+        self.assertAlmostEqual(-0.5, rows['deck'][3])
+        self.assertFalse(rows['best_hand'][4])
+
+
+class InstrumentTests(unittest.TestCase):
+    """This class contains tests for instrument.py."""
+
+    def test_enable_and_disable(self):
+        original = Game.__dict__['showdown'], determine_hand.evaluate, HandState.add
+        simulator = Simulator([tight_aggressive, check_call, random_action])
+        profile = Instrumentation()
+        with profile:
+            self.assertIsNot(original[0], Game.__dict__['showdown'])
+            with self.assertRaises(RuntimeError):
+                Instrumentation().enable()
+            simulator.play_hands(50, random.default_rng(22))
+            # a hand evaluated through the module is counted, but not through this module's own reference
+            determine_hand.best_hand(parse_cards('AhKhQhJhTh2c3d'))
+            best_hand(parse_cards('AhKhQhJhTh2c3d'))
+            self.assertIs(equity_module.evaluate_batch, determine_hand.evaluate_batch)
+        self.assertEqual(original, (Game.__dict__['showdown'], determine_hand.evaluate, HandState.add))
+        snapshot = profile.snapshot()
+        self.assertEqual(50, snapshot['phases']['start_hand']['count'])
+        self.assertEqual(1, snapshot['calls']['best_hand'])
+        self.assertGreaterEqual(snapshot['calls']['evaluate'], 1)
+        self.assertGreater(snapshot['calls']['HandState.add'], 50 * 6)
+        showdown = snapshot['phases']['showdown']
+        self.assertLessEqual(showdown['p50'], showdown['p99'])
+        self.assertLessEqual(showdown['p99'], showdown['max'])
+        # nothing is measured once the instrumentation is disabled
+        simulator.play_hands(10, random.default_rng(23))
+        self.assertEqual(50, profile.snapshot()['phases']['start_hand']['count'])
+        self.assertEqual(snapshot, json.loads(profile.to_json()))
+
+        text = profile.to_prometheus()
+        self.assertIn('poker_phase_seconds_count{phase="start_hand"} 50', text)
+        self.assertIn('poker_evaluator_calls_total{function="best_hand"} 1', text)
+        merged = pickle.loads(pickle.dumps(profile)).merge(profile)
+        self.assertEqual(100, merged.snapshot()['phases']['start_hand']['count'])
+
+    def test_histogram(self):
+        histogram = Histogram()
+        for nanoseconds in range(1, 10001):
+            histogram.add(nanoseconds)
+        self.assertAlmostEqual(5000e-9, histogram.percentile(0.5), delta=5000e-9 * 0.125)
+        self.assertAlmostEqual(9900e-9, histogram.percentile(0.99), delta=9900e-9 * 0.125)
+        self.assertEqual(10000e-9, histogram.summary()['max'])
+
+
+class _Connection:
+    """Records the messages a table sends to one client."""
+    def __init__(self):
+        self.messages = []
+
+    async def send(self, text):
+        self.messages.append(json.loads(text))
+
+
+class ServerTests(unittest.TestCase):
+    """This class contains tests for server.py."""
+    def test_load_test(self):
+        result = server.load_test(tables=10, hands=5)
+        self.assertEqual(50, result['hands'])
+        self.assertEqual(0, result['timeouts'])
+        self.assertGreater(result['messages'], 50)
+
+    def test_timeouts(self):
+        # clients slower than the timeout have every turn played for them, and the tables carry on
+        result = server.load_test(tables=3, hands=2, think_time=0.05, action_timeout=0.005)
+        self.assertEqual(6, result['hands'])
+        self.assertGreater(result['timeouts'], 0)
+
+    def test_deltas_hide_hole_cards(self):
+        async def play():
+            table = server.Table('t', action_timeout=0.001, bots={3: check_call, 4: check_call})
+            first, second = _Connection(), _Connection()
+            self.assertEqual(1, await table.join(first))
+            self.assertEqual(2, await table.join(second, name='Bob'))
+            with self.assertRaises(ValueError):
+                await table.join(_Connection(), seat=3)
+            await table.run(hands=1)
+            return table, first, second
+        table, first, second = asyncio.run(play())
+        self.assertEqual('joined', first.messages[0]['type'])
+        self.assertEqual('Bob', second.messages[0]['state']['players'][1]['name'])
+        self.assertEqual('closed', first.messages[-1]['type'])
+        events = [e for m in first.messages if m['type'] == 'events' for e in m['events']]
+        hole_cards = [e for e in events if e['event'] == 'hole_card']
+        self.assertEqual(8, len(hole_cards))
+        self.assertTrue(all(('card' in e) == (e['player'] == 1) for e in hole_cards))
+        self.assertTrue(any(m['type'] == 'turn' for m in first.messages))
+        self.assertGreater(table.timeouts, 0)
+        self.assertEqual(1, table.hands_played)
+
+    def test_leave_and_rejoin_during_hand(self):
+        async def play():
+            table = server.Table('t', bots={3: check_call, 4: check_call})
+            await table.join(_Connection())
+            await table.join(_Connection())
+            hand = asyncio.ensure_future(table.play_hand())
+            left = None
+            while not hand.done():
+                await asyncio.sleep(0)
+                if table._reply is None or table._reply.done():
+                    continue
+                seat = table.game.to_act.get_seat_num()
+                if left is None:
+                    left = 3 - seat
+                    self.assertIn(table.game.get_player_at_seat(left), table.game.players_in_hand)
+                    table.leave(left)
+                    # the seat stays taken until the hand is over, and the leaver folds at their turn
+                    self.assertNotIn(left, table.open_seats())
+                    with self.assertRaises(ValueError):
+                        await table.join(_Connection(), seat=left)
+                    newcomer = _Connection()
+                    self.assertEqual(5, await table.join(newcomer))
+                    self.assertEqual([], newcomer.messages[0]['state']['hole_cards'])
+                legal = [action for action, _, _ in table.game.legal_actions()]
+                table.receive(seat, {'action': 'check' if 'check' in legal else 'call'})
+            await hand
+            self.assertNotIn(table.game.get_player_at_seat(left), table.game.players_in_hand)
+            self.assertIn(left, table.open_seats())
+            # the chips of the hand are all accounted for, including the leaver's
+            self.assertEqual(5 * 200, sum(p.get_stack() for p in table.game.get_players()))
+            rejoined = _Connection()
+            self.assertEqual(left, await table.join(rejoined, seat=left))
+            self.assertEqual([], rejoined.messages[0]['state']['hole_cards'])
+            self.assertEqual(200, table.game.get_player_at_seat(left).get_stack())
+        asyncio.run(play())
+
+    def test_bots_wait_for_a_remote_player(self):
+        async def wait():
+            table = server.Table('t', bots={5: check_call, 6: check_call})
+            run = asyncio.ensure_future(table.run())
+            await asyncio.sleep(0.01)
+            self.assertEqual(0, table.hands_played)
+            table.close()
+            await run
+        asyncio.run(wait())
+
+    def test_handle(self):
+        class Client(_Connection):
+            def __init__(self, requests):
+                super().__init__()
+                self.requests = requests
+
+            async def __aiter__(self):
+                for request in self.requests:
+                    yield request
+
+        async def handle():
+            tables = server.TableServer()
+            table = tables.add_table()
+            client = Client(['not json', json.dumps({'type': 'join', 'table': 'nowhere'}),
+                             json.dumps({'type': 'join', 'table': table.table_id}),
+                             json.dumps({'type': 'action', 'action': 'fold'})])
+            await tables.handle(client)
+            return table, client
+        table, client = asyncio.run(handle())
+        self.assertEqual(['error', 'error', 'joined', 'error'], [m['type'] for m in client.messages])
+        self.assertEqual('it is not your turn', client.messages[-1]['message'])
+        # the seat is given up when the connection closes
+        self.assertEqual({}, table.connections)
+
 
 if __name__ == '__main__':
     unittest.main()